@@ -1,24 +1,12 @@
-import atexit
-import json
 import os
-import shutil
+import time
 from pathlib import Path
 
 import streamlit as st
 
 from src.analysis.analyser import DocAnalyser
-from src.ingestion.loader import ingest
-
-# --- Cleanup Function ---
-TEMP_DIR = Path("temp_uploads")
-
-def cleanup():
-    """Remove the temporary directory on script exit."""
-    if TEMP_DIR.exists():
-        shutil.rmtree(TEMP_DIR)
-        print(f"Cleaned up temporary directory: {TEMP_DIR}")
-
-atexit.register(cleanup)
+from src.analysis.store import ResultStore
+from src.jobs import JobQueue, JobStatus
 
 
 st.set_page_config(page_title="Document Analyser", layout="wide")
@@ -50,12 +38,26 @@ if not st.session_state.get('api_key'):
     st.stop()
 
 
-if "analyser" not in st.session_state:
-    with st.spinner("Initializing Analyser..."):
-        st.session_state.analyser = DocAnalyser(api_key=st.session_state.api_key)
+MAX_WORKERS = 4
+POLL_INTERVAL = 1.0  # seconds between refreshes while jobs are running
+RESULTS_DB = Path("analysis_results.sqlite")
+EXPORT_PATH = Path("analysis_results.jsonl")
+
+
+@st.cache_resource
+def get_job_queue(api_key: str) -> JobQueue:
+    """One queue per API key, shared by all sessions and kept across reruns
+    and browser refreshes; each session shows only its own jobs (see
+    ``st.session_state.job_ids``). Results are persisted in RESULTS_DB."""
+    return JobQueue(DocAnalyser(api_key=api_key), max_workers=MAX_WORKERS, store=ResultStore(RESULTS_DB))
+
 
-if "results" not in st.session_state:
-    st.session_state.results = {}
+job_queue = get_job_queue(st.session_state.api_key)
+
+# Jobs submitted by this session, in order. They are mirrored in the URL's
+# ``job`` query parameters, so a browser refresh (a new session) keeps them.
+if 'job_ids' not in st.session_state:
+    st.session_state.job_ids = st.query_params.get_all("job")
 
 uploaded_files = st.file_uploader(
     "Choose files to analyse",
@@ -63,35 +65,40 @@ uploaded_files = st.file_uploader(
     type=["png", "jpg", "jpeg", "pdf"]
 )
 
-if uploaded_files:
-    TEMP_DIR.mkdir(exist_ok=True)
-
-    for uploaded_file in uploaded_files:
-        file_path = TEMP_DIR / uploaded_file.name
-        if file_path.name not in st.session_state.results:
-            with open(file_path, "wb") as f:
-                f.write(uploaded_file.getbuffer())
-
-            with st.spinner(f"Analysing {uploaded_file.name}..."):
-                try:
-                    ingested_doc = ingest([file_path])[0]
-                    analysis_result = st.session_state.analyser.analyse(ingested_doc)
-                    st.session_state.results[file_path.name] = analysis_result.to_dict()
-                    st.success(f"Successfully analysed {uploaded_file.name}")
-                except Exception as e:
-                    st.error(f"Error analysing {uploaded_file.name}: {e}")
-
-if st.session_state.results:
-    st.header("Analysis Results")
+# Submitting is idempotent: files already in the queue are not re-analysed
+for uploaded_file in uploaded_files or []:
+    job = job_queue.submit(uploaded_file.name, uploaded_file.getvalue())
+    if job.id not in st.session_state.job_ids:
+        st.session_state.job_ids.append(job.id)
+        st.query_params["job"] = st.session_state.job_ids
+
+# Jobs no longer in the queue (evicted, or from before a restart) come from the store
+jobs = job_queue.jobs(st.session_state.job_ids)
+finished, total = job_queue.progress(st.session_state.job_ids)
 
-    if st.button("Save Results to JSON"):
-        with open("analysis_results.json", "w") as f:
-            json.dump(st.session_state.results, f, indent=2)
-        st.success("Results saved to analysis_results.json")
-
-    for filename, result in st.session_state.results.items():
-        with st.expander(f"**{filename}** - Category: `{result['category']}` (Confidence: {result['confidence']:.2f})"):
-            st.json(result["fields"])
-            with st.container():
-                st.subheader("Raw Text")
-                st.text(result["raw_text"])
+if len(job_queue.store) and st.button("Export Results to JSONL"):
+    count = job_queue.store.export_jsonl(EXPORT_PATH)
+    st.success(f"Exported {count} stored results to {EXPORT_PATH}")
+
+if jobs:
+    st.header("Analysis Results")
+    st.progress(finished / total, text=f"{finished} of {total} documents analysed")
+
+    for job in jobs:
+        if job.status is JobStatus.DONE:
+            result = job.result
+            with st.expander(f"**{job.name}** - Category: `{result['category']}` (Confidence: {result['confidence']:.2f})"):
+                st.json(result["fields"])
+                with st.container():
+                    st.subheader("Raw Text")
+                    st.text(result["raw_text"])
+        elif job.status is JobStatus.FAILED:
+            st.error(f"Error analysing {job.name}: {job.error}")
+        elif job.status is JobStatus.RUNNING:
+            st.info(f"⏳ Analysing {job.name}...")
+        else:
+            st.caption(f"🕒 {job.name} queued")
+
+if finished < total:
+    time.sleep(POLL_INTERVAL)
+    st.rerun()
@@ -0,0 +1,99 @@
+"""Synthetic document corpora for benchmarks.
+
+Images are random-noise-plus-gradient bitmaps (noise keeps JPEG/PNG
+encoders honest); PDFs are either text-native (pages copied from
+``data/invoice.pdf``) or scanned (images wrapped in a PDF by Pillow).
+
+    python -m benchmarks.corpus /tmp/corpus --count 50 --sizes small large
+"""
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+from pypdf import PdfReader, PdfWriter
+
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# (width, height) of images and page count of PDFs for each size class
+SIZES: Dict[str, Tuple[Tuple[int, int], int]] = {
+    "small": ((800, 600), 1),
+    "medium": ((1920, 1080), 5),
+    "large": ((4032, 3024), 20),
+    "tall": ((1080, 8000), 1),
+    "long": ((1654, 2339), 50),
+}
+KINDS = ("png", "jpeg", "pdf_text", "pdf_scan")
+
+
+def _bitmap(size: Tuple[int, int], rng: np.random.Generator) -> Image.Image:
+    w, h = size
+    gradient = np.linspace(0, 255, w, dtype=np.float32)[None, :, None]
+    noise = rng.normal(0, 40, (h, w, 3)).astype(np.float32)
+    pixels = np.clip(gradient + noise + 60, 0, 255).astype(np.uint8)
+    return Image.fromarray(pixels, "RGB")
+
+
+def make_document(path: Path, kind: str, size: str, rng: np.random.Generator) -> Path:
+    dims, pages = SIZES[size]
+    if kind == "png":
+        path = path.with_suffix(".png")
+        _bitmap(dims, rng).save(path, format="PNG")
+    elif kind == "jpeg":
+        path = path.with_suffix(".jpg")
+        _bitmap(dims, rng).save(path, format="JPEG", quality=90)
+    elif kind == "pdf_text":
+        path = path.with_suffix(".pdf")
+        source = PdfReader(str(REPO_ROOT / "data" / "invoice.pdf"))
+        writer = PdfWriter()
+        for _ in range(pages):
+            writer.add_page(source.pages[0])
+        with path.open("wb") as f:
+            writer.write(f)
+    elif kind == "pdf_scan":
+        path = path.with_suffix(".pdf")
+        page = (min(dims[0], 1654), min(dims[1], 2339))  # at most A4 @ 200 dpi
+        images = [_bitmap(page, rng) for _ in range(pages)]
+        images[0].save(path, format="PDF", save_all=True, append_images=images[1:])
+    else:
+        raise ValueError(f"Unknown document kind: {kind}")
+    return path
+
+
+def generate(
+    out_dir: Path,
+    count: int,
+    sizes: Sequence[str] = ("small", "medium"),
+    kinds: Sequence[str] = KINDS,
+    seed: int = 0,
+) -> List[Path]:
+    """Write ``count`` documents cycling through ``kinds`` × ``sizes``."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    combos = [(k, s) for s in sizes for k in kinds]
+    return [
+        make_document(out_dir / f"doc_{i:05d}_{kind}_{size}", kind, size, rng)
+        for i, (kind, size) in ((i, combos[i % len(combos)]) for i in range(count))
+    ]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("out_dir", type=Path)
+    parser.add_argument("--count", type=int, default=40)
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=["small", "medium"])
+    parser.add_argument("--kinds", nargs="+", choices=KINDS, default=list(KINDS))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    paths = generate(args.out_dir, args.count, args.sizes, args.kinds, args.seed)
+    print(f"Wrote {len(paths)} documents to {args.out_dir}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,90 @@
+"""I/O cost of ingesting a file: bytes read, read syscalls and opens per file.
+
+Compares the current single-read ``ingest_path`` against the previous
+pipeline, which read and decoded each file separately for the hash, the
+metadata and the LLM block. Linux only (uses ``/proc/self/io``).
+
+    python -m benchmarks.ingest_io data/ --repeat 5
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from src.ingestion.llm_blocks import file_to_blocks
+from src.ingestion.loader import discover, ingest_path
+from src.ingestion.mime import guess_mime
+from src.ingestion.preprocess import compute_sha256, load_image_meta, load_pdf_meta
+
+
+_opens: Dict[str, int] = {}
+_target: List[str] = []
+
+
+def _audit(event: str, args: tuple) -> None:
+    if event == "open" and _target and isinstance(args[0], (str, Path)) \
+            and os.path.realpath(args[0]) == _target[0]:
+        _opens[_target[0]] = _opens.get(_target[0], 0) + 1
+
+
+def _proc_io() -> Dict[str, int]:
+    out = {}
+    with open("/proc/self/io") as f:
+        for line in f:
+            key, value = line.split(":")
+            out[key] = int(value)
+    return out
+
+
+def legacy_ingest_path(path: Path) -> None:
+    """The pre-single-read pipeline, kept here as the baseline."""
+    mime = guess_mime(path)
+    data = path.read_bytes()
+    compute_sha256(data)
+    if mime.startswith("image/"):
+        load_image_meta(path)
+    if mime == "application/pdf":
+        load_pdf_meta(path)
+    file_to_blocks(path, mime)
+
+
+def measure(fn: Callable[[Path], object], path: Path, repeat: int) -> Dict[str, float]:
+    _opens.clear()
+    _target[:] = [os.path.realpath(path)]
+    before = _proc_io()
+    for _ in range(repeat):
+        fn(path)
+    after = _proc_io()
+    _target.clear()
+    return {
+        "bytes_read": (after["rchar"] - before["rchar"]) / repeat,
+        "read_syscalls": (after["syscr"] - before["syscr"]) / repeat,
+        "opens": _opens.get(os.path.realpath(path), 0) / repeat,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="+", type=Path)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    sys.addaudithook(_audit)
+    report = []
+    for path in discover(args.paths):
+        size = path.stat().st_size
+        legacy = measure(legacy_ingest_path, path, args.repeat)
+        current = measure(ingest_path, path, args.repeat)
+        report.append({"file": str(path), "size_bytes": size, "before": legacy, "after": current})
+
+    json.dump(report, sys.stdout, indent=2)
+    print()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
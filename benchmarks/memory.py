@@ -0,0 +1,105 @@
+"""Memory held by ingested documents, measured with ``tracemalloc``.
+
+Ingests ``--count`` documents (cycling through ``--unique`` generated
+files, each ingested afresh) and keeps them all alive, like a long batch or
+Streamlit session would. It then reports the memory retained per
+document in three states:
+
+- ``lazy``: raw payloads, as ``IngestedFile`` holds them now
+- ``materialised``: with every document's base64 blocks also held (the
+  previous representation kept blocks only, estimated as ``eager``)
+- ``released``: after ``IngestedFile.release()``
+
+    python -m benchmarks.memory --count 1000 --kinds jpeg pdf_text
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from itertools import cycle, islice
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from benchmarks.corpus import KINDS, SIZES, generate
+from src.ingestion.loader import discover, ingest_path
+
+
+def _kb(n: float) -> float:
+    return round(n / 1024, 1)
+
+
+def measure(paths: List[Path], count: int) -> Dict:
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    t0 = time.perf_counter()
+    docs = [ingest_path(p) for p in islice(cycle(paths), count)]
+    ingest_s = time.perf_counter() - t0
+    lazy = tracemalloc.get_traced_memory()[0] - base
+    payload = sum(d.payload_bytes for d in docs)
+
+    held = [(d.blocks, d.classify_blocks) for d in docs]
+    materialised = tracemalloc.get_traced_memory()[0] - base
+    blocks = materialised - lazy
+    del held
+
+    for d in docs:
+        d.release()
+    released = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+
+    n = len(docs)
+    return {
+        "docs": n,
+        "ingest_s": round(ingest_s, 2),
+        "per_doc_kb": {
+            "lazy": _kb(lazy / n),
+            "payloads": _kb(payload / n),
+            "blocks": _kb(blocks / n),
+            "materialised": _kb(materialised / n),
+            "eager": _kb((lazy - payload + blocks) / n),
+            "released": _kb(released / n),
+        },
+        "total_mb": {
+            "lazy": round(lazy / 2 ** 20, 1),
+            "eager": round((lazy - payload + blocks) / 2 ** 20, 1),
+            "released": round(released / 2 ** 20, 1),
+        },
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", type=Path, default=None,
+                        help="Existing directory of documents (default: generate one)")
+    parser.add_argument("--count", type=int, default=1000, help="Documents held at once")
+    parser.add_argument("--unique", type=int, default=40, help="Distinct files to generate")
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=["small"])
+    parser.add_argument("--kinds", nargs="+", choices=KINDS, default=list(KINDS))
+    parser.add_argument("-o", "--output", type=Path, default=None, help="Write JSON here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.corpus is not None:
+            paths = discover([args.corpus])
+        else:
+            paths = generate(Path(tmp), args.unique, args.sizes, args.kinds)
+        if not paths:
+            print("No documents found", file=sys.stderr)
+            return 1
+        report = measure(paths, args.count)
+
+    report["options"] = {"unique": len(paths), "sizes": args.sizes, "kinds": args.kinds}
+    text = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,368 @@
+"""Local OpenAI-compatible stub for offline benchmarks.
+
+Answers ``POST /v1/chat/completions`` with canned JSON that fits the
+requested ``json_schema``, replaying records from ``analysis_results.json``
+where one matches. Latency, jitter and a 429 rate can be injected to
+exercise retries and throttling; ``batch_drop_rate`` leaves entries out
+of batched classification answers to exercise the split-and-retry path.
+Per-model latency and classification confidence (``model_latency``,
+``model_confidence``) let a cheap, less certain model be simulated next to
+a slow, confident one, to exercise model cascades. ``token_latency`` adds
+time per completion token, so long OCR transcriptions cost what they
+would against a real provider. Transcriptions are repeated once per page
+of a PDF text layer in the prompt, so they grow with the pages sent.
+Prompt caching is simulated: when everything but the last message was
+seen before with the same ``response_format`` (which, as at OpenAI, is
+part of the cached prefix), its size is reported as ``cached_tokens``.
+``json_object`` requests are answered from the schema stated in their last
+message (see ``src.analysis.prompts.with_schema``). ``GET /stats``
+returns request counts and payload bytes.
+
+    python -m benchmarks.mock_server --port 8089 --latency 0.3 --fail-rate 0.05
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from src.analysis.prompts import SCHEMA_INSTRUCTION
+from src.analysis.schemas import fields_for
+from src.analysis.types import DocCategory
+
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+_DOC_LABEL = re.compile(r"^Document (\d+):$")
+_PAGE_MARKER = re.compile(r"^--- Page \d+ ---$", re.MULTILINE)
+
+
+def load_canned(path: Path = REPO_ROOT / "analysis_results.json") -> Dict[DocCategory, Dict]:
+    """One recorded result per category, keyed by category."""
+    try:
+        records = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    out: Dict[DocCategory, Dict] = {}
+    for record in records.values():
+        out.setdefault(DocCategory(record["category"]), record)
+    return out
+
+
+def _blank_fields(category: DocCategory) -> Dict:
+    return {name: None for name in fields_for(category)}
+
+
+def _category_for_fields(names: List[str]) -> DocCategory:
+    for category in DocCategory:
+        if set(fields_for(category)) == set(names):
+            return category
+    return DocCategory.OTHER
+
+
+def _request_schema(body: Dict) -> Dict:
+    """The ``json_schema`` of the request, or for ``json_object`` requests
+    the schema stated after ``SCHEMA_INSTRUCTION`` in the last message."""
+    response_format = body.get("response_format", {})
+    if response_format.get("type") != "json_object":
+        return response_format.get("json_schema", {}).get("schema", {})
+    messages = body.get("messages") or [{}]
+    content = messages[-1].get("content")
+    if not isinstance(content, str) or SCHEMA_INSTRUCTION not in content:
+        return {}
+    try:
+        return json.loads(content.split(SCHEMA_INSTRUCTION, 1)[1])
+    except ValueError:
+        return {}
+
+
+def _text_pages(messages: List[Dict]) -> int:
+    """PDF text-layer pages in the prompt (at least 1)."""
+    pages = 0
+    for message in messages:
+        content = message.get("content")
+        for block in content if isinstance(content, list) else []:
+            if block.get("type") == "text":
+                pages += len(_PAGE_MARKER.findall(block.get("text", "")))
+    return max(1, pages)
+
+
+def _batch_indexes(messages: List[Dict]) -> List[int]:
+    """Indexes of the "Document <i>:" labels of a batched request."""
+    out = []
+    for message in messages:
+        content = message.get("content")
+        for part in content if isinstance(content, list) else []:
+            m = _DOC_LABEL.match(part.get("text", "")) if part.get("type") == "text" else None
+            if m:
+                out.append(int(m.group(1)))
+    return out
+
+
+class StubState:
+    def __init__(
+        self,
+        latency: float = 0.2,
+        jitter: float = 0.0,
+        fail_rate: float = 0.0,
+        batch_drop_rate: float = 0.0,
+        canned: Optional[Dict[DocCategory, Dict]] = None,
+        seed: Optional[int] = None,
+        model_latency: Optional[Dict[str, float]] = None,
+        model_confidence: Optional[Dict[str, float]] = None,
+        token_latency: float = 0.0,
+    ) -> None:
+        self.latency = latency
+        self.token_latency = token_latency
+        self.model_latency = model_latency or {}
+        self.model_confidence = model_confidence or {}
+        self.jitter = jitter
+        self.fail_rate = fail_rate
+        self.batch_drop_rate = batch_drop_rate
+        self.canned = load_canned() if canned is None else canned
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.requests_by_model: Dict[str, int] = {}
+        self.throttled = 0
+        self.request_bytes = 0
+        self.cached_tokens = 0
+        self.prefixes: set = set()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def reset_stats(self) -> None:
+        """Zero the counters and forget cached prefixes, e.g. after a warm-up."""
+        with self.lock:
+            self.requests = 0
+            self.requests_by_model = {}
+            self.throttled = 0
+            self.request_bytes = 0
+            self.cached_tokens = 0
+            self.prefixes = set()
+            self.max_in_flight = self.in_flight
+
+    def record(self, category: DocCategory) -> Dict:
+        canned = self.canned.get(category)
+        if canned is None:
+            return {"category": category.value, "confidence": 0.9,
+                    "fields": _blank_fields(category), "raw_text": ""}
+        return canned
+
+    def confidence(self, rec: Dict, model: Optional[str]) -> float:
+        """The record's confidence, or one drawn around the model's mean."""
+        mean = self.model_confidence.get(model) if model else None
+        if mean is None:
+            return rec["confidence"]
+        return round(min(1.0, max(0.0, self.random.gauss(mean, 0.1))), 3)
+
+    def transcript(self, rec: Dict, messages: Optional[List[Dict]]) -> str:
+        return "\n\n".join([rec.get("raw_text") or ""] * _text_pages(messages or []))
+
+    def respond(self, schema: Dict, messages: Optional[List[Dict]] = None, model: Optional[str] = None) -> Dict:
+        """Canned body for whichever request type ``schema`` describes."""
+        props = schema.get("properties", {})
+        categories = list(self.canned) or list(DocCategory)
+        if "results" in props:  # batched classification
+            results = []
+            for index in _batch_indexes(messages or []):
+                if self.random.random() < self.batch_drop_rate:
+                    continue
+                rec = self.record(self.random.choice(categories))
+                results.append({"index": index, "category": rec["category"], "confidence": self.confidence(rec, model)})
+            return {"results": results}
+        if "analysis" in props:  # single-pass discriminated union
+            rec = self.record(self.random.choice(categories))
+            body = {k: rec[k] for k in ("category", "confidence", "fields")}
+            variants = props["analysis"].get("anyOf", [])
+            if variants and "raw_text" in variants[0].get("properties", {}):
+                body["raw_text"] = self.transcript(rec, messages)
+            return {"analysis": {**body, "confidence": self.confidence(rec, model)}}
+        if "category" in props:  # classification
+            rec = self.record(self.random.choice(categories))
+            return {"category": rec["category"], "confidence": self.confidence(rec, model)}
+        if "fields" in props:  # extraction
+            category = _category_for_fields(list(props["fields"].get("properties", {})))
+            rec = self.record(category)
+            out = {"fields": rec["fields"]}
+            if "raw_text" in props:
+                out["raw_text"] = self.transcript(rec, messages)
+            return out
+        if "raw_text" in props:  # OCR only
+            rec = self.record(self.random.choice(categories))
+            return {"raw_text": self.transcript(rec, messages)}
+        return {}
+
+    def cached_prefix_tokens(self, messages: List[Dict], response_format: Optional[Dict] = None) -> int:
+        """Tokens of the prompt prefix (all messages but the last, plus the
+        response format) served from the simulated cache; the prefix is
+        cached for next time."""
+        if len(messages) < 2:
+            return 0
+        prefix = json.dumps([response_format, messages[:-1]], sort_keys=True).encode("utf-8")
+        digest = hashlib.sha256(prefix).digest()
+        with self.lock:
+            hit = digest in self.prefixes
+            self.prefixes.add(digest)
+            if hit:
+                self.cached_tokens += len(prefix) // 4
+        return len(prefix) // 4 if hit else 0
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "requests_by_model": dict(self.requests_by_model),
+                "throttled": self.throttled,
+                "request_bytes": self.request_bytes,
+                "cached_tokens": self.cached_tokens,
+                "max_in_flight": self.max_in_flight,
+            }
+
+
+def _handler(state: StubState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args) -> None:
+            pass
+
+        def _send(self, status: int, body: Dict, headers: Optional[Dict[str, str]] = None) -> None:
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self) -> None:
+            if self.path.rstrip("/").endswith("/stats"):
+                self._send(200, state.stats())
+            else:
+                self._send(404, {"error": {"message": "not found"}})
+
+        def do_POST(self) -> None:
+            length = int(self.headers.get("Content-Length", 0))
+            raw = self.rfile.read(length)
+            body = json.loads(raw)
+            model = body.get("model", "stub")
+            with state.lock:
+                state.requests += 1
+                state.requests_by_model[model] = state.requests_by_model.get(model, 0) + 1
+                state.request_bytes += length
+                state.in_flight += 1
+                state.max_in_flight = max(state.max_in_flight, state.in_flight)
+                delay = state.model_latency.get(model, state.latency) + state.random.uniform(0, state.jitter)
+                throttle = state.random.random() < state.fail_rate
+            try:
+                time.sleep(delay)
+                if throttle:
+                    with state.lock:
+                        state.throttled += 1
+                    self._send(429, {"error": {"message": "rate limited", "type": "rate_limit"}},
+                               {"Retry-After": "0.2"})
+                    return
+                schema = _request_schema(body)
+                content = json.dumps(state.respond(schema, body.get("messages"), model))
+                time.sleep(state.token_latency * (len(content) // 4))
+                prompt_tokens = length // 4
+                cached_tokens = state.cached_prefix_tokens(body.get("messages", []), body.get("response_format"))
+                self._send(200, {
+                    "id": f"chatcmpl-{state.requests}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{
+                        "index": 0,
+                        "finish_reason": "stop",
+                        "message": {"role": "assistant", "content": content},
+                    }],
+                    "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": len(content) // 4,
+                        "total_tokens": prompt_tokens + len(content) // 4,
+                        "prompt_tokens_details": {"cached_tokens": cached_tokens},
+                    },
+                })
+            finally:
+                with state.lock:
+                    state.in_flight -= 1
+
+    return Handler
+
+
+class MockServer:
+    """Stub server running on a background thread.
+
+    Usage:
+        with MockServer(latency=0.1) as server:
+            analyser = DocAnalyser(base_url=server.base_url, api_key="stub")
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, **state_kwargs) -> None:
+        self.state = StubState(**state_kwargs)
+        self.httpd = ThreadingHTTPServer((host, port), _handler(self.state))
+        self.httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def __enter__(self) -> "MockServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def _model_values(items: List[str]) -> Dict[str, float]:
+    out = {}
+    for item in items:
+        model, _, value = item.rpartition("=")
+        out[model] = float(value)
+    return out
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds per request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra uniform random latency")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--batch-drop-rate", type=float, default=0.0,
+                        help="Fraction of batched classification entries left out")
+    parser.add_argument("--token-latency", type=float, default=0.0,
+                        help="Extra seconds per completion token")
+    parser.add_argument("--model-latency", action="append", default=[], metavar="MODEL=SECONDS",
+                        help="Latency for one model, instead of --latency (repeatable)")
+    parser.add_argument("--model-confidence", action="append", default=[], metavar="MODEL=MEAN",
+                        help="Mean classification confidence reported by one model (repeatable)")
+    args = parser.parse_args(argv)
+
+    server = MockServer(args.host, args.port, latency=args.latency, jitter=args.jitter, fail_rate=args.fail_rate,
+                        batch_drop_rate=args.batch_drop_rate, token_latency=args.token_latency,
+                        model_latency=_model_values(args.model_latency),
+                        model_confidence=_model_values(args.model_confidence))
+    print(f"Serving on {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,351 @@
+"""Offline throughput/latency benchmark suite.
+
+Generates a synthetic corpus, then measures ingestion, image normalisation
+and ``DocAnalyser.analyse`` against the local mock server. Each scenario
+runs in a fresh process so its peak RSS is its own. Results are written as
+JSON so runs can be compared across commits.
+
+    python -m benchmarks.run --count 40 --latency 0.2 --output bench.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+from benchmarks.corpus import KINDS, SIZES, generate
+from benchmarks.mock_server import MockServer
+
+
+def _percentile(values: Sequence[float], q: float) -> float:
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[int(q) - 1]
+
+
+def _peak_rss_mb() -> float:
+    # Linux keeps ru_maxrss across exec, so a spawned child would report the
+    # parent's peak; VmHWM belongs to the current address space only.
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _summary(latencies: List[float], wall: float, **extra: float) -> Dict[str, float]:
+    return {
+        "docs": len(latencies),
+        "wall_s": round(wall, 4),
+        "docs_per_s": round(len(latencies) / wall, 3) if wall else 0.0,
+        "p50_s": round(_percentile(latencies, 50), 4),
+        "p95_s": round(_percentile(latencies, 95), 4),
+        **extra,
+    }
+
+
+def _timed(fn: Callable[[Path], object], paths: Sequence[Path]) -> List[float]:
+    out = []
+    for p in paths:
+        t0 = time.perf_counter()
+        fn(p)
+        out.append(time.perf_counter() - t0)
+    return out
+
+
+def scenario_ingest(paths: List[Path], opts: Dict) -> Dict:
+    from src.ingestion.loader import ingest, ingest_path
+
+    t0 = time.perf_counter()
+    latencies = _timed(ingest_path, paths)
+    serial = _summary(latencies, time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    ingest(paths, workers=opts["workers"])
+    wall = time.perf_counter() - t0
+    return {
+        "serial": serial,
+        "pool": {"docs": len(paths), "workers": opts["workers"], "wall_s": round(wall, 4),
+                 "docs_per_s": round(len(paths) / wall, 3)},
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+    }
+
+
+def scenario_normalize(paths: List[Path], opts: Dict) -> Dict:
+    from src.ingestion.preprocess import normalize_image_to_jpeg_bytes
+
+    images = [p for p in paths if p.suffix.lower() in (".png", ".jpg", ".jpeg")]
+    t0 = time.perf_counter()
+    latencies = _timed(normalize_image_to_jpeg_bytes, images)
+    return {**_summary(latencies, time.perf_counter() - t0), "peak_rss_mb": round(_peak_rss_mb(), 1)}
+
+
+def scenario_analyse(paths: List[Path], opts: Dict) -> Dict:
+    from src.analysis.analyser import DocAnalyser
+    from src.ingestion.loader import ingest
+
+    docs = ingest(paths, workers=1)
+    with MockServer(latency=opts["latency"], jitter=opts["jitter"], fail_rate=opts["fail_rate"], seed=0) as server:
+        _warm_up(server, docs)
+        analyser = DocAnalyser(base_url=server.base_url, api_key="stub")
+
+        def run(doc) -> float:
+            t0 = time.perf_counter()
+            analyser.analyse(doc, mode=opts["mode"])
+            return time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=opts["concurrency"]) as pool:
+            latencies = list(pool.map(run, docs))
+        wall = time.perf_counter() - t0
+        stats = server.state.stats()
+
+    return _summary(
+        latencies,
+        wall,
+        concurrency=opts["concurrency"],
+        requests=stats["requests"],
+        throttled=stats["throttled"],
+        request_bytes_per_doc=round(stats["request_bytes"] / len(docs), 1) if docs else 0.0,
+        peak_rss_mb=round(_peak_rss_mb(), 1),
+    )
+
+
+def _warm_up(server: MockServer, docs: Sequence) -> None:
+    """Send one untimed request, then zero the server's counters. Without
+    it the first variant timed in a process also pays for the openai import
+    and the connection pool set-up."""
+    from src.analysis.analyser import DocAnalyser
+
+    if docs:
+        DocAnalyser(base_url=server.base_url, api_key="stub").classify(docs[0])
+    server.state.reset_stats()
+
+
+# Simulated tiers for the cascade scenario: the small model answers in
+# CASCADE_SMALL_LATENCY of the large model's time, less confidently
+CASCADE_MODELS = ("openai/gpt-4o-mini", "openai/gpt-4o")
+CASCADE_SMALL_LATENCY = 0.3
+CASCADE_SMALL_CONFIDENCE = 0.85
+
+
+def scenario_cascade(paths: List[Path], opts: Dict) -> Dict:
+    """The large model alone versus the small→large cascade."""
+    from src.analysis.analyser import DocAnalyser
+    from src.analysis.cascade import ModelCascade
+    from src.ingestion.loader import ingest
+
+    docs = ingest(paths, workers=1)
+    small, large = CASCADE_MODELS
+    out: Dict[str, Dict] = {}
+    for name in ("large_only", "cascade"):
+        cascade = ModelCascade(CASCADE_MODELS) if name == "cascade" else None
+        with MockServer(
+            latency=opts["latency"],
+            jitter=opts["jitter"],
+            fail_rate=opts["fail_rate"],
+            seed=0,
+            model_latency={small: opts["latency"] * CASCADE_SMALL_LATENCY},
+            model_confidence={small: CASCADE_SMALL_CONFIDENCE},
+        ) as server:
+            _warm_up(server, docs)
+            analyser = DocAnalyser(model=large, base_url=server.base_url, api_key="stub", cascade=cascade)
+
+            def run(doc) -> float:
+                t0 = time.perf_counter()
+                analyser.analyse(doc, mode=opts["mode"])
+                return time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=opts["concurrency"]) as pool:
+                latencies = list(pool.map(run, docs))
+            wall = time.perf_counter() - t0
+            stats = server.state.stats()
+        out[name] = _summary(latencies, wall, requests_by_model=stats["requests_by_model"])
+        if cascade is not None:
+            out[name]["cascade"] = cascade.stats.to_dict()
+    return out
+
+
+def scenario_raw_text(paths: List[Path], opts: Dict) -> Dict:
+    """Time to a result in each raw_text mode, with per-token output latency.
+    For ``deferred`` the later cost of reading every ``raw_text`` is
+    reported separately."""
+    from src.analysis.analyser import RAW_TEXT_MODES, DocAnalyser
+    from src.ingestion.loader import ingest
+
+    docs = ingest(paths, workers=1)
+    out: Dict[str, Dict] = {}
+    for raw_text in RAW_TEXT_MODES:
+        with MockServer(
+            latency=opts["latency"],
+            jitter=opts["jitter"],
+            fail_rate=opts["fail_rate"],
+            token_latency=opts["token_latency"],
+            seed=0,
+        ) as server:
+            _warm_up(server, docs)
+            analyser = DocAnalyser(base_url=server.base_url, api_key="stub")
+            results = []
+
+            def run(doc) -> float:
+                t0 = time.perf_counter()
+                results.append(analyser.analyse(doc, mode=opts["mode"], raw_text=raw_text))
+                return time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=opts["concurrency"]) as pool:
+                latencies = list(pool.map(run, docs))
+            wall = time.perf_counter() - t0
+            out[raw_text] = _summary(latencies, wall)
+            if raw_text == "deferred":
+                t0 = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=opts["concurrency"]) as pool:
+                    list(pool.map(lambda res: res.raw_text, results))
+                out[raw_text]["fetch_all_raw_text_s"] = round(time.perf_counter() - t0, 4)
+            out[raw_text]["requests"] = server.state.stats()["requests"]
+    return out
+
+
+# None sends the whole document in one request
+CHUNK_SIZES = (None, 10, 5)
+CHUNK_REPEAT = 3
+
+
+def scenario_chunked(paths: List[Path], opts: Dict) -> Dict:
+    """Time to result for one long text-layer PDF, whole versus in
+    concurrent page chunks (``pages_per_chunk``), with per-token output
+    latency. Uses its own generated document, not the corpus."""
+    import numpy as np
+
+    from benchmarks.corpus import make_document
+    from src.analysis.analyser import DocAnalyser
+    from src.ingestion.loader import ingest_path
+
+    with tempfile.TemporaryDirectory() as tmp:
+        doc = ingest_path(make_document(Path(tmp) / "long", "pdf_text", "long", np.random.default_rng(0)))
+    out: Dict[str, Dict] = {"pages": doc.pdf.page_count}
+    for pages_per_chunk in CHUNK_SIZES:
+        with MockServer(
+            latency=opts["latency"],
+            jitter=opts["jitter"],
+            fail_rate=opts["fail_rate"],
+            token_latency=opts["token_latency"],
+            seed=0,
+        ) as server:
+            _warm_up(server, [doc])
+            analyser = DocAnalyser(base_url=server.base_url, api_key="stub", pages_per_chunk=pages_per_chunk)
+            latencies = []
+            for _ in range(CHUNK_REPEAT):
+                t0 = time.perf_counter()
+                res = analyser.analyse(doc, mode="two_step")
+                latencies.append(time.perf_counter() - t0)
+            stats = server.state.stats()
+        out[f"pages_per_chunk={pages_per_chunk}"] = {
+            "median_s": round(statistics.median(latencies), 4),
+            "requests_per_doc": stats["requests"] / CHUNK_REPEAT,
+            "max_in_flight": stats["max_in_flight"],
+            "raw_text_chars": len(res.raw_text or ""),
+        }
+    return out
+
+
+SCENARIOS: Dict[str, Callable[[List[Path], Dict], Dict]] = {
+    "ingest": scenario_ingest,
+    "normalize": scenario_normalize,
+    "analyse": scenario_analyse,
+    "cascade": scenario_cascade,
+    "raw_text": scenario_raw_text,
+    "chunked": scenario_chunked,
+}
+
+
+def _run_isolated(name: str, paths: List[Path], opts: Dict) -> Dict:
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+        return pool.submit(SCENARIOS[name], paths, opts).result()
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", type=Path, default=None,
+                        help="Existing corpus directory (default: generate one in a temp dir)")
+    parser.add_argument("--count", type=int, default=40)
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=["small", "medium"])
+    parser.add_argument("--kinds", nargs="+", choices=KINDS, default=list(KINDS))
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--latency", type=float, default=0.2, help="Mock server latency per request")
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--token-latency", type=float, default=0.005,
+                        help="Mock server seconds per completion token (raw_text and chunked scenarios)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--mode", default="two_step")
+    parser.add_argument("-o", "--output", type=Path, default=None, help="Write JSON here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    opts = {
+        "latency": args.latency,
+        "jitter": args.jitter,
+        "fail_rate": args.fail_rate,
+        "token_latency": args.token_latency,
+        "concurrency": args.concurrency,
+        "workers": args.workers,
+        "mode": args.mode,
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.corpus is not None:
+            from src.ingestion.loader import discover
+            paths = discover([args.corpus])
+        else:
+            paths = generate(Path(tmp), args.count, args.sizes, args.kinds)
+
+        report = {
+            "meta": {
+                "git_commit": _git_commit(),
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "corpus_docs": len(paths),
+                "corpus_bytes": sum(p.stat().st_size for p in paths),
+                "options": {**opts, "sizes": args.sizes, "kinds": args.kinds},
+            },
+            "scenarios": {name: _run_isolated(name, paths, opts) for name in args.scenarios},
+        }
+
+    text = json.dumps(report, indent=2)
+    if args.output is not None:
+        args.output.write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,126 @@
+"""Cold-start cost: module import times and first-request latency.
+
+Imports are timed in fresh interpreters, as a CLI run, ingestion worker or
+Streamlit server start would see them, along with ``python -m src.cli
+--help`` end to end. First-request latency is measured against the mock
+server in three situations:
+
+- ``process``: fresh interpreter, including imports and client creation
+- ``cold``: in-process, after ``clients.close_all()`` (new connection pool)
+- ``warm``: a brand-new ``DocAnalyser``, e.g. a new browser session, on the
+  shared pool
+
+    python -m benchmarks.startup --repeat 5
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from benchmarks.mock_server import MockServer
+
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+MODULES = ("src.cli", "src.analysis.analyser", "src.ingestion.loader", "src.jobs")
+HEAVY = ("openai", "httpx", "PIL.Image", "pypdf", "numpy", "requests")
+SAMPLE = REPO_ROOT / "data" / "invoice.pdf"
+
+_IMPORT_SNIPPET = """
+import json, sys, time
+t0 = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - t0
+print(json.dumps({{"s": elapsed, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+_FIRST_REQUEST_SNIPPET = """
+import time
+t0 = time.perf_counter()
+from pathlib import Path
+from src.analysis.analyser import DocAnalyser
+from src.ingestion.loader import ingest_path
+doc = ingest_path(Path({sample!r}))
+DocAnalyser(base_url={base_url!r}, api_key="stub").classify(doc)
+print(time.perf_counter() - t0)
+"""
+
+
+def _python(code: str) -> str:
+    out = subprocess.run([sys.executable, "-c", code], cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+    return out.stdout.strip().splitlines()[-1]
+
+
+def _median(values: List[float]) -> float:
+    return round(statistics.median(values), 4)
+
+
+def measure_imports(repeat: int) -> Dict:
+    out: Dict[str, Dict] = {}
+    for module in MODULES:
+        runs = [json.loads(_python(_IMPORT_SNIPPET.format(module=module, heavy=HEAVY))) for _ in range(repeat)]
+        out[module] = {"import_s": _median([r["s"] for r in runs]), "heavy_loaded": runs[0]["heavy"]}
+
+    walls = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, "-m", "src.cli", "--help"], cwd=REPO_ROOT, capture_output=True, check=True)
+        walls.append(time.perf_counter() - t0)
+    out["cli --help"] = {"wall_s": _median(walls)}
+    return out
+
+
+def measure_first_request(repeat: int, latency: float) -> Dict:
+    from src.analysis import clients
+    from src.analysis.analyser import DocAnalyser
+    from src.ingestion.loader import ingest_path
+
+    doc = ingest_path(SAMPLE)
+    process, cold, warm = [], [], []
+    with MockServer(latency=latency, seed=0) as server:
+        for _ in range(repeat):
+            process.append(float(_python(_FIRST_REQUEST_SNIPPET.format(sample=str(SAMPLE), base_url=server.base_url))))
+
+            clients.close_all()
+            t0 = time.perf_counter()
+            DocAnalyser(base_url=server.base_url, api_key="stub").classify(doc)
+            cold.append(time.perf_counter() - t0)
+
+            t0 = time.perf_counter()
+            DocAnalyser(base_url=server.base_url, api_key="stub").classify(doc)
+            warm.append(time.perf_counter() - t0)
+    return {
+        "server_latency_s": latency,
+        "process_s": _median(process),
+        "cold_s": _median(cold),
+        "warm_s": _median(warm),
+        "http2": clients.http2_available(),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.0, help="Mock server latency per request")
+    parser.add_argument("-o", "--output", type=Path, default=None, help="Write JSON here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    report = {
+        "imports": measure_imports(args.repeat),
+        "first_request": measure_first_request(args.repeat, args.latency),
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
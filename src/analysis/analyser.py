@@ -1,26 +1,431 @@
 from __future__ import annotations
 
+import abc
 import json
 import os
-from typing import Dict, List, Optional
+from typing import TYPE_CHECKING, Dict, Generator, List, NamedTuple, Optional, Sequence, Tuple, TypeVar, Union
 
-from openai import OpenAI
-import requests
+from src.ingestion.loader import page_ranges, pdf_chunks
+from src.ingestion.preprocess import estimate_payload_tokens
+from src.ingestion.types import IngestedFile, PageChunk
+from src.instrumentation import breakdown, collect, enabled, span
 
-from src.ingestion.types import IngestedFile
+from .cache import AnalysisCache, cache_key, prompt_version
+from .cascade import ModelCascade
+from .chunking import map_chunks, merge_extractions, merge_texts
+from .clients import http_client, openai_client
+from .dedup import DuplicateMatch, NearDuplicateIndex
+from .preclassifier import PreClassifier
+from .prompts import (
+    BATCH_CLASSIFY_INSTRUCTION,
+    CLASSIFY_INSTRUCTION,
+    DOCUMENT_FIRST_SYSTEM,
+    EXTRACTION_INSTRUCTIONS_CATEGORY,
+    OCR_INSTRUCTION,
+    SINGLE_PASS_INSTRUCTION,
+    with_schema,
+    without_raw_text,
+)
+from .scheduler import RequestScheduler, estimate_tokens
+from .schemas import (
+    FIELDS,
+    batch_classification_schema,
+    classification_schema,
+    extraction_schema_for,
+    fields_for,
+    ocr_schema,
+    single_pass_schema,
+)
+from .types import AnalysisResult, DocCategory, ClassificationResult, DeferredText, ExtractionResult, stored_raw_text
 
-from .prompts import CLASSIFY_INSTRUCTION, EXTRACTION_INSTRUCTIONS_CATEGORY
-from .schemas import classification_schema, extraction_schema_for
-from .types import AnalysisResult, DocCategory, ClassificationResult, ExtractionResult
+if TYPE_CHECKING:
+    from openai import OpenAI
 
 
-class DocAnalyser:
-    """Encapsulates client, classification, and extraction logic.
+ANALYSIS_MODES = ("two_step", "single_pass", "document_first")
 
-    Usage:
-        analyser = DocAnalyser()
-        cls = analyser.classify(ingested)
-        ext = analyser.extract(ingested, cls.category)
+# none: fields only; inline: OCR text in the extraction response;
+# deferred: fields only, OCR fetched by a separate request when first read
+RAW_TEXT_MODES = ("none", "inline", "deferred")
+
+# Estimated prompt tokens (see ``estimate_tokens``) per batched classification request
+BATCH_TOKEN_BUDGET = 24_000
+
+# Used for PDF ``file`` blocks when the requested model is not an OpenAI one
+NATIVE_PDF_MODEL = "openai/gpt-4o"
+
+T = TypeVar("T")
+
+
+def _response_format(schema: Dict) -> Dict:
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": "schema", "schema": schema},
+    }
+
+
+def _route_model(model: str, blocks: List[dict], prefer_native_openai: bool) -> str:
+    # For PDFs, some OpenRouter Azure instances don't support file content
+    # Force native OpenAI routing for better PDF support; OpenAI models
+    # (including the cheaper cascade tiers) read files natively
+    if model.startswith("openai/"):
+        return model
+    if prefer_native_openai and any(block.get("type") == "file" for block in blocks):
+        return NATIVE_PDF_MODEL  # Ensure we hit native OpenAI, not Azure
+    return model
+
+
+def _prepend_instruction(instruction: str, blocks: List[dict]) -> List[dict]:
+    return [{"type": "text", "text": instruction}, *blocks]
+
+
+def _request_body(blocks: List[dict], schema: Dict, instruction: Optional[str] = None) -> Dict:
+    """``messages`` and ``response_format`` of one request.
+
+    Without ``instruction`` the blocks (instruction included) form a single
+    user message and ``schema`` is enforced through structured output. With
+    one, the layout is document-first: a fixed system message and the
+    document blocks come before the task instruction, so every request for
+    a document starts with the same prefix and the provider's prompt cache
+    can serve it after the first call. The provider caches the structured
+    output schema as part of that prefix, so these requests all use plain
+    ``json_object`` output and carry their schema in the final message.
+    """
+    if instruction is None:
+        return {"messages": [{"role": "user", "content": blocks}], "response_format": _response_format(schema)}
+    return {
+        "messages": [
+            {"role": "system", "content": DOCUMENT_FIRST_SYSTEM},
+            {"role": "user", "content": blocks},
+            {"role": "user", "content": with_schema(instruction, schema)},
+        ],
+        "response_format": {"type": "json_object"},
+    }
+
+
+def _parse_classification(js: Dict) -> ClassificationResult:
+    try:
+        category = DocCategory(js.get("category"))  # type: ignore[arg-type]
+    except ValueError:
+        category = DocCategory.OTHER
+    conf = float(js.get("confidence", 0.0))
+
+    return ClassificationResult(category=category, confidence=conf)
+
+
+def _parse_batch_classification(js: Dict, n: int) -> Dict[int, ClassificationResult]:
+    """Valid entries of a batched classification response, by index.
+
+    Entries with an out-of-range index, an unknown category or a missing
+    confidence are dropped, as are indexes answered more than once.
+    """
+    entries = js.get("results") if isinstance(js, dict) else None
+    if not isinstance(entries, list):
+        return {}
+    out: Dict[int, ClassificationResult] = {}
+    repeated = set()
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        index = entry.get("index")
+        if not isinstance(index, int) or not 0 <= index < n:
+            continue
+        try:
+            category = DocCategory(entry.get("category"))  # type: ignore[arg-type]
+            conf = float(entry["confidence"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if index in out:
+            repeated.add(index)
+        out[index] = ClassificationResult(category=category, confidence=conf)
+    for index in repeated:
+        del out[index]
+    return out
+
+
+def _parse_extraction(js: Dict) -> ExtractionResult:
+    fields = js.get("fields", {}) if isinstance(js, dict) else {}
+    raw_text = js.get("raw_text") if isinstance(fields, dict) else None
+
+    return ExtractionResult(
+        fields=fields,
+        raw_text=raw_text,
+    )
+
+
+def _parse_single_pass(js: Dict, raw_text: bool = True) -> Optional[AnalysisResult]:
+    """Map a single-pass response onto ``AnalysisResult``.
+
+    Returns None when the response is unusable: an unknown category, or
+    fields that do not belong to the returned category (missing required
+    keys, or keys that only exist in another category's schema). Without
+    ``raw_text`` (the schema did not ask for it) any ``raw_text`` in the
+    response is dropped.
+    """
+    body = js.get("analysis") if isinstance(js, dict) else None
+    if not isinstance(body, dict):
+        return None
+    try:
+        category = DocCategory(body.get("category"))  # type: ignore[arg-type]
+    except ValueError:
+        return None
+    fields = body.get("fields")
+    if not isinstance(fields, dict):
+        return None
+
+    expected = set(fields_for(category))
+    foreign = {k for spec in FIELDS.values() for k in spec} - expected
+    if not expected.issubset(fields) or foreign.intersection(fields):
+        return None
+
+    return AnalysisResult(
+        category=category,
+        confidence=float(body.get("confidence", 0.0)),
+        fields=fields,
+        raw_text=body.get("raw_text") if raw_text else None,
+    )
+
+
+def _doc_id(doc: IngestedFile) -> str:
+    return doc.sha256 or str(doc.path)
+
+
+def _payload_bytes(blocks: List[dict]) -> int:
+    """Approximate request size: the text and data URIs carried by ``blocks``."""
+    total = 0
+    for block in blocks:
+        if block.get("type") == "text":
+            total += len(block.get("text", ""))
+        elif block.get("type") == "image_url":
+            total += len(block["image_url"]["url"])
+        elif block.get("type") == "file":
+            total += len(block["file"].get("file_data", ""))
+    return total
+
+
+def _record_usage(sp, response: object) -> None:
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    details = getattr(usage, "prompt_tokens_details", None)
+    sp.add(
+        prompt_tokens=usage.prompt_tokens,
+        completion_tokens=usage.completion_tokens,
+        cached_tokens=getattr(details, "cached_tokens", None) or 0,
+    )
+
+
+def _classify_input(doc: IngestedFile) -> List[dict]:
+    return doc.classify_blocks or doc.blocks
+
+
+def _classify_tokens(doc: IngestedFile) -> int:
+    """Estimated prompt tokens of ``_classify_input(doc)``, from its payloads."""
+    return estimate_payload_tokens(doc.classify_payloads or doc.payloads)
+
+
+def _batch_blocks(docs: Sequence[IngestedFile]) -> List[dict]:
+    blocks: List[dict] = [{"type": "text", "text": BATCH_CLASSIFY_INSTRUCTION}]
+    for i, doc in enumerate(docs):
+        blocks.append({"type": "text", "text": f"Document {i}:"})
+        blocks.extend(_classify_input(doc))
+    return blocks
+
+
+def _pack_batches(sizes: Sequence[int], max_docs: int, token_budget: int) -> List[List[int]]:
+    """Greedy in-order packing of positions into batches of at most
+    ``max_docs`` items and ``token_budget`` estimated tokens. An item
+    larger than the budget gets a batch of its own."""
+    if max_docs < 1:
+        raise ValueError("max_docs_per_request must be >= 1")
+    batches: List[List[int]] = []
+    current: List[int] = []
+    used = 0
+    for pos, size in enumerate(sizes):
+        if current and (len(current) >= max_docs or used + size > token_budget):
+            batches.append(current)
+            current, used = [], 0
+        current.append(pos)
+        used += size
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _halves(items: List[int]) -> List[List[int]]:
+    mid = (len(items) + 1) // 2
+    return [part for part in (items[:mid], items[mid:]) if part]
+
+
+def _check_raw_text_mode(raw_text: str) -> None:
+    if raw_text not in RAW_TEXT_MODES:
+        raise ValueError(f"Unsupported raw_text mode: {raw_text}")
+
+
+def _extract_stage(category: DocCategory, inline: bool = True, pages_per_chunk: Optional[int] = None) -> str:
+    stage = f"extract:{category.value}"
+    if pages_per_chunk:
+        stage += f":pages{pages_per_chunk}"
+    return stage if inline else f"{stage}:fields"
+
+
+def _ocr_stage(pages_per_chunk: Optional[int] = None) -> str:
+    return f"ocr:pages{pages_per_chunk}" if pages_per_chunk else "ocr"
+
+
+def _single_pass_stage(inline: bool) -> str:
+    return "single_pass" if inline else "single_pass:fields"
+
+
+def _single_pass_instruction(inline: bool) -> str:
+    return SINGLE_PASS_INSTRUCTION if inline else without_raw_text(SINGLE_PASS_INSTRUCTION)
+
+
+def _extraction_instruction(category: DocCategory, inline: bool) -> str:
+    instruction = EXTRACTION_INSTRUCTIONS_CATEGORY[category]
+    return instruction if inline else without_raw_text(instruction)
+
+
+def _parse_ocr(js: Dict) -> Optional[str]:
+    text = js.get("raw_text") if isinstance(js, dict) else None
+    return text if isinstance(text, str) else None
+
+
+def _cache_get(
+    cache: Optional[AnalysisCache], doc: IngestedFile, model: str, stage: str
+) -> Optional[Dict]:
+    if cache is None or not doc.sha256:
+        return None
+    return cache.get(cache_key(doc.sha256, model, stage))
+
+
+def _cache_set(
+    cache: Optional[AnalysisCache], doc: IngestedFile, model: str, stage: str, value: Dict
+) -> None:
+    if cache is not None and doc.sha256:
+        cache.set(cache_key(doc.sha256, model, stage), value)
+
+
+def _cached_classification(
+    cache: Optional[AnalysisCache], doc: IngestedFile, model: str
+) -> Optional[ClassificationResult]:
+    cached = _cache_get(cache, doc, model, "classify")
+    if cached is None:
+        return None
+    cls = _parse_classification(cached)
+    cls.tier = model
+    return cls
+
+
+def _cached_extraction(
+    cache: Optional[AnalysisCache], doc: IngestedFile, model: str, stage: str
+) -> Optional[ExtractionResult]:
+    cached = _cache_get(cache, doc, model, stage)
+    if cached is None:
+        return None
+    ext = _parse_extraction(cached)
+    ext.tier = model
+    return ext
+
+
+def _local_classification(
+    cache: Optional[AnalysisCache],
+    preclassifier: Optional[PreClassifier],
+    doc: IngestedFile,
+    model: str,
+) -> Tuple[Optional[ClassificationResult], Optional[ClassificationResult]]:
+    """(answer without a request, if any; pre-classifier guess to compare)."""
+    cached = _cached_classification(cache, doc, model)
+    if cached is not None:
+        return cached, None
+    if preclassifier is None:
+        return None, None
+    guess, use = preclassifier.consult(doc)
+    return (guess if use else None), guess
+
+
+def _dedup_namespace(model: str) -> str:
+    return f"{model}:{prompt_version()}"
+
+
+def _dedup_lookup(
+    index: Optional[NearDuplicateIndex], doc: IngestedFile, model: str
+) -> Optional[DuplicateMatch]:
+    if index is None:
+        return None
+    with span("dedup_lookup", doc=_doc_id(doc)) as sp:
+        match = index.lookup(doc, _dedup_namespace(model))
+        if match is not None:
+            sp.set(distance=match.distance, reuse=index.reuse)
+    return match
+
+
+def _dedup_record(
+    index: Optional[NearDuplicateIndex], doc: IngestedFile, model: str, res: AnalysisResult
+) -> None:
+    if index is not None:
+        index.record(doc, res.to_dict(fetch_raw_text=False), _dedup_namespace(model))
+
+
+def _combine(cls: ClassificationResult, ext: ExtractionResult) -> AnalysisResult:
+    return AnalysisResult(
+        category=cls.category,
+        confidence=cls.confidence,
+        fields=ext.fields,
+        raw_text=stored_raw_text(ext),  # keeps a deferred fetch deferred
+        tiers={"classify": cls.tier, "extract": ext.tier},
+    )
+
+
+def _chunk_size(doc: IngestedFile, pages_per_chunk: Optional[int]) -> Optional[int]:
+    """``pages_per_chunk`` if ``doc`` is a PDF long enough to be chunked, else None."""
+    if not pages_per_chunk or doc.pdf is None or not page_ranges(doc.pdf.page_count, pages_per_chunk):
+        return None
+    return pages_per_chunk
+
+
+def _tier_models(model: str, cascade: Optional[ModelCascade]) -> Tuple[str, ...]:
+    return cascade.models if cascade is not None else (model,)
+
+
+def _single_pass_tiers(res: AnalysisResult, model: str) -> AnalysisResult:
+    res.tiers = {"classify": model, "extract": model}
+    return res
+
+
+def _reused(res: AnalysisResult) -> AnalysisResult:
+    res.tiers = {"classify": "dedup", "extract": "dedup"}
+    return res
+
+
+class _Call(NamedTuple):
+    """One provider request, yielded by a plan (see ``_AnalyserBase``)."""
+    blocks: List[dict]
+    schema: Dict
+    model: str
+    instruction: Optional[str] = None  # document-first layout when set
+
+
+class _Concurrently(NamedTuple):
+    """Sub-plans that may run at the same time, yielded by a plan."""
+    plans: List["Plan"]
+
+
+# A plan yields ``_Call``s and ``_Concurrently``s and returns its result
+Plan = Generator[Union[_Call, _Concurrently], object, T]
+
+
+class _AnalyserBase(abc.ABC):
+    """Analysis logic shared by ``DocAnalyser`` and ``AsyncDocAnalyser``.
+
+    Every operation is written once, as a plan: a generator that builds
+    requests, checks caches, parses answers and assembles results. It
+    yields a ``_Call`` for each provider request (the driver sends back the
+    parsed JSON, or throws the request's exception into the plan) and a
+    ``_Concurrently`` for sub-plans that may run at the same time (the
+    driver sends back their results, in order). Subclasses only drive
+    plans: ``DocAnalyser`` with blocking requests and threads,
+    ``AsyncDocAnalyser`` with awaits and ``asyncio.gather``.
     """
 
     def __init__(
@@ -28,103 +433,530 @@ class DocAnalyser:
         model: str = "openai/gpt-4o",
         base_url: str = "https://openrouter.ai/api/v1",
         api_key: Optional[str] = None,
+        cache: Optional[AnalysisCache] = None,
+        scheduler: Optional[RequestScheduler] = None,
+        attach_metrics: bool = False,
+        preclassifier: Optional[PreClassifier] = None,
+        dedup: Optional[NearDuplicateIndex] = None,
+        cascade: Optional[ModelCascade] = None,
+        pages_per_chunk: Optional[int] = None,
     ) -> None:
+        if pages_per_chunk is not None and pages_per_chunk < 1:
+            raise ValueError("pages_per_chunk must be >= 1")
         self.model = model
-        self.client = OpenAI(
-            base_url=base_url,
-            api_key=api_key or os.getenv("OPENROUTER_API_KEY"),
-        )
+        self.cascade = cascade
+        self.pages_per_chunk = pages_per_chunk
+        self.cache = cache
+        self.scheduler = scheduler
+        self.attach_metrics = attach_metrics
+        self.preclassifier = preclassifier
+        self.dedup = dedup
+        self.base_url = base_url
+        self.api_key = api_key or os.getenv("OPENROUTER_API_KEY")
 
-    def _chat_json(self, blocks: List[dict], schema: Dict, prefer_native_openai: bool = False) -> Dict:
-        # For PDFs, some OpenRouter Azure instances don't support file content
-        # Force native OpenAI routing for better PDF support
-        model = self.model
-        if prefer_native_openai and any(block.get("type") == "file" for block in blocks):
-            model = "openai/gpt-4o"  # Ensure we hit native OpenAI, not Azure
-
-        r = self.client.chat.completions.create(
-            model=model,
-            messages=[{"role": "user", "content": blocks}],
-            response_format={
-                "type": "json_schema",
-                "json_schema": {"name": "schema", "schema": schema},
-            },
-        )
+    @property
+    def models(self) -> Tuple[str, ...]:
+        """Models to try, cheapest first: the cascade's, or just ``model``."""
+        return _tier_models(self.model, self.cascade)
+
+    @abc.abstractmethod
+    def _deferred_ocr(self, doc: IngestedFile, model: Optional[str], document_first: bool) -> DeferredText:
+        """``ocr(doc, model, document_first)``, run when the text is first read."""
+
+    # ----- classification -----
+
+    def _classify_plan(self, doc: IngestedFile, document_first: bool = False) -> Plan[ClassificationResult]:
+        first = self.models[0]
+        with span("classify", doc=_doc_id(doc)) as sp:
+            guess = None
+            cls = _cached_classification(self.cache, doc, first)
+            if cls is not None:
+                sp.set(cached=True)
+            else:
+                if self.preclassifier is not None:
+                    guess, use = self.preclassifier.consult(doc)
+                    if use:
+                        sp.set(preclassified=True)
+                        return guess
+                cls = yield from self._classify_request(doc, document_first, first)
+
+            cls = yield from self._escalate_classification(doc, cls, document_first)
+            if self.cascade is not None:
+                sp.set(tier=cls.tier)
+            if self.preclassifier is not None:
+                self.preclassifier.compare(guess, cls)
+
+        return cls
+
+    def _classify_request(
+        self, doc: IngestedFile, document_first: bool = False, model: Optional[str] = None
+    ) -> Plan[ClassificationResult]:
+        model = model or self.models[0]
+        if document_first:
+            call = _Call(doc.blocks, classification_schema(), model, CLASSIFY_INSTRUCTION)
+        else:
+            call = _Call(_prepend_instruction(CLASSIFY_INSTRUCTION, _classify_input(doc)), classification_schema(), model)
+        cls = _parse_classification((yield call))
+        _cache_set(self.cache, doc, model, "classify", cls.to_dict())
+        cls.tier = model
+        return cls
+
+    def _escalate_classification(
+        self, doc: IngestedFile, cls: ClassificationResult, document_first: bool = False
+    ) -> Plan[ClassificationResult]:
+        """Move ``cls`` up the cascade until a tier's answer is accepted.
+        Answers that did not come from a model tier are returned as is."""
+        models = self.models
+        if self.cascade is None or cls.tier not in models:
+            return cls
+        tier = models.index(cls.tier)
+        while tier < len(models) - 1 and not self.cascade.accepts_classification(cls):
+            tier += 1
+            cls = _cached_classification(self.cache, doc, models[tier])
+            if cls is None:
+                cls = yield from self._classify_request(doc, document_first, models[tier])
+        self.cascade.record("classify", tier, cls.category)
+        return cls
+
+    def _classify_batch_plan(
+        self, docs: Sequence[IngestedFile], max_docs_per_request: int, token_budget: int
+    ) -> Plan[List[ClassificationResult]]:
+        results: List[Optional[ClassificationResult]] = [None] * len(docs)
+        guesses: Dict[int, Optional[ClassificationResult]] = {}
+        todo: List[int] = []
+        for i, doc in enumerate(docs):
+            local, guess = _local_classification(self.cache, self.preclassifier, doc, self.models[0])
+            if local is not None:
+                results[i] = local
+                continue
+            guesses[i] = guess
+            todo.append(i)
+
+        sizes = [_classify_tokens(docs[i]) for i in todo]
+        yield _Concurrently([
+            self._classify_group(docs, [todo[pos] for pos in batch], results)
+            for batch in _pack_batches(sizes, max_docs_per_request, token_budget)
+        ])
+        if self.cascade is not None:
+            results = list((yield _Concurrently([
+                self._escalate_classification(doc, cls) for doc, cls in zip(docs, results)
+            ])))
+
+        if self.preclassifier is not None:
+            for i, guess in guesses.items():
+                self.preclassifier.compare(guess, results[i])
+        return results
+
+    def _classify_group(
+        self, docs: Sequence[IngestedFile], indexes: List[int], results: List[Optional[ClassificationResult]]
+    ) -> Plan[None]:
+        if len(indexes) == 1:
+            results[indexes[0]] = yield from self._classify_request(docs[indexes[0]])
+            return
+
+        group = [docs[i] for i in indexes]
+        model = self.models[0]
+        with span("classify_batch", docs=len(group)) as sp:
+            try:
+                js = yield _Call(_batch_blocks(group), batch_classification_schema(), model)
+            except Exception:  # provider error, or no or unparseable JSON: split and retry
+                js = {}
+            answered = _parse_batch_classification(js, len(group))
+            sp.set(answered=len(answered))
+
+        for pos, cls in answered.items():
+            cls.tier = model
+            results[indexes[pos]] = cls
+            _cache_set(self.cache, group[pos], model, "classify", cls.to_dict())
+        missing = [i for pos, i in enumerate(indexes) if pos not in answered]
+        if missing:
+            yield _Concurrently([self._classify_group(docs, part, results) for part in _halves(missing)])
+
+    # ----- extraction and OCR -----
+
+    def _extract_plan(
+        self, doc: IngestedFile, category: DocCategory, document_first: bool = False, raw_text: str = "inline"
+    ) -> Plan[ExtractionResult]:
+        _check_raw_text_mode(raw_text)
+        inline = raw_text == "inline"
+        chunk_size = _chunk_size(doc, self.pages_per_chunk)
+        stage = _extract_stage(category, inline, chunk_size)
+        chunks: Optional[List[PageChunk]] = None
+        models = self.models
+        with span("extract", doc=_doc_id(doc), category=category.value) as sp:
+            for tier, model in enumerate(models):
+                ext = _cached_extraction(self.cache, doc, model, stage)
+                if ext is not None:
+                    sp.set(cached=True)
+                else:
+                    if chunk_size and chunks is None:
+                        chunks = pdf_chunks(doc, chunk_size)
+                        sp.set(chunks=len(chunks))
+                    if chunks:
+                        ext = yield from self._extract_chunks(doc, chunks, category, model, inline)
+                    else:
+                        ext = yield from self._extract_request(doc, category, document_first, model, inline)
+                    _cache_set(self.cache, doc, model, stage, ext.to_dict())
+                if self.cascade is None or tier == len(models) - 1 or self.cascade.accepts_extraction(category, ext):
+                    break
+            if self.cascade is not None:
+                self.cascade.record("extract", tier, category)
+                sp.set(tier=ext.tier)
+
+        if raw_text == "deferred":
+            ext.raw_text = self._deferred_ocr(doc, model, document_first)
+        return ext
+
+    def _extract_request(
+        self, doc: IngestedFile, category: DocCategory, document_first: bool, model: str, inline: bool = True
+    ) -> Plan[ExtractionResult]:
+        schema = extraction_schema_for(category, raw_text=inline)
+        instruction = _extraction_instruction(category, inline)
+        if document_first:
+            call = _Call(doc.blocks, schema, model, instruction)
+        else:
+            call = _Call(_prepend_instruction(instruction, doc.blocks), schema, model)
+        ext = _parse_extraction((yield call))
+        ext.tier = model
+        return ext
+
+    def _extract_chunks(
+        self, doc: IngestedFile, chunks: List[PageChunk], category: DocCategory, model: str, inline: bool = True
+    ) -> Plan[ExtractionResult]:
+        schema = extraction_schema_for(category, raw_text=inline)
+        instruction = _extraction_instruction(category, inline)
+
+        def extract_chunk(chunk: PageChunk) -> Plan[ExtractionResult]:
+            with span("extract_chunk", doc=_doc_id(doc), pages=chunk.label):
+                return _parse_extraction((yield _Call(_prepend_instruction(instruction, chunk.blocks), schema, model)))
+
+        ext = merge_extractions(category, (yield _Concurrently([extract_chunk(c) for c in chunks])))
+        ext.tier = model
+        return ext
+
+    def _ocr_plan(
+        self, doc: IngestedFile, model: Optional[str] = None, document_first: bool = False
+    ) -> Plan[Optional[str]]:
+        model = model or self.models[0]
+        chunk_size = _chunk_size(doc, self.pages_per_chunk)
+        stage = _ocr_stage(chunk_size)
+        with span("ocr", doc=_doc_id(doc)) as sp:
+            cached = _cache_get(self.cache, doc, model, stage)
+            if cached is not None:
+                sp.set(cached=True)
+                return _parse_ocr(cached)
+
+            chunks = pdf_chunks(doc, chunk_size) if chunk_size else []
+            if chunks:
+                sp.set(chunks=len(chunks))
+
+                def ocr_chunk(chunk: PageChunk) -> Plan[Optional[str]]:
+                    with span("ocr_chunk", doc=_doc_id(doc), pages=chunk.label):
+                        return _parse_ocr((yield _Call(_prepend_instruction(OCR_INSTRUCTION, chunk.blocks), ocr_schema(), model)))
+
+                text = merge_texts((yield _Concurrently([ocr_chunk(c) for c in chunks])))
+            else:
+                with doc.materialised():
+                    if document_first:
+                        call = _Call(doc.blocks, ocr_schema(), model, OCR_INSTRUCTION)
+                    else:
+                        call = _Call(_prepend_instruction(OCR_INSTRUCTION, doc.blocks), ocr_schema(), model)
+                    text = _parse_ocr((yield call))
+            _cache_set(self.cache, doc, model, stage, {"raw_text": text})
+
+        return text
+
+    # ----- combined analysis -----
+
+    def _single_pass_plan(self, doc: IngestedFile, raw_text: str = "inline") -> Plan[Optional[AnalysisResult]]:
+        _check_raw_text_mode(raw_text)
+        inline = raw_text == "inline"
+        stage = _single_pass_stage(inline)
+        models = self.models
+        with span("single_pass", doc=_doc_id(doc)) as sp:
+            for tier, model in enumerate(models):
+                cached = _cache_get(self.cache, doc, model, stage)
+                if cached is not None:
+                    sp.set(cached=True)
+                    res = _parse_single_pass({"analysis": cached}, inline)
+                else:
+                    blocks = _prepend_instruction(_single_pass_instruction(inline), doc.blocks)
+                    res = _parse_single_pass((yield _Call(blocks, single_pass_schema(inline), model)), inline)
+                    if res is not None:
+                        _cache_set(self.cache, doc, model, stage, res.to_dict())
+                    else:
+                        sp.set(inconsistent=True)
+                if self.cascade is None or tier == len(models) - 1:
+                    break
+                if res is not None and self.cascade.accepts_analysis(res):
+                    break
+            if res is not None and self.cascade is not None:
+                self.cascade.record("classify", tier, res.category)
+                self.cascade.record("extract", tier, res.category)
+                sp.set(tier=model)
+
+        if res is None:
+            return None
+        if raw_text == "deferred":
+            res.raw_text = self._deferred_ocr(doc, model, False)
+        return _single_pass_tiers(res, model)
+
+    def _analyse_plan(self, doc: IngestedFile, mode: str, raw_text: str = "inline") -> Plan[AnalysisResult]:
+        if mode not in ANALYSIS_MODES:
+            raise ValueError(f"Unsupported analysis mode: {mode}")
+        _check_raw_text_mode(raw_text)
+        with doc.materialised():  # every request for the document shares one encoding
+            if not self.attach_metrics:
+                return (yield from self._analyse_steps(doc, mode, raw_text))
+            with collect() as records:
+                res = yield from self._analyse_steps(doc, mode, raw_text)
+        res.metrics = breakdown(records)
+        return res
+
+    def _analyse_steps(self, doc: IngestedFile, mode: str, raw_text: str) -> Plan[AnalysisResult]:
+        document_first = mode == "document_first"
+        match = _dedup_lookup(self.dedup, doc, self.model)
+        if match is not None and self.dedup.reuse == "result":
+            reused = _parse_single_pass({"analysis": match.result})
+            if reused is not None:
+                self.dedup.count_reuse("result")
+                if reused.raw_text is None and raw_text == "inline":
+                    reused.raw_text = yield from self._ocr_plan(doc, document_first=document_first)
+                elif reused.raw_text is None and raw_text == "deferred":
+                    reused.raw_text = self._deferred_ocr(doc, None, document_first)
+                return _reused(reused)
+
+        res = None
+        # a chunked PDF needs the per-chunk extraction of ``two_step``
+        if mode == "single_pass" and match is None and not _chunk_size(doc, self.pages_per_chunk):
+            res = yield from self._single_pass_plan(doc, raw_text)
+        if res is None:
+            if match is not None:
+                cls = _parse_classification(match.result)
+                cls.tier = "dedup"
+                self.dedup.count_reuse("classification")
+            else:
+                cls = yield from self._classify_plan(doc, document_first)
+            ext = yield from self._extract_plan(doc, cls.category, document_first, raw_text)
+            res = _combine(cls, ext)
+
+        if match is None:  # a reused answer is recorded under the original only
+            _dedup_record(self.dedup, doc, self.model, res)
+        return res
+
+
+class DocAnalyser(_AnalyserBase):
+    """Encapsulates client, classification, and extraction logic.
+
+    Usage:
+        analyser = DocAnalyser()
+        cls = analyser.classify(ingested)
+        ext = analyser.extract(ingested, cls.category)
+
+    Pass a ``cache`` (see ``src.analysis.cache``) to reuse results for files
+    whose ``sha256`` has been analysed before with the same model and prompts.
+    With ``attach_metrics``, ``analyse`` stores the document's per-stage
+    timings and token counts (see ``src.instrumentation``) on
+    ``AnalysisResult.metrics``. A ``preclassifier`` (see
+    ``src.analysis.preclassifier``) answers classification locally when it
+    is confident, skipping that request. A ``dedup`` index (see
+    ``src.analysis.dedup``) reuses the result, or only the classification,
+    of a perceptually near-identical image analysed before. With a
+    ``cascade`` (see ``src.analysis.cascade``) its models replace ``model``:
+    each stage starts on the cheapest one and escalates only when the
+    answer is not confident or complete enough. With ``pages_per_chunk``,
+    PDFs with more pages than that are extracted (and OCR'd) in page ranges
+    that run concurrently, and the partial results are merged (see
+    ``src.analysis.chunking``).
+    """
+
+    @property
+    def client(self) -> "OpenAI":
+        """Process-wide client for these settings (see ``src.analysis.clients``)."""
+        # the scheduler owns retries when there is one
+        return openai_client(self.base_url, self.api_key, 0 if self.scheduler is not None else None)
+
+    def _chat_json(
+        self,
+        blocks: List[dict],
+        schema: Dict,
+        prefer_native_openai: bool = False,
+        instruction: Optional[str] = None,
+        model: Optional[str] = None,
+    ) -> Dict:
+        model = _route_model(model or self.model, blocks, prefer_native_openai)
+
+        def request():
+            return self.client.chat.completions.create(
+                model=model,
+                **_request_body(blocks, schema, instruction),
+            )
+
+        with span("chat_json", model=model) as sp:
+            if enabled():
+                sp.add(bytes_sent=_payload_bytes(blocks))
+            if self.scheduler is None:
+                r = request()
+            else:
+                r = self.scheduler.call(request, tokens=estimate_tokens(blocks))
+            _record_usage(sp, r)
         content = r.choices[0].message.content
 
         return json.loads(content)
 
+    def _run(self, plan: Plan[T]) -> T:
+        """Drive ``plan`` with blocking requests; concurrent sub-plans run on threads."""
+        send: object = None
+        error: Optional[Exception] = None
+        while True:
+            try:
+                step = plan.throw(error) if error is not None else plan.send(send)
+            except StopIteration as stop:
+                return stop.value
+            send, error = None, None
+            try:
+                if isinstance(step, _Concurrently):
+                    send = map_chunks(self._run, step.plans)
+                else:
+                    send = self._chat_json(
+                        step.blocks, step.schema, prefer_native_openai=True, instruction=step.instruction, model=step.model
+                    )
+            except Exception as e:
+                error = e
+
     def _prepend_instruction(self, instruction: str, blocks: List[dict]) -> List[dict]:
-        return [{"type": "text", "text": instruction}, *blocks]
+        return _prepend_instruction(instruction, blocks)
 
-    def classify(self, doc: IngestedFile) -> ClassificationResult:
+    def classify(self, doc: IngestedFile, document_first: bool = False) -> ClassificationResult:
         """Classify the document into a specific category.
 
         Args:
             doc (IngestedFile): The document to classify.
+            document_first (bool): Send the full document blocks in the
+                document-first layout (see ``analyse``) instead of the
+                classification thumbnail after the instruction.
 
         Returns:
             ClassificationResult: The result of the classification.
         """
-        blocks = self._prepend_instruction(CLASSIFY_INSTRUCTION, doc.blocks)
-        js = self._chat_json(blocks, classification_schema(), prefer_native_openai=True)
-        try:
-            category = DocCategory(js.get("category"))  # type: ignore[arg-type]
-        except ValueError:
-            category = DocCategory.OTHER
-        conf = float(js.get("confidence", 0.0))
+        return self._run(self._classify_plan(doc, document_first))
 
-        return ClassificationResult(category=category, confidence=conf)
+    def classify_batch(
+        self,
+        docs: Sequence[IngestedFile],
+        max_docs_per_request: int = 8,
+        token_budget: int = BATCH_TOKEN_BUDGET,
+    ) -> List[ClassificationResult]:
+        """Classify several documents with as few requests as possible.
+
+        Documents answered by the cache or a confident pre-classifier are
+        skipped. The rest are packed, in order, into requests of at most
+        ``max_docs_per_request`` documents and ``token_budget`` prompt
+        tokens, estimated from each document's payloads (see
+        ``src.ingestion.preprocess.estimate_payload_tokens``), each document
+        introduced by a "Document <i>:" label. The requests run
+        concurrently. When a request fails, or its response lacks an entry
+        or has a malformed one, only the unanswered documents are retried,
+        split in half each time; a document left on its own falls back to a normal
+        ``classify`` request. Batches go to the first cascade tier; answers
+        it is not confident about are escalated one document at a time.
+
+        Args:
+            docs (Sequence[IngestedFile]): The documents to classify.
+            max_docs_per_request (int): Maximum documents per request.
+            token_budget (int): Maximum estimated prompt tokens per request.
+
+        Returns:
+            List[ClassificationResult]: One result per document, in order.
+        """
+        return self._run(self._classify_batch_plan(docs, max_docs_per_request, token_budget))
 
     def extract(
-        self, doc: IngestedFile, category: DocCategory
+        self,
+        doc: IngestedFile,
+        category: DocCategory,
+        document_first: bool = False,
+        raw_text: str = "inline",
     ) -> ExtractionResult:
         """Extract structured information from the document.
 
         Args:
             doc (IngestedFile): The document to extract from.
             category (Category): The category of the document.
+            document_first (bool): Use the document-first layout (see
+                ``analyse``). Not used for chunked PDFs, whose chunks do not
+                share a prefix with the classification request anyway.
+            raw_text (str): ``inline``, ``none`` or ``deferred`` (see ``analyse``).
 
         Returns:
-            ExtractionResult: The result of the extraction.
+            ExtractionResult: The result of the extraction; merged from its
+            page ranges for a chunked PDF.
         """
-        schema = extraction_schema_for(category)
-        blocks = self._prepend_instruction(
-            EXTRACTION_INSTRUCTIONS_CATEGORY[category],
-            doc.blocks,
-        )
-        js = self._chat_json(blocks, schema, prefer_native_openai=True)
-        fields = js.get("fields", {}) if isinstance(js, dict) else {}
-        raw_text = js.get("raw_text") if isinstance(fields, dict) else None
+        return self._run(self._extract_plan(doc, category, document_first, raw_text))
 
-        return ExtractionResult(
-            fields=fields,
-            raw_text=raw_text,
-        )
+    def ocr(self, doc: IngestedFile, model: Optional[str] = None, document_first: bool = False) -> Optional[str]:
+        """Transcribe the document's full text, in a request of its own.
+
+        Args:
+            doc (IngestedFile): The document to transcribe. Its payloads
+                must not have been released.
+            model (Optional[str]): Model to ask; the first tier by default.
+            document_first (bool): Use the document-first layout, so the
+                request can reuse the provider's cached document prefix.
+                Not used for chunked PDFs.
 
-    def analyse(self, doc: IngestedFile) -> AnalysisResult:
+        Returns:
+            Optional[str]: The text, or None if the response had none. A
+            chunked PDF's text is its chunks' texts in page order.
+        """
+        return self._run(self._ocr_plan(doc, model, document_first))
+
+    def _deferred_ocr(self, doc: IngestedFile, model: Optional[str], document_first: bool) -> DeferredText:
+        return DeferredText(lambda: self.ocr(doc, model, document_first))
+
+    def analyse_single_pass(self, doc: IngestedFile, raw_text: str = "inline") -> Optional[AnalysisResult]:
+        """Classify and extract in one request using the combined schema.
+
+        Args:
+            doc (IngestedFile): The document to analyse.
+            raw_text (str): ``inline``, ``none`` or ``deferred`` (see ``analyse``).
+
+        Returns:
+            Optional[AnalysisResult]: The result, or None if the returned
+            category and fields don't match.
+        """
+        return self._run(self._single_pass_plan(doc, raw_text))
+
+    def analyse(self, doc: IngestedFile, mode: str = "two_step", raw_text: str = "inline") -> AnalysisResult:
         """Classify and extract information from the document.
 
         Args:
             doc (IngestedFile): The document to analyse.
+            mode (str): ``two_step`` (classify, then extract),
+                ``single_pass`` (one request; falls back to ``two_step``
+                when the response is inconsistent, and is not used for
+                PDFs chunked by ``pages_per_chunk``) or ``document_first``
+                (``two_step`` with both requests starting with the same
+                system message and document blocks and the instruction
+                last, so the extraction request can hit the provider's
+                prompt cache; see ``cached_tokens`` in the metrics).
+            raw_text (str): ``inline`` asks for the full OCR text in the
+                extraction response. ``none`` asks for ``fields`` only,
+                which returns much sooner for text-heavy documents, and
+                leaves ``raw_text`` None. ``deferred`` is ``none`` plus a
+                separate OCR request made when ``raw_text`` is first read
+                (or in the background after ``prefetch_raw_text()``); the
+                document's payloads must still be available then.
         Returns:
             AnalysisResult: The combined result of classification and extraction.
         """
-        cls = self.classify(doc)
-        ext = self.extract(doc, cls.category)
-
-        return AnalysisResult(
-            category=cls.category,
-            confidence=cls.confidence,
-            fields=ext.fields,
-            raw_text=ext.raw_text,
-        )
+        return self._run(self._analyse_plan(doc, mode, raw_text))
 
     def api_key_usage(self) -> Dict:
         """Check the current API key usage."""
-        r = requests.get(
+        r = http_client().get(
             "https://openrouter.ai/api/v1/key",
-            headers={"Authorization": f"Bearer {os.environ['OPENROUTER_API_KEY']}"},
+            headers={"Authorization": f"Bearer {self.api_key}"},
             timeout=10,
         )
 
@@ -0,0 +1,293 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, AsyncIterator, Dict, Iterable, List, Optional, Sequence, TypeVar
+
+from src.ingestion.types import IngestedFile
+from src.instrumentation import enabled, span
+
+from .analyser import (
+    BATCH_TOKEN_BUDGET,
+    Plan,
+    _AnalyserBase,
+    _Concurrently,
+    _payload_bytes,
+    _record_usage,
+    _request_body,
+    _route_model,
+)
+from .clients import aclose_loop_clients, async_openai_client
+from .scheduler import estimate_tokens
+from .types import AnalysisResult, ClassificationResult, DeferredText, DocCategory, ExtractionResult
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+T = TypeVar("T")
+
+
+@dataclass
+class BatchOutcome:
+    """Result of analysing one document as part of a batch.
+
+    Exactly one of ``result`` and ``error`` is set.
+    """
+
+    index: int  # position of the document in the input
+    doc: IngestedFile
+    result: Optional[AnalysisResult] = None
+    error: Optional[BaseException] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class AsyncDocAnalyser(_AnalyserBase):
+    """asyncio counterpart of ``DocAnalyser`` built on ``AsyncOpenAI``; the
+    analysis logic is shared with it (see ``_AnalyserBase``).
+
+    Usage:
+        analyser = AsyncDocAnalyser()
+        async for outcome in analyser.analyse_many(docs, max_concurrency=8):
+            print(outcome.doc.path.name, outcome.result or outcome.error)
+    """
+
+    @property
+    def client(self) -> "AsyncOpenAI":
+        """Shared client for the running event loop (see ``src.analysis.clients``)."""
+        # the scheduler owns retries when there is one
+        return async_openai_client(self.base_url, self.api_key, 0 if self.scheduler is not None else None)
+
+    async def _chat_json(
+        self,
+        blocks: List[dict],
+        schema: Dict,
+        prefer_native_openai: bool = False,
+        instruction: Optional[str] = None,
+        model: Optional[str] = None,
+    ) -> Dict:
+        model = _route_model(model or self.model, blocks, prefer_native_openai)
+
+        def request():
+            return self.client.chat.completions.create(
+                model=model,
+                **_request_body(blocks, schema, instruction),
+            )
+
+        with span("chat_json", model=model) as sp:
+            if enabled():
+                sp.add(bytes_sent=_payload_bytes(blocks))
+            if self.scheduler is None:
+                r = await request()
+            else:
+                r = await self.scheduler.acall(request, tokens=estimate_tokens(blocks))
+            _record_usage(sp, r)
+        content = r.choices[0].message.content
+
+        return json.loads(content)
+
+    async def _arun(self, plan: Plan[T]) -> T:
+        """Drive ``plan`` with awaited requests; concurrent sub-plans are gathered."""
+        send: object = None
+        error: Optional[Exception] = None
+        while True:
+            try:
+                step = plan.throw(error) if error is not None else plan.send(send)
+            except StopIteration as stop:
+                return stop.value
+            send, error = None, None
+            try:
+                if isinstance(step, _Concurrently):
+                    send = list(await asyncio.gather(*(self._arun(p) for p in step.plans)))
+                else:
+                    send = await self._chat_json(
+                        step.blocks, step.schema, prefer_native_openai=True, instruction=step.instruction, model=step.model
+                    )
+            except Exception as e:
+                error = e
+
+    async def classify(self, doc: IngestedFile, document_first: bool = False) -> ClassificationResult:
+        """Classify the document into a specific category.
+
+        Args:
+            doc (IngestedFile): The document to classify.
+            document_first (bool): Send the full document blocks in the
+                document-first layout (see ``DocAnalyser.analyse``) instead
+                of the classification thumbnail after the instruction.
+
+        Returns:
+            ClassificationResult: The result of the classification.
+        """
+        return await self._arun(self._classify_plan(doc, document_first))
+
+    async def classify_batch(
+        self,
+        docs: Sequence[IngestedFile],
+        max_docs_per_request: int = 8,
+        token_budget: int = BATCH_TOKEN_BUDGET,
+    ) -> List[ClassificationResult]:
+        """Classify several documents with as few requests as possible.
+
+        Same packing and retry rules as ``DocAnalyser.classify_batch``;
+        the batches, and the halves of a retried batch, run concurrently.
+
+        Args:
+            docs (Sequence[IngestedFile]): The documents to classify.
+            max_docs_per_request (int): Maximum documents per request.
+            token_budget (int): Maximum estimated prompt tokens per request.
+
+        Returns:
+            List[ClassificationResult]: One result per document, in order.
+        """
+        return await self._arun(self._classify_batch_plan(docs, max_docs_per_request, token_budget))
+
+    async def extract(
+        self,
+        doc: IngestedFile,
+        category: DocCategory,
+        document_first: bool = False,
+        raw_text: str = "inline",
+    ) -> ExtractionResult:
+        """Extract structured information from the document.
+
+        Args:
+            doc (IngestedFile): The document to extract from.
+            category (Category): The category of the document.
+            document_first (bool): Use the document-first layout (not for chunked PDFs).
+            raw_text (str): ``inline``, ``none`` or ``deferred`` (see ``DocAnalyser.analyse``).
+
+        Returns:
+            ExtractionResult: The result of the extraction; merged from its
+            page ranges for a chunked PDF (see ``DocAnalyser.extract``).
+        """
+        return await self._arun(self._extract_plan(doc, category, document_first, raw_text))
+
+    async def ocr(
+        self, doc: IngestedFile, model: Optional[str] = None, document_first: bool = False
+    ) -> Optional[str]:
+        """Transcribe the document's full text, in a request of its own
+        (see ``DocAnalyser.ocr``)."""
+        return await self._arun(self._ocr_plan(doc, model, document_first))
+
+    def _deferred_ocr(self, doc: IngestedFile, model: Optional[str], document_first: bool) -> DeferredText:
+        """Deferred ``ocr`` for a result read synchronously, possibly later
+        and from another thread.
+
+        While the analysing loop is still running the request is scheduled
+        on it; once that loop has finished, a new one runs the request and
+        closes its transport before it ends.
+        Reading the text on the analysing loop's own thread would block it,
+        so that raises: await ``ocr`` there, or read it via ``asyncio.to_thread``.
+        """
+        loop = asyncio.get_running_loop()
+
+        async def late_ocr() -> Optional[str]:
+            try:
+                return await self.ocr(doc, model, document_first)
+            finally:
+                await aclose_loop_clients()
+
+        def load() -> Optional[str]:
+            if not loop.is_running():
+                return asyncio.run(late_ocr())
+            try:
+                current = asyncio.get_running_loop()
+            except RuntimeError:
+                current = None
+            if current is loop:
+                raise RuntimeError(
+                    "Cannot read a deferred raw_text on the event loop that produced it; "
+                    "await AsyncDocAnalyser.ocr(...) or read it with asyncio.to_thread"
+                )
+            return asyncio.run_coroutine_threadsafe(self.ocr(doc, model, document_first), loop).result()
+
+        return DeferredText(load)
+
+    async def analyse_single_pass(self, doc: IngestedFile, raw_text: str = "inline") -> Optional[AnalysisResult]:
+        """Classify and extract in one request using the combined schema.
+
+        Args:
+            doc (IngestedFile): The document to analyse.
+            raw_text (str): ``inline``, ``none`` or ``deferred`` (see ``DocAnalyser.analyse``).
+
+        Returns:
+            Optional[AnalysisResult]: The result, or None if the returned
+            category and fields don't match.
+        """
+        return await self._arun(self._single_pass_plan(doc, raw_text))
+
+    async def analyse(self, doc: IngestedFile, mode: str = "two_step", raw_text: str = "inline") -> AnalysisResult:
+        """Classify and extract information from the document.
+
+        Args:
+            doc (IngestedFile): The document to analyse.
+            mode (str): ``two_step``, ``single_pass`` or ``document_first``, as in
+                ``DocAnalyser.analyse``.
+            raw_text (str): ``inline``, ``none`` or ``deferred``, as in
+                ``DocAnalyser.analyse``. A deferred text is read with
+                ``await analyser.ocr(doc)`` on the event loop, or as
+                ``result.raw_text`` from any other thread.
+        Returns:
+            AnalysisResult: The combined result of classification and extraction.
+        """
+        return await self._arun(self._analyse_plan(doc, mode, raw_text))
+
+    async def analyse_many(
+        self,
+        docs: Iterable[IngestedFile],
+        max_concurrency: int = 8,
+        mode: str = "two_step",
+        raw_text: str = "inline",
+    ) -> AsyncIterator[BatchOutcome]:
+        """Analyse many documents concurrently, yielding in completion order.
+
+        Each document runs classify→extract as its own pipeline; at most
+        ``max_concurrency`` pipelines are in flight at once. ``docs`` is
+        consumed lazily, so it may be a generator. A failing document is
+        reported through ``BatchOutcome.error`` and does not affect the rest.
+
+        Args:
+            docs (Iterable[IngestedFile]): The documents to analyse.
+            max_concurrency (int): Maximum number of documents in flight.
+            mode (str): Analysis mode passed to ``analyse``.
+            raw_text (str): ``raw_text`` mode passed to ``analyse``.
+
+        Yields:
+            BatchOutcome: One outcome per input document.
+        """
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be >= 1")
+
+        source = enumerate(docs)
+        done: asyncio.Queue = asyncio.Queue()
+        running = max_concurrency
+
+        async def worker() -> None:
+            nonlocal running
+            try:
+                for index, doc in source:
+                    try:
+                        outcome = BatchOutcome(index=index, doc=doc, result=await self.analyse(doc, mode=mode, raw_text=raw_text))
+                    except Exception as e:  # isolate per-document failures
+                        outcome = BatchOutcome(index=index, doc=doc, error=e)
+                    done.put_nowait(outcome)
+            except Exception as e:  # ``docs`` itself failed; stop the batch
+                done.put_nowait(e)
+            finally:
+                running -= 1
+                if running == 0:
+                    done.put_nowait(None)
+
+        workers = [asyncio.create_task(worker()) for _ in range(max_concurrency)]
+        try:
+            while (item := await done.get()) is not None:
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            for w in workers:
+                w.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from hashlib import sha256
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from .prompts import (
+    BATCH_CLASSIFY_INSTRUCTION,
+    CLASSIFY_INSTRUCTION,
+    DOCUMENT_FIRST_SYSTEM,
+    EXTRACTION_INSTRUCTIONS_CATEGORY,
+    OCR_INSTRUCTION,
+    SCHEMA_INSTRUCTION,
+    SINGLE_PASS_INSTRUCTION,
+)
+from .schemas import FIELDS
+
+
+@lru_cache(maxsize=None)
+def prompt_version() -> str:
+    """Hash of every prompt and field schema that shapes an analysis result.
+
+    Part of every cache key, so editing a prompt or schema invalidates
+    previously cached entries without any manual bookkeeping. The inputs
+    are module constants, so it is computed once per process.
+    """
+    material = {
+        "classify": CLASSIFY_INSTRUCTION,
+        "classify_batch": BATCH_CLASSIFY_INSTRUCTION,
+        "document_first": DOCUMENT_FIRST_SYSTEM,
+        "document_first_schema": SCHEMA_INSTRUCTION,
+        "extract": {c.value: text for c, text in EXTRACTION_INSTRUCTIONS_CATEGORY.items()},
+        "single_pass": SINGLE_PASS_INSTRUCTION,
+        "ocr": OCR_INSTRUCTION,
+        "fields": {c.value: spec for c, spec in FIELDS.items()},
+    }
+    blob = json.dumps(material, sort_keys=True).encode("utf-8")
+    return sha256(blob).hexdigest()[:16]
+
+
+def cache_key(file_sha256: str, model: str, stage: str) -> str:
+    """Build the cache key for one analysis stage of one file.
+
+    Args:
+        file_sha256 (str): Content hash of the source file.
+        model (str): Model that produced (or will produce) the result.
+        stage (str): Stage name, e.g. ``classify`` or ``extract:invoice``.
+
+    Returns:
+        str: A hex digest usable as a key by every backend.
+    """
+    raw = "\0".join((file_sha256, model, prompt_version(), stage))
+    return sha256(raw.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class AnalysisCache:
+    """Base class for analysis result caches.
+
+    Values are JSON-serialisable dicts. Subclasses implement ``_get``,
+    ``_set`` and ``__len__``; hit/miss accounting lives here.
+    """
+
+    def __init__(self, ttl: Optional[float] = None) -> None:
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def get(self, key: str) -> Optional[Dict]:
+        value = self._get(key)
+        with self._lock:
+            if value is None:
+                self.stats.misses += 1
+            else:
+                self.stats.hits += 1
+        return value
+
+    def set(self, key: str, value: Dict) -> None:
+        self._set(key, value)
+
+    def _get(self, key: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def _set(self, key: str, value: Dict) -> None:
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+
+class MemoryCache(AnalysisCache):
+    """In-process LRU cache with optional TTL."""
+
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = None) -> None:
+        super().__init__(ttl=ttl)
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+
+    def _get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            created, value = entry
+            if self._expired(created):
+                del self._data[key]
+                self.stats.evictions += 1
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def _set(self, key: str, value: Dict) -> None:
+        with self._lock:
+            self._data[key] = (time.time(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.stats.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class DiskCache(AnalysisCache):
+    """On-disk cache, one JSON file per entry.
+
+    Files are written atomically, so several processes may share a
+    directory. Recency is tracked through file mtimes, which ``get``
+    refreshes; when ``max_entries`` is exceeded the least recently used
+    files are removed until the cache is back to 90% of the limit. The
+    entry count is tracked per instance and re-synced from disk on each
+    eviction pass, so other writers are accounted for eventually.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        max_entries: int = 100_000,
+        ttl: Optional[float] = None,
+    ) -> None:
+        super().__init__(ttl=ttl)
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self._count: Optional[int] = None
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def _get(self, key: str) -> Optional[Dict]:
+        path = self._path(key)
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if self._expired(entry.get("created", 0.0)):
+            self._remove(path)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry.get("value")
+
+    def _set(self, key: str, value: Dict) -> None:
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        is_new = not path.exists()
+        payload = json.dumps({"created": time.time(), "value": value})
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(payload)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        with self._lock:
+            if self._count is None:
+                self._count = len(self)
+            elif is_new:
+                self._count += 1
+            over = self._count > self.max_entries
+        if over:
+            self._evict()
+
+    def _entries(self):
+        return self.directory.glob("*/*.json")
+
+    def _remove(self, path: Path) -> None:
+        try:
+            path.unlink()
+        except OSError:
+            return
+        with self._lock:
+            self.stats.evictions += 1
+
+    def _evict(self) -> None:
+        entries = list(self._entries())
+        excess = len(entries) - int(self.max_entries * 0.9)
+        if excess <= 0:
+            with self._lock:
+                self._count = len(entries)
+            return
+        aged = []
+        for p in entries:
+            try:
+                aged.append((p.stat().st_mtime, p))
+            except OSError:
+                continue
+        aged.sort()
+        for _mtime, p in aged[:excess]:
+            self._remove(p)
+        with self._lock:
+            self._count = len(entries) - excess
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self._entries())
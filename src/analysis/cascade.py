@@ -0,0 +1,116 @@
+"""Confidence-driven model cascade.
+
+A ``ModelCascade`` lists models from cheapest to most capable. ``DocAnalyser``
+asks the first tier and only moves on to the next when the answer is not
+good enough:
+
+- classification: ``confidence`` is below the category's threshold
+- extraction: one of the category's required fields came back null
+
+The last tier's answer is always accepted. Each tier's answers are cached
+under that tier's model, so a re-run does not repeat the cheap requests.
+
+Usage:
+    cascade = ModelCascade(["openai/gpt-4o-mini", "openai/gpt-4o"], thresholds={DocCategory.INVOICE: 0.9})
+    analyser = DocAnalyser(cascade=cascade)
+    ...
+    print(cascade.stats.to_dict())
+
+Every result records the tier that produced each stage in
+``AnalysisResult.tiers``.
+"""
+from __future__ import annotations
+
+import threading
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+from .types import AnalysisResult, ClassificationResult, DocCategory, ExtractionResult
+
+
+DEFAULT_MODELS = ("openai/gpt-4o-mini", "openai/gpt-4o")
+DEFAULT_THRESHOLD = 0.8
+
+# Fields that make an extraction useless when null
+REQUIRED_FIELDS: Dict[DocCategory, Tuple[str, ...]] = {
+    DocCategory.INVOICE: ("total", "vendor"),
+    DocCategory.MARKETPLACE_LISTING_SCREENSHOT: ("title", "price"),
+    DocCategory.CHAT_SCREENSHOT: ("messages",),
+    DocCategory.WEBSITE_SCREENSHOT: ("title",),
+}
+
+
+@dataclass
+class CascadeStats:
+    classified: int = 0  # classifications answered by a model tier
+    classify_escalated: int = 0  # ... that needed more than the first tier
+    extracted: int = 0
+    extract_escalated: int = 0
+    escalations: int = 0  # requests sent to a later tier, both stages
+    accepted: Dict[str, int] = field(default_factory=dict)  # "stage:model" -> answers accepted
+    escalated_by_category: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def classify_escalation_rate(self) -> float:
+        return self.classify_escalated / self.classified if self.classified else 0.0
+
+    @property
+    def extract_escalation_rate(self) -> float:
+        return self.extract_escalated / self.extracted if self.extracted else 0.0
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            **asdict(self),
+            "classify_escalation_rate": self.classify_escalation_rate,
+            "extract_escalation_rate": self.extract_escalation_rate,
+        }
+
+
+class ModelCascade:
+    def __init__(
+        self,
+        models: Sequence[str] = DEFAULT_MODELS,
+        thresholds: Optional[Mapping[DocCategory, float]] = None,
+        default_threshold: float = DEFAULT_THRESHOLD,
+        required_fields: Optional[Mapping[DocCategory, Sequence[str]]] = None,
+    ) -> None:
+        if not models:
+            raise ValueError("A cascade needs at least one model")
+        self.models: Tuple[str, ...] = tuple(models)
+        self.thresholds = dict(thresholds or {})
+        self.default_threshold = default_threshold
+        self.required_fields = dict(REQUIRED_FIELDS if required_fields is None else required_fields)
+        self.stats = CascadeStats()
+        self._lock = threading.Lock()
+
+    def threshold(self, category: DocCategory) -> float:
+        return self.thresholds.get(category, self.default_threshold)
+
+    def accepts_classification(self, cls: ClassificationResult) -> bool:
+        return cls.confidence >= self.threshold(cls.category)
+
+    def missing_fields(self, category: DocCategory, fields: Mapping[str, object]) -> List[str]:
+        return [name for name in self.required_fields.get(category, ()) if fields.get(name) is None]
+
+    def accepts_extraction(self, category: DocCategory, ext: ExtractionResult) -> bool:
+        return not self.missing_fields(category, ext.fields)
+
+    def accepts_analysis(self, res: AnalysisResult) -> bool:
+        """Both checks, for a single-pass answer."""
+        return res.confidence >= self.threshold(res.category) and not self.missing_fields(res.category, res.fields)
+
+    def record(self, stage: str, tier: int, category: DocCategory) -> None:
+        """Count an accepted ``stage`` answer from ``self.models[tier]``."""
+        key = f"{stage}:{self.models[tier]}"
+        with self._lock:
+            s = self.stats
+            s.accepted[key] = s.accepted.get(key, 0) + 1
+            s.escalations += tier
+            if stage == "classify":
+                s.classified += 1
+                s.classify_escalated += int(tier > 0)
+            else:
+                s.extracted += 1
+                s.extract_escalated += int(tier > 0)
+            if tier:
+                s.escalated_by_category[category.value] = s.escalated_by_category.get(category.value, 0) + 1
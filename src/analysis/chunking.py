@@ -0,0 +1,102 @@
+"""Page-parallel extraction of long PDFs.
+
+With ``DocAnalyser(pages_per_chunk=n)`` a PDF of more than ``n`` pages is
+split into consecutive page ranges (see ``src.ingestion.loader.pdf_chunks``)
+and each range is extracted by a request of its own, all running at once,
+so time to result is that of the slowest chunk rather than the sum of all
+of them, and no single response has to carry the whole document.
+
+The partial results are merged in page order, independent of the order
+the responses arrived in:
+
+- array fields of objects (invoice ``items``, chat ``messages``) are
+  concatenated
+- array fields of plain values (``participants``, ``item_characteristics``)
+  are concatenated keeping the first occurrence of each value
+- every other field takes the first non-null value
+- ``raw_text`` is the chunks' texts joined with blank lines
+
+Usage:
+    analyser = DocAnalyser(pages_per_chunk=10)
+    ext = analyser.extract(doc, DocCategory.INVOICE)
+"""
+from __future__ import annotations
+
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Mapping, Optional, Sequence, TypeVar
+
+from .schemas import fields_for
+from .types import DocCategory, ExtractionResult, stored_raw_text
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+# Threads per chunked document; the scheduler, if any, still caps requests in flight
+MAX_CHUNK_WORKERS = 16
+
+
+def _is_array(spec: Mapping) -> bool:
+    kind = spec.get("type")
+    return kind == "array" or (isinstance(kind, list) and "array" in kind)
+
+
+def _merge_array(values: List[list], unique: bool) -> list:
+    merged: list = []
+    for value in values:
+        for item in value:
+            if not (unique and item in merged):
+                merged.append(item)
+    return merged
+
+
+def merge_fields(category: DocCategory, parts: Sequence[Mapping[str, object]]) -> Dict[str, object]:
+    """Merge the ``fields`` of page-ordered chunks (see the module docstring).
+
+    Keys outside the category's schema take the first non-null value too.
+    """
+    spec = fields_for(category)
+    names = list(spec)
+    for part in parts:
+        names.extend(k for k in part if k not in names)
+
+    merged: Dict[str, object] = {}
+    for name in names:
+        values = [part.get(name) for part in parts if part.get(name) is not None]
+        if name in spec and _is_array(spec[name]):
+            arrays = [v for v in values if isinstance(v, list)]
+            unique = spec[name].get("items", {}).get("type") != "object"
+            merged[name] = _merge_array(arrays, unique) if arrays else None
+        else:
+            merged[name] = values[0] if values else None
+    return merged
+
+
+def merge_texts(texts: Sequence[Optional[str]]) -> Optional[str]:
+    """Page-ordered chunk texts as one; None when no chunk had any."""
+    present = [t for t in texts if t]
+    if not present:
+        return None if all(t is None for t in texts) else ""
+    return "\n\n".join(present)
+
+
+def merge_extractions(category: DocCategory, parts: Sequence[ExtractionResult]) -> ExtractionResult:
+    """One ``ExtractionResult`` from the page-ordered results of its chunks."""
+    return ExtractionResult(
+        fields=merge_fields(category, [p.fields for p in parts]),
+        raw_text=merge_texts([stored_raw_text(p) for p in parts]),
+    )
+
+
+def map_chunks(fn: Callable[[T], R], chunks: Sequence[T]) -> List[R]:
+    """``[fn(c) for c in chunks]``, run on concurrent threads.
+
+    Each call runs in a copy of the caller's context, so spans recorded in
+    the chunks still reach the caller's ``collect()``.
+    """
+    if len(chunks) <= 1:
+        return [fn(c) for c in chunks]
+    with ThreadPoolExecutor(max_workers=min(len(chunks), MAX_CHUNK_WORKERS), thread_name_prefix="chunk") as pool:
+        futures = [pool.submit(contextvars.copy_context().run, fn, c) for c in chunks]
+        return [f.result() for f in futures]
@@ -0,0 +1,133 @@
+"""Process-wide HTTP transport and API clients.
+
+Analysers get their clients from here instead of constructing their own,
+so every ``DocAnalyser`` in the process (one per Streamlit session, per
+CLI run, per job queue) shares one keep-alive connection pool. Clients are
+cached per (base URL, API key, retry setting). HTTP/2 is used when the
+optional ``h2`` package is installed.
+
+Async clients are bound to an event loop, so ``async_openai_client``
+keeps one transport per running loop; ``aclose_loop_clients`` closes it
+before a short-lived loop ends.
+
+``openai`` and ``httpx`` are imported on first use, not at import time.
+"""
+from __future__ import annotations
+
+import asyncio
+import importlib.util
+import threading
+import weakref
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+if TYPE_CHECKING:
+    import httpx
+    from openai import AsyncOpenAI, OpenAI
+
+
+MAX_CONNECTIONS = 64
+MAX_KEEPALIVE = 32
+KEEPALIVE_EXPIRY = 90.0  # seconds an idle connection is kept open
+CONNECT_TIMEOUT = 5.0
+READ_TIMEOUT = 600.0  # vision requests can take minutes
+
+ClientKey = Tuple[str, Optional[str], Optional[int]]
+
+_lock = threading.RLock()
+_http: Optional["httpx.Client"] = None
+_clients: Dict[ClientKey, "OpenAI"] = {}
+_async: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Tuple[httpx.AsyncClient, Dict]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+def _transport_options() -> Dict[str, object]:
+    import httpx
+
+    return {
+        "http2": http2_available(),
+        "limits": httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        ),
+        "timeout": httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+    }
+
+
+def http_client() -> "httpx.Client":
+    """The shared synchronous transport."""
+    global _http
+    with _lock:
+        if _http is None or _http.is_closed:
+            import httpx
+
+            _http = httpx.Client(**_transport_options())
+        return _http
+
+
+def openai_client(base_url: str, api_key: Optional[str], max_retries: Optional[int] = None) -> "OpenAI":
+    """Shared ``OpenAI`` client for these settings, on the shared transport."""
+    key = (base_url, api_key, max_retries)
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            from openai import OpenAI
+
+            client = _clients[key] = OpenAI(
+                base_url=base_url,
+                api_key=api_key,
+                http_client=http_client(),
+                **({"max_retries": max_retries} if max_retries is not None else {}),
+            )
+        return client
+
+
+def async_openai_client(
+    base_url: str, api_key: Optional[str], max_retries: Optional[int] = None
+) -> "AsyncOpenAI":
+    """Shared ``AsyncOpenAI`` client for these settings and the running loop."""
+    loop = asyncio.get_running_loop()
+    key = (base_url, api_key, max_retries)
+    with _lock:
+        entry = _async.get(loop)
+        if entry is None or entry[0].is_closed:
+            import httpx
+
+            entry = _async[loop] = (httpx.AsyncClient(**_transport_options()), {})
+        transport, clients = entry
+        client = clients.get(key)
+        if client is None:
+            from openai import AsyncOpenAI
+
+            client = clients[key] = AsyncOpenAI(
+                base_url=base_url,
+                api_key=api_key,
+                http_client=transport,
+                **({"max_retries": max_retries} if max_retries is not None else {}),
+            )
+        return client
+
+
+async def aclose_loop_clients() -> None:
+    """Close the running loop's transport and forget its clients. For
+    short-lived loops, whose transports would otherwise never be closed."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        entry = _async.pop(loop, None)
+    if entry is not None:
+        await entry[0].aclose()
+
+
+def close_all() -> None:
+    """Close the shared synchronous transport and forget cached clients."""
+    global _http
+    with _lock:
+        if _http is not None:
+            _http.close()
+        _http = None
+        _clients.clear()
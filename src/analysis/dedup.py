@@ -0,0 +1,192 @@
+"""Near-duplicate reuse of analysis results via perceptual hashes.
+
+``NearDuplicateIndex`` stores the 64-bit ``dhash`` of every analysed image
+(``IngestedFile.extra["dhash"]``, see ``src.ingestion.phash``) together
+with its result, in SQLite. Lookups use multi-index hashing: the hash is
+split into ``CHUNKS`` 16-bit chunks, each indexed separately. By the
+pigeonhole principle, any hash within distance ``r`` of the query matches
+at least one chunk within distance ``r // CHUNKS``, so a lookup probes a
+few hundred index keys at most and verifies the candidates exactly. This
+stays fast with millions of rows.
+
+Usage:
+    index = NearDuplicateIndex(Path(".cache/dedup.sqlite"), max_distance=5)
+    analyser = DocAnalyser(dedup=index)
+"""
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+from dataclasses import asdict, dataclass
+from itertools import combinations
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+from src.ingestion.phash import hamming_many
+from src.ingestion.types import IngestedFile
+from src.lazy import lazy_module
+
+np = lazy_module("numpy")
+
+
+HASH_BITS = 64
+CHUNKS = 4
+CHUNK_BITS = HASH_BITS // CHUNKS
+REUSE_MODES = ("result", "classification")
+
+
+def _chunks(h: int) -> List[int]:
+    mask = (1 << CHUNK_BITS) - 1
+    return [(h >> (CHUNK_BITS * (CHUNKS - 1 - i))) & mask for i in range(CHUNKS)]
+
+
+def _neighbours(value: int, radius: int) -> List[int]:
+    """Every CHUNK_BITS-bit value within Hamming ``radius`` of ``value``."""
+    out = [value]
+    for r in range(1, radius + 1):
+        for bits in combinations(range(CHUNK_BITS), r):
+            flipped = value
+            for b in bits:
+                flipped ^= 1 << b
+            out.append(flipped)
+    return out
+
+
+def _to_sql(h: int) -> int:
+    # SQLite integers are signed 64-bit
+    return h - (1 << 64) if h >= 1 << 63 else h
+
+
+def _from_sql(v: int) -> int:
+    return v + (1 << 64) if v < 0 else v
+
+
+@dataclass
+class DuplicateMatch:
+    distance: int
+    sha256: str
+    result: Dict[str, object]  # AnalysisResult.to_dict()
+
+
+@dataclass
+class DedupStats:
+    lookups: int = 0
+    hits: int = 0
+    results_reused: int = 0
+    classifications_reused: int = 0
+
+    def to_dict(self) -> Dict[str, int]:
+        return asdict(self)
+
+
+class NearDuplicateIndex:
+    """Persisted Hamming-radius index from dHash to analysis result.
+
+    Entries are namespaced (the analyser uses model + prompt version), so a
+    prompt change stops old results from being reused. ``reuse`` decides
+    what a match provides: the whole ``result``, or only the
+    ``classification``, with extraction still run on the new document.
+    Only documents analysed from scratch should be recorded: recording one
+    that reused a match would let later lookups chain through it to
+    documents beyond ``max_distance``.
+    """
+
+    def __init__(
+        self,
+        path: Union[Path, str] = ":memory:",
+        max_distance: int = 5,
+        reuse: str = "result",
+    ) -> None:
+        if reuse not in REUSE_MODES:
+            raise ValueError(f"Unsupported reuse mode: {reuse}")
+        if not 0 <= max_distance < HASH_BITS:
+            raise ValueError("max_distance must be in [0, 64)")
+        self.path = path
+        self.max_distance = max_distance
+        self.reuse = reuse
+        self.stats = DedupStats()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        cols = ", ".join(f"c{i} INTEGER NOT NULL" for i in range(CHUNKS))
+        with self._db:
+            self._db.execute(
+                f"CREATE TABLE IF NOT EXISTS entries (id INTEGER PRIMARY KEY, namespace TEXT NOT NULL, "
+                f"hash INTEGER NOT NULL, sha256 TEXT NOT NULL, result TEXT NOT NULL, {cols}, "
+                f"UNIQUE (namespace, sha256))"
+            )
+            for i in range(CHUNKS):
+                self._db.execute(f"CREATE INDEX IF NOT EXISTS entries_c{i} ON entries (namespace, c{i})")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def add(self, phash: int, sha256: str, result: Dict[str, object], namespace: str = "") -> None:
+        row = (namespace, _to_sql(phash), sha256, json.dumps(result), *_chunks(phash))
+        placeholders = ", ".join("?" * len(row))
+        chunk_cols = ", ".join(f"c{i}" for i in range(CHUNKS))
+        with self._lock, self._db:
+            self._db.execute(
+                f"INSERT OR REPLACE INTO entries (namespace, hash, sha256, result, {chunk_cols}) "
+                f"VALUES ({placeholders})",
+                row,
+            )
+
+    def query(self, phash: int, namespace: str = "", max_distance: Optional[int] = None) -> List[DuplicateMatch]:
+        """Entries within ``max_distance`` bits of ``phash``, nearest first."""
+        radius = self.max_distance if max_distance is None else max_distance
+        probe = radius // CHUNKS
+        # one index probe per chunk; UNION drops rows matched by several
+        selects, params = [], []
+        for i, chunk in enumerate(_chunks(phash)):
+            keys = _neighbours(chunk, probe)
+            selects.append(
+                f"SELECT id, hash, sha256, result FROM entries "
+                f"WHERE namespace = ? AND c{i} IN ({', '.join('?' * len(keys))})"
+            )
+            params += [namespace, *keys]
+        with self._lock:
+            rows = self._db.execute(" UNION ".join(selects), params).fetchall()
+        if not rows:
+            return []
+        hashes = np.array([_from_sql(r[1]) for r in rows], dtype=np.uint64)
+        distances = hamming_many(phash, hashes)
+        matches = [
+            DuplicateMatch(int(d), sha, json.loads(result))
+            for d, (_, _, sha, result) in zip(distances, rows)
+            if d <= radius
+        ]
+        return sorted(matches, key=lambda m: m.distance)
+
+    def lookup(self, doc: IngestedFile, namespace: str = "") -> Optional[DuplicateMatch]:
+        """Nearest stored near-duplicate of ``doc``. Counted as a hit; the
+        caller reports what it actually reused with ``count_reuse``."""
+        phash = doc.extra.get("dhash")
+        if phash is None:
+            return None
+        matches = self.query(phash, namespace)
+        with self._lock:
+            self.stats.lookups += 1
+            if matches:
+                self.stats.hits += 1
+        return matches[0] if matches else None
+
+    def count_reuse(self, what: str) -> None:
+        """Count a match whose ``result`` or ``classification`` was used."""
+        if what not in REUSE_MODES:
+            raise ValueError(f"Unsupported reuse mode: {what}")
+        with self._lock:
+            if what == "result":
+                self.stats.results_reused += 1
+            else:
+                self.stats.classifications_reused += 1
+
+    def record(self, doc: IngestedFile, result: Dict[str, object], namespace: str = "") -> None:
+        phash = doc.extra.get("dhash")
+        if phash is not None and doc.sha256:
+            self.add(phash, doc.sha256, result, namespace)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
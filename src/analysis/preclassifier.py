@@ -0,0 +1,299 @@
+"""Local CPU-only pre-classification.
+
+``PreClassifier`` guesses a document's category from data ingestion has
+already produced: PDF text layers, ``ImageMeta`` dimensions and the small
+classification thumbnail. It combines keyword/shape heuristics with an
+optional nearest-centroid model trained on previously analysed documents.
+``DocAnalyser`` consults it before the classification request and skips
+that request when the guess is confident enough.
+
+Usage:
+    model = CentroidModel.fit([(doc, result.category) for doc, result in history])
+    model.save(Path("preclassifier.json"))
+
+    pre = PreClassifier(threshold=0.9, model=CentroidModel.load(Path("preclassifier.json")))
+    analyser = DocAnalyser(preclassifier=pre)
+    ...
+    print(pre.stats.to_dict())
+
+With ``shadow=True`` the LLM is always called and the guess is only
+compared against its answer, to measure agreement before relying on it.
+"""
+from __future__ import annotations
+
+import io
+import json
+import re
+import threading
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.ingestion.llm_blocks import first_image_payload
+from src.ingestion.types import IngestedFile
+from src.instrumentation import span
+from src.lazy import lazy_module
+
+from .types import ClassificationResult, DocCategory
+
+np = lazy_module("numpy")
+Image = lazy_module("PIL.Image")
+
+
+# --- Features ---
+
+THUMB_WIDTH = 32  # columns sampled from the thumbnail
+HIST_LEVELS = 4  # per channel, so HIST_LEVELS ** 3 colour bins
+
+_INVOICE_WORDS = re.compile(r"\b(invoice|receipt|factuur|rechnung|facture)\b", re.IGNORECASE)
+_TOTAL_WORDS = re.compile(r"\b(total|amount due|balance due|subtotal|vat|tax)\b", re.IGNORECASE)
+
+
+def _text_of(doc: IngestedFile) -> str:
+    if doc.pdf is None:  # image payloads may carry a tiling note, which is not content
+        return ""
+    return "\n".join(p.data for p in doc.payloads if p.kind == "text")
+
+
+def _thumbnail(doc: IngestedFile) -> Optional[np.ndarray]:
+    """RGB pixels of the first image payload (the classification thumbnail
+    when there is one), resized to THUMB_WIDTH columns."""
+    data = first_image_payload(doc.classify_payloads or doc.payloads)
+    if data is None:
+        return None
+    with Image.open(io.BytesIO(data)) as img:
+        img.draft("RGB", (THUMB_WIDTH * 2, THUMB_WIDTH * 2))
+        height = max(1, round(THUMB_WIDTH * img.height / img.width))
+        return np.asarray(img.convert("RGB").resize((THUMB_WIDTH, height)), dtype=np.int16)
+
+
+@dataclass
+class Features:
+    aspect: Optional[float] = None  # height / width of the original image
+    width: Optional[int] = None
+    white_frac: float = 0.0  # near-white pixels
+    dark_frac: float = 0.0  # near-black pixels
+    colourfulness: float = 0.0  # mean (max - min) channel spread, 0..1
+    dominant_frac: float = 0.0  # share of the most common colour bin
+    histogram: Optional[np.ndarray] = None  # HIST_LEVELS ** 3 colour bins, sums to 1
+    has_text: bool = False
+    invoice_words: int = 0
+    total_words: int = 0
+
+    def vector(self) -> np.ndarray:
+        """Fixed-length numeric vector for ``CentroidModel``."""
+        hist = self.histogram if self.histogram is not None else np.zeros(HIST_LEVELS ** 3)
+        head = [
+            np.log(self.aspect) if self.aspect else 0.0,
+            self.white_frac,
+            self.dark_frac,
+            self.colourfulness,
+            self.dominant_frac,
+            float(self.has_text),
+            min(self.invoice_words, 5) / 5,
+            min(self.total_words, 10) / 10,
+        ]
+        return np.concatenate([np.asarray(head, dtype=np.float64), hist])
+
+
+def extract_features(doc: IngestedFile) -> Features:
+    feats = Features()
+    if doc.image is not None and doc.image.width and doc.image.height:
+        feats.aspect = doc.image.height / doc.image.width
+        feats.width = doc.image.width
+
+    text = _text_of(doc)
+    if text.strip():
+        feats.has_text = True
+        feats.invoice_words = len(_INVOICE_WORDS.findall(text))
+        feats.total_words = len(_TOTAL_WORDS.findall(text))
+
+    px = _thumbnail(doc)
+    if px is not None:
+        lo, hi = px.min(axis=2), px.max(axis=2)
+        feats.white_frac = float((lo > 235).mean())
+        feats.dark_frac = float((hi < 30).mean())
+        feats.colourfulness = float((hi - lo).mean() / 255)
+        q = px * HIST_LEVELS // 256
+        bins = (q[..., 0] * HIST_LEVELS + q[..., 1]) * HIST_LEVELS + q[..., 2]
+        hist = np.bincount(bins.ravel(), minlength=HIST_LEVELS ** 3) / bins.size
+        feats.histogram = hist
+        feats.dominant_frac = float(hist.max())
+    return feats
+
+
+def heuristic_guess(feats: Features) -> Optional[ClassificationResult]:
+    """Hand-written rules. Only text-layer invoices are near-certain; the
+    image rules are weak priors that stay below a sensible threshold."""
+    if feats.has_text:
+        if feats.invoice_words and feats.total_words:
+            return ClassificationResult(DocCategory.INVOICE, 0.95)
+        if feats.invoice_words:
+            return ClassificationResult(DocCategory.INVOICE, 0.75)
+        return None
+    if feats.aspect is None:
+        return None
+    # tall phone capture on a flat background: usually a chat
+    if feats.aspect >= 1.7 and feats.dominant_frac >= 0.6 and feats.colourfulness < 0.2:
+        return ClassificationResult(DocCategory.CHAT_SCREENSHOT, 0.6)
+    # wide desktop capture
+    if feats.aspect <= 0.75 and (feats.width or 0) >= 1200:
+        return ClassificationResult(DocCategory.WEBSITE_SCREENSHOT, 0.55)
+    return None
+
+
+# --- Trainable model ---
+
+class CentroidModel:
+    """Nearest-centroid classifier over standardised ``Features.vector()``.
+
+    Confidence is a softmax over negative squared distances to each
+    category's centroid, so it is only as calibrated as the training set
+    is representative; check it in shadow mode first.
+    """
+
+    def __init__(
+        self,
+        labels: List[DocCategory],
+        centroids: np.ndarray,
+        mean: np.ndarray,
+        scale: np.ndarray,
+        temperature: float = 1.0,
+    ) -> None:
+        self.labels = labels
+        self.centroids = centroids
+        self.mean = mean
+        self.scale = scale
+        self.temperature = temperature
+
+    @classmethod
+    def fit(
+        cls, examples: Iterable[Tuple[IngestedFile, DocCategory]], temperature: float = 1.0
+    ) -> "CentroidModel":
+        vectors: List[np.ndarray] = []
+        targets: List[DocCategory] = []
+        for doc, category in examples:
+            vectors.append(extract_features(doc).vector())
+            targets.append(DocCategory(category))
+        if not vectors:
+            raise ValueError("CentroidModel.fit needs at least one example")
+
+        X = np.stack(vectors)
+        mean = X.mean(axis=0)
+        scale = X.std(axis=0)
+        scale[scale == 0] = 1.0
+        Z = (X - mean) / scale
+        labels = sorted(set(targets), key=lambda c: c.value)
+        y = np.asarray([labels.index(t) for t in targets])
+        centroids = np.stack([Z[y == i].mean(axis=0) for i in range(len(labels))])
+        return cls(labels, centroids, mean, scale, temperature)
+
+    def predict(self, feats: Features) -> ClassificationResult:
+        z = (feats.vector() - self.mean) / self.scale
+        d2 = ((self.centroids - z) ** 2).sum(axis=1) / len(z)
+        logits = -d2 / self.temperature
+        p = np.exp(logits - logits.max())
+        p /= p.sum()
+        best = int(p.argmax())
+        return ClassificationResult(self.labels[best], float(p[best]))
+
+    def save(self, path: Path) -> None:
+        path.write_text(json.dumps({
+            "labels": [c.value for c in self.labels],
+            "centroids": self.centroids.tolist(),
+            "mean": self.mean.tolist(),
+            "scale": self.scale.tolist(),
+            "temperature": self.temperature,
+        }), encoding="utf-8")
+
+    @classmethod
+    def load(cls, path: Path) -> "CentroidModel":
+        data = json.loads(path.read_text(encoding="utf-8"))
+        return cls(
+            [DocCategory(v) for v in data["labels"]],
+            np.asarray(data["centroids"]),
+            np.asarray(data["mean"]),
+            np.asarray(data["scale"]),
+            data.get("temperature", 1.0),
+        )
+
+
+# --- Pre-classifier ---
+
+@dataclass
+class PreClassifierStats:
+    consulted: int = 0  # documents the pre-classifier looked at
+    confident: int = 0  # guesses at or above the threshold
+    calls_saved: int = 0  # classification requests skipped
+    compared: int = 0  # confident shadow guesses checked against the LLM
+    disagreements: int = 0
+
+    @property
+    def disagreement_rate(self) -> float:
+        return self.disagreements / self.compared if self.compared else 0.0
+
+    def to_dict(self) -> Dict[str, float]:
+        return {**asdict(self), "disagreement_rate": self.disagreement_rate}
+
+
+def _combine_guesses(
+    rule: Optional[ClassificationResult], model: Optional[ClassificationResult]
+) -> Optional[ClassificationResult]:
+    if rule is None or model is None:
+        return rule or model
+    if rule.category == model.category:  # independent evidence: noisy-or
+        return ClassificationResult(rule.category, 1 - (1 - rule.confidence) * (1 - model.confidence))
+    winner, loser = (rule, model) if rule.confidence >= model.confidence else (model, rule)
+    return ClassificationResult(winner.category, winner.confidence * (1 - loser.confidence))
+
+
+class PreClassifier:
+    def __init__(
+        self,
+        threshold: float = 0.9,
+        shadow: bool = False,
+        model: Optional[CentroidModel] = None,
+    ) -> None:
+        self.threshold = threshold
+        self.shadow = shadow
+        self.model = model
+        self.stats = PreClassifierStats()
+        self._lock = threading.Lock()
+
+    def _add(self, **deltas: int) -> None:
+        with self._lock:
+            for name, value in deltas.items():
+                setattr(self.stats, name, getattr(self.stats, name) + value)
+
+    def predict(self, doc: IngestedFile) -> Optional[ClassificationResult]:
+        """Best local guess at any confidence, or None without evidence."""
+        try:
+            feats = extract_features(doc)
+        except (OSError, ValueError):  # undecodable thumbnail: no opinion
+            return None
+        model_guess = self.model.predict(feats) if self.model is not None else None
+        return _combine_guesses(heuristic_guess(feats), model_guess)
+
+    def consult(self, doc: IngestedFile) -> Tuple[Optional[ClassificationResult], bool]:
+        """Guess ``doc``'s category.
+
+        Returns:
+            Tuple[Optional[ClassificationResult], bool]: The guess, and
+            whether the caller should use it instead of asking the LLM
+            (never in shadow mode).
+        """
+        with span("preclassify", doc=doc.sha256 or str(doc.path)) as sp:
+            guess = self.predict(doc)
+            confident = guess is not None and guess.confidence >= self.threshold
+            use = confident and not self.shadow
+            if guess is not None:
+                guess.tier = "preclassifier"
+                sp.set(category=guess.category.value, confidence=round(guess.confidence, 3), used=use)
+        self._add(consulted=1, confident=int(confident), calls_saved=int(use))
+        return guess, use
+
+    def compare(self, guess: Optional[ClassificationResult], actual: ClassificationResult) -> None:
+        """Record whether a confident guess matched the LLM's answer."""
+        if guess is None or guess.confidence < self.threshold:
+            return
+        self._add(compared=1, disagreements=int(guess.category != actual.category))
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import json
+
 from .types import DocCategory
 
 
@@ -16,6 +18,55 @@ CLASSIFY_INSTRUCTION = (
 )
 
 
+# System message of the document-first layout; identical for every request so
+# that it, and the document blocks after it, form a cacheable prompt prefix
+DOCUMENT_FIRST_SYSTEM = (
+    "You are an expert analyst of business documents and digital content. "
+    "The user first provides one document (an image or PDF); the final message states the task to perform on it "
+    "and the JSON schema of the answer. Return ONLY a valid JSON object matching that schema."
+)
+
+# Appended to the task of a document-first request. Those requests ask for
+# ``json_object`` output and state the schema here: ``response_format`` is
+# part of the provider's cached prompt prefix, so a per-stage schema there
+# would keep the extraction request from reusing the classification prefix.
+SCHEMA_INSTRUCTION = "Answer with one JSON object that conforms to this JSON schema:\n"
+
+
+def with_schema(instruction: str, schema: dict) -> str:
+    return f"{instruction}\n\n{SCHEMA_INSTRUCTION}{json.dumps(schema, sort_keys=True)}"
+
+
+BATCH_CLASSIFY_INSTRUCTION = (
+    "You are a precise document classifier with expertise in business documents and digital content. "
+    "You will receive several documents, each introduced by a label of the form 'Document <index>:' "
+    "followed by that document's image or text. Classify every document independently into exactly one of these categories: "
+    "1) 'invoice' - Bills, receipts, payment documents with amounts and vendor information "
+    "2) 'marketplace_listing_screenshot' - Product listings from platforms like eBay, Facebook Marketplace, Craigslist "
+    "3) 'chat_screenshot' - Messaging conversations from any chat application "
+    "4) 'website_screenshot' - Web page captures showing website content "
+    "5) 'other' - Any document that doesn't clearly fit the above categories. "
+    "Consider visual layout, text content, and contextual clues. Provide a confidence score (0.0-1.0) for each. "
+    "Return exactly one entry per document in 'results', using the index from its label. "
+    "Return ONLY valid JSON matching the provided schema."
+)
+
+
+# Closing request of every extraction prompt; dropped when raw_text is not wanted
+RAW_TEXT_REQUEST = "Also extract the complete raw text content via OCR. "
+
+
+def without_raw_text(instruction: str) -> str:
+    return instruction.replace(RAW_TEXT_REQUEST, "")
+
+
+OCR_INSTRUCTION = (
+    "You are a precise OCR engine. Transcribe the complete text content of the provided image or PDF, "
+    "in reading order, keeping line breaks between lines and blocks. Do not summarise, translate or correct the text. "
+    "Return ONLY valid JSON matching the schema."
+)
+
+
 EXTRACTION_INSTRUCTIONS_CATEGORY = {
     DocCategory.INVOICE: (
         "You are an expert invoice data extractor. Carefully analyze this invoice document and extract all available information. "
@@ -57,3 +108,24 @@ EXTRACTION_INSTRUCTIONS_CATEGORY = {
         "Also extract the complete raw text content via OCR. Return ONLY valid JSON matching the schema."
     ),
 }
+
+
+
+SINGLE_PASS_INSTRUCTION = (
+    "You are a precise document classifier and data extractor with expertise in business documents and digital content. "
+    "First classify the provided image or PDF into exactly one of these categories: "
+    "1) 'invoice' - Bills, receipts, payment documents with amounts and vendor information "
+    "2) 'marketplace_listing_screenshot' - Product listings from platforms like eBay, Facebook Marketplace, Craigslist "
+    "3) 'chat_screenshot' - Messaging conversations from any chat application "
+    "4) 'website_screenshot' - Web page captures showing website content "
+    "5) 'other' - Any document that doesn't clearly fit the above categories. "
+    "Consider visual layout, text content, and contextual clues. Provide a confidence score (0.0-1.0). "
+    "Then fill in the fields defined for the category you chose, and only those: "
+    "for invoices the invoice number, date, total, line items, vendor and address; "
+    "for marketplace listings the title, price, currency, location, item characteristics, description and seller name; "
+    "for chats the participants, visible timestamp and every message with sender, text and time in order; "
+    "for websites the URL, page title and website type; "
+    "for other documents a concise summary of the key information as text. "
+    "Be precise with numbers and dates. If information is not clearly visible, use null. "
+    "Also extract the complete raw text content via OCR. Return ONLY valid JSON matching the schema."
+)
@@ -0,0 +1,358 @@
+from __future__ import annotations
+
+import asyncio
+import email.utils
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple, TypeVar
+
+from src.lazy import lazy_module
+
+openai = lazy_module("openai")
+
+T = TypeVar("T")
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at ``rate_per_min``.
+
+    ``reserve`` never blocks: it debits the bucket (possibly below zero)
+    and returns how long the caller must wait before proceeding, so the
+    same bucket serves threads and coroutines alike.
+    """
+
+    def __init__(self, rate_per_min: float, capacity: Optional[float] = None) -> None:
+        self.rate = rate_per_min / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_min
+        self._level = self.capacity
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._level = min(self.capacity, self._level + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def reserve(self, amount: float = 1.0) -> float:
+        with self._lock:
+            self._refill()
+            self._level -= amount
+            return 0.0 if self._level >= 0 else -self._level / self.rate
+
+    def adjust(self, delta: float) -> None:
+        """Correct an earlier reservation once the real cost is known."""
+        with self._lock:
+            self._refill()
+            self._level = min(self.capacity, self._level - delta)
+
+
+@dataclass
+class RetryPolicy:
+    """Exponential backoff with full jitter; honours Retry-After."""
+
+    max_retries: int = 6
+    base_delay: float = 0.5
+    max_delay: float = 60.0
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if retry_after is not None:
+            return min(self.max_delay, max(retry_after, backoff))
+        return backoff
+
+
+def is_throttle(exc: BaseException) -> bool:
+    return isinstance(exc, openai.RateLimitError)
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    if isinstance(exc, openai.APIStatusError):
+        return exc.status_code in (408, 409, 429) or exc.status_code >= 500
+    return False
+
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """Seconds requested by the server via Retry-After(-ms), if any."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000.0
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        parsed = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):  # malformed header: fall back to normal backoff
+        return None
+    return max(0.0, parsed.timestamp() - time.time()) if parsed else None
+
+
+def _resolve(waiter: asyncio.Future) -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class AIMDController:
+    """Concurrency limit that grows additively while requests succeed and
+    shrinks multiplicatively when the provider throttles.
+
+    The limit grows by ``increase`` once per ``limit`` consecutive
+    successes (i.e. roughly once per round of in-flight requests) and is
+    cut at most once per ``cooldown`` seconds, so a burst of 429s from one
+    round counts as a single congestion signal.
+
+    Threads and coroutines, on any number of event loops, can share one
+    controller. Threads wait on a condition variable; each waiting
+    coroutine parks on a future of its own loop and is woken, thread-safely,
+    only when a slot frees up for it.
+    """
+
+    def __init__(
+        self,
+        initial: int = 4,
+        minimum: int = 1,
+        maximum: int = 64,
+        increase: float = 1.0,
+        decrease: float = 0.5,
+        cooldown: float = 2.0,
+    ) -> None:
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self._streak = 0
+        self._last_cut = 0.0
+        self._cond = threading.Condition()
+        self._async_waiters: Deque[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
+
+    def try_acquire(self) -> bool:
+        with self._cond:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            return False
+
+    def acquire(self) -> None:
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    async def acquire_async(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._cond:
+                if self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                with self._cond:
+                    try:
+                        self._async_waiters.remove((loop, waiter))
+                    except ValueError:  # already woken: pass the wake-up on
+                        self._wake()
+                raise
+
+    def _wake(self) -> None:
+        """Wake waiting threads, and one waiting coroutine per free slot.
+        Must be called with ``_cond`` held."""
+        self._cond.notify_all()
+        free = int(self.limit) - self.in_flight
+        while free > 0 and self._async_waiters:
+            loop, waiter = self._async_waiters.popleft()
+            try:
+                loop.call_soon_threadsafe(_resolve, waiter)
+            except RuntimeError:  # its loop is closed
+                continue
+            free -= 1
+
+    def release(self) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            self._wake()
+
+    def on_success(self) -> None:
+        with self._cond:
+            self._streak += 1
+            if self._streak >= int(self.limit):
+                self._streak = 0
+                self.limit = min(self.maximum, self.limit + self.increase)
+                self._wake()
+
+    def on_throttle(self) -> None:
+        with self._cond:
+            self._streak = 0
+            now = time.monotonic()
+            if now - self._last_cut >= self.cooldown:
+                self._last_cut = now
+                self.limit = max(self.minimum, self.limit * self.decrease)
+
+
+@dataclass
+class SchedulerStats:
+    requests: int = 0  # attempts sent to the provider
+    succeeded: int = 0
+    failed: int = 0
+    retries: int = 0
+    throttled: int = 0  # 429 responses
+    rate_wait_s: float = 0.0  # waiting for the token buckets
+    slot_wait_s: float = 0.0  # waiting for a concurrency slot
+    backoff_s: float = 0.0  # sleeping between retries
+    work_s: float = 0.0  # inside the request itself
+    concurrency_limit: float = 0.0
+
+    def to_dict(self) -> Dict[str, float]:
+        return asdict(self)
+
+
+def estimate_tokens(blocks: list) -> int:
+    """Rough prompt size for rate limiting: ~4 chars per text token and a
+    flat allowance per image/file block. Corrected from ``usage`` after the
+    response arrives."""
+    tokens = 0
+    for block in blocks:
+        if block.get("type") == "text":
+            tokens += len(block.get("text", "")) // 4
+        else:
+            tokens += 1000
+    return tokens
+
+
+class RequestScheduler:
+    """Runs provider calls under rate limits, retries and adaptive concurrency.
+
+    Usage:
+        scheduler = RequestScheduler(requests_per_min=500, tokens_per_min=200_000)
+        analyser = DocAnalyser(scheduler=scheduler)
+        ...
+        print(scheduler.stats.to_dict())
+    """
+
+    def __init__(
+        self,
+        requests_per_min: Optional[float] = None,
+        tokens_per_min: Optional[float] = None,
+        retry: Optional[RetryPolicy] = None,
+        controller: Optional[AIMDController] = None,
+    ) -> None:
+        self.requests = TokenBucket(requests_per_min) if requests_per_min else None
+        self.tokens = TokenBucket(tokens_per_min) if tokens_per_min else None
+        self.retry = retry or RetryPolicy()
+        self.controller = controller or AIMDController()
+        self.stats = SchedulerStats(concurrency_limit=self.controller.limit)
+        self._lock = threading.Lock()
+
+    def _add(self, **deltas: float) -> None:
+        with self._lock:
+            for name, value in deltas.items():
+                setattr(self.stats, name, getattr(self.stats, name) + value)
+            self.stats.concurrency_limit = self.controller.limit
+
+    def _rate_delay(self, tokens: int) -> float:
+        delay = 0.0
+        if self.requests is not None:
+            delay = max(delay, self.requests.reserve(1))
+        if self.tokens is not None and tokens:
+            delay = max(delay, self.tokens.reserve(tokens))
+        return delay
+
+    def _settle(self, result: object, estimated: int) -> None:
+        usage = getattr(result, "usage", None)
+        actual = getattr(usage, "total_tokens", None)
+        if self.tokens is not None and actual is not None:
+            self.tokens.adjust(actual - estimated)
+        self.controller.on_success()
+        self._add(succeeded=1)
+
+    def _on_error(self, exc: BaseException, attempt: int) -> float:
+        """Record a failed attempt; return the backoff delay, or re-raise."""
+        throttled = is_throttle(exc)
+        if throttled:
+            self.controller.on_throttle()
+        if not is_retryable(exc) or attempt >= self.retry.max_retries:
+            self._add(failed=1, throttled=int(throttled))
+            raise exc
+        self._add(retries=1, throttled=int(throttled))
+        return self.retry.delay(attempt, retry_after(exc))
+
+    def _finish(self, t0: float, t1: float, delay: float) -> None:
+        self.controller.release()
+        t2 = time.monotonic()
+        self._add(requests=1, rate_wait_s=delay, slot_wait_s=t1 - t0, work_s=t2 - t1)
+
+    def call(self, fn: Callable[[], T], tokens: int = 0) -> T:
+        """Run ``fn`` (one provider request) under the scheduler's limits.
+
+        Args:
+            fn (Callable[[], T]): Performs the request; called once per attempt.
+            tokens (int): Estimated tokens for the tokens/min bucket.
+
+        Returns:
+            T: Whatever ``fn`` returns on the first successful attempt.
+        """
+        attempt = 0
+        while True:
+            delay = self._rate_delay(tokens)
+            if delay:
+                time.sleep(delay)
+            t0 = time.monotonic()
+            self.controller.acquire()
+            t1 = time.monotonic()
+            try:
+                try:
+                    result = fn()
+                finally:
+                    self._finish(t0, t1, delay)
+            except Exception as e:
+                backoff = self._on_error(e, attempt)
+                self._add(backoff_s=backoff)
+                time.sleep(backoff)
+                attempt += 1
+                continue
+            self._settle(result, tokens)
+            return result
+
+    async def acall(self, fn: Callable[[], Awaitable[T]], tokens: int = 0) -> T:
+        """Async counterpart of ``call``."""
+        attempt = 0
+        while True:
+            delay = self._rate_delay(tokens)
+            if delay:
+                await asyncio.sleep(delay)
+            t0 = time.monotonic()
+            await self.controller.acquire_async()
+            t1 = time.monotonic()
+            try:
+                try:
+                    result = await fn()
+                finally:
+                    self._finish(t0, t1, delay)
+            except Exception as e:
+                backoff = self._on_error(e, attempt)
+                self._add(backoff_s=backoff)
+                await asyncio.sleep(backoff)
+                attempt += 1
+                continue
+            self._settle(result, tokens)
+            return result
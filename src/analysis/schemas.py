@@ -82,23 +82,94 @@ def classification_schema() -> Dict:
     }
 
 
-def extraction_schema_for(category: DocCategory) -> Dict:
-    fields = FIELDS.get(category, {"text": {"type": "string"}})
-
+def batch_classification_schema() -> Dict:
+    """``classification_schema`` for several labelled documents at once."""
+    item = classification_schema()
     return {
         "type": "object",
         "properties": {
-            "fields": {
-                "type": "object",
-                "properties": fields,
-                "required": list(fields.keys()),
-                "additionalProperties": True,
-            },
-            "raw_text": {
-                "type": "string",
-                "description": "Full extracted text (OCR) from the file/image"
+            "results": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {"index": {"type": "integer", "minimum": 0}, **item["properties"]},
+                    "required": ["index", *item["required"]],
+                    "additionalProperties": False,
+                },
             },
         },
-        "required": ["fields", "raw_text"],
+        "required": ["results"],
+        "additionalProperties": False,
+    }
+
+
+def fields_for(category: DocCategory) -> Dict:
+    return FIELDS.get(category, {"text": {"type": "string"}})
+
+
+RAW_TEXT = {
+    "type": "string",
+    "description": "Full extracted text (OCR) from the file/image"
+}
+
+
+def extraction_schema_for(category: DocCategory, raw_text: bool = True) -> Dict:
+    """Extraction schema; without ``raw_text`` the model only fills ``fields``."""
+    fields = fields_for(category)
+    properties = {
+        "fields": {
+            "type": "object",
+            "properties": fields,
+            "required": list(fields.keys()),
+            "additionalProperties": True,
+        },
+    }
+    if raw_text:
+        properties["raw_text"] = RAW_TEXT
+
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties),
+        "additionalProperties": False,
+    }
+
+
+def ocr_schema() -> Dict:
+    return {
+        "type": "object",
+        "properties": {"raw_text": RAW_TEXT},
+        "required": ["raw_text"],
+        "additionalProperties": False,
+    }
+
+
+def single_pass_schema(raw_text: bool = True) -> Dict:
+    """Combined classify+extract schema, discriminated on ``category``.
+
+    Each variant pins ``category`` to one value and carries that category's
+    ``fields``, so the model has to commit to a category and fill the
+    matching fields in a single response. The union is wrapped in an object
+    because structured output requires an object at the root.
+    """
+    cls = classification_schema()["properties"]
+    variants = []
+    for category in DocCategory:
+        properties = {
+            "category": {"type": "string", "enum": [category.value]},
+            "confidence": cls["confidence"],
+            **extraction_schema_for(category, raw_text)["properties"],
+        }
+        variants.append({
+            "type": "object",
+            "properties": properties,
+            "required": list(properties),
+            "additionalProperties": False,
+        })
+
+    return {
+        "type": "object",
+        "properties": {"analysis": {"anyOf": variants}},
+        "required": ["analysis"],
         "additionalProperties": False,
     }
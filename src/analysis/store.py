@@ -0,0 +1,353 @@
+"""Persistent, queryable store of analysis results.
+
+``ResultStore`` keeps one row per document (keyed by sha256) in SQLite.
+The commonly queried extraction fields (``INDEXED_FIELDS``) are copied
+into their own indexed columns, and ``raw_text`` is indexed with FTS5.
+Inserts are buffered and written in batches, one transaction per batch.
+Queries and exports stream rows rather than loading the whole store.
+
+Usage:
+    store = ResultStore(Path("analysis_results.sqlite"))
+    store.put(doc.sha256, result, path=str(doc.path))
+    for row in store.query(category="invoice", vendor="ACME", total=(">", 500)):
+        print(row.path, row.result.fields["total"])
+    store.export_jsonl(Path("invoices.jsonl"), category="invoice")
+"""
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple, Union
+
+from .schemas import FIELDS
+from .types import AnalysisResult, DocCategory
+
+
+# Extraction fields with their own indexed column
+INDEXED_FIELDS = ("vendor", "total", "invoice_date", "seller_name", "url")
+ORDER_COLUMNS = ("created_at", "confidence", "category", "path", *INDEXED_FIELDS)
+OPERATORS = ("=", "!=", "<", "<=", ">", ">=", "like")
+EXPORT_BATCH = 1000
+
+
+def _is_number(name: str) -> bool:
+    for fields in FIELDS.values():
+        if name in fields:
+            return "number" in fields[name]["type"]
+    return False
+
+
+def _column_value(name: str, value: object) -> object:
+    if value is None or isinstance(value, (dict, list)):
+        return None
+    if _is_number(name):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+    return str(value)
+
+
+def _as_result(result: Union[AnalysisResult, Dict[str, object]]) -> AnalysisResult:
+    if isinstance(result, AnalysisResult):
+        return result
+    return AnalysisResult(
+        category=DocCategory(result["category"]),
+        confidence=float(result["confidence"]),
+        fields=result.get("fields") or {},
+        raw_text=result.get("raw_text"),
+    )
+
+
+@dataclass
+class StoredResult:
+    sha256: str
+    path: Optional[str]
+    result: AnalysisResult
+    created_at: float
+
+    def to_dict(self) -> Dict[str, object]:
+        """Same shape as the batch CLI's JSONL records."""
+        return {"path": self.path, "sha256": self.sha256, **self.result.to_dict()}
+
+
+Condition = Union[object, Tuple[str, object]]
+
+
+class ResultStore:
+    """SQLite-backed result store.
+
+    ``add`` buffers rows and writes them ``batch_size`` at a time; ``put``
+    and ``put_many`` write immediately. Storing a sha256 again replaces
+    its row. Safe to share between threads.
+    """
+
+    def __init__(self, path: Union[Path, str] = ":memory:", batch_size: int = 100) -> None:
+        self.path = path
+        self.batch_size = batch_size
+        self._pending: List[Tuple] = []
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        columns = ", ".join(
+            f"{name} {'REAL' if _is_number(name) else 'TEXT'}" for name in INDEXED_FIELDS
+        )
+        with self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                f"CREATE TABLE IF NOT EXISTS results (sha256 TEXT PRIMARY KEY, path TEXT, "
+                f"category TEXT NOT NULL, confidence REAL NOT NULL, {columns}, "
+                f"fields TEXT NOT NULL, raw_text TEXT, created_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS results_category ON results (category, confidence)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS results_confidence ON results (confidence)")
+            for name in INDEXED_FIELDS:
+                self._db.execute(f"CREATE INDEX IF NOT EXISTS results_{name} ON results ({name})")
+            # external-content FTS over raw_text, kept in sync by triggers
+            self._db.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS results_fts "
+                "USING fts5(raw_text, content='results', content_rowid='rowid')"
+            )
+            self._db.executescript("""
+                CREATE TRIGGER IF NOT EXISTS results_ai AFTER INSERT ON results BEGIN
+                    INSERT INTO results_fts (rowid, raw_text) VALUES (new.rowid, new.raw_text);
+                END;
+                CREATE TRIGGER IF NOT EXISTS results_ad AFTER DELETE ON results BEGIN
+                    INSERT INTO results_fts (results_fts, rowid, raw_text) VALUES ('delete', old.rowid, old.raw_text);
+                END;
+                CREATE TRIGGER IF NOT EXISTS results_au AFTER UPDATE ON results BEGIN
+                    INSERT INTO results_fts (results_fts, rowid, raw_text) VALUES ('delete', old.rowid, old.raw_text);
+                    INSERT INTO results_fts (rowid, raw_text) VALUES (new.rowid, new.raw_text);
+                END;
+            """)
+
+    # --- writing ---
+
+    def _row(self, sha256: str, result: Union[AnalysisResult, Dict[str, object]], path: Optional[str]) -> Tuple:
+        res = _as_result(result)
+        indexed = [_column_value(name, res.fields.get(name)) for name in INDEXED_FIELDS]
+        return (
+            sha256, path, res.category.value, res.confidence, *indexed,
+            json.dumps(res.fields, ensure_ascii=False), res.raw_text, time.time(),
+        )
+
+    def _write(self, rows: Sequence[Tuple]) -> None:
+        columns = ["sha256", "path", "category", "confidence", *INDEXED_FIELDS, "fields", "raw_text", "created_at"]
+        updates = ", ".join(f"{c} = excluded.{c}" for c in columns[1:])
+        # an upsert (not INSERT OR REPLACE) so the FTS update trigger fires
+        sql = (
+            f"INSERT INTO results ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+            f"ON CONFLICT (sha256) DO UPDATE SET {updates}"
+        )
+        with self._db:
+            self._db.executemany(sql, rows)
+
+    def put(self, sha256: str, result: Union[AnalysisResult, Dict[str, object]], path: Optional[str] = None) -> None:
+        self.put_many([(sha256, result, path)])
+
+    def put_many(self, items: Iterable[Tuple[str, Union[AnalysisResult, Dict[str, object]], Optional[str]]]) -> None:
+        """Write ``(sha256, result, path)`` items in one transaction."""
+        rows = [self._row(*item) for item in items]
+        with self._lock:
+            self._write(rows)
+
+    def add(self, sha256: str, result: Union[AnalysisResult, Dict[str, object]], path: Optional[str] = None) -> None:
+        """Buffer a row; the buffer is written once it holds ``batch_size`` rows."""
+        row = self._row(sha256, result, path)
+        with self._lock:
+            self._pending.append(row)
+            if len(self._pending) >= self.batch_size:
+                self._write(self._pending)
+                self._pending = []
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._pending:
+                self._write(self._pending)
+                self._pending = []
+
+    def delete(self, sha256: str) -> None:
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM results WHERE sha256 = ?", (sha256,))
+
+    # --- reading ---
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def __contains__(self, sha256: object) -> bool:
+        return self.get(sha256) is not None  # type: ignore[arg-type]
+
+    def hashes(self) -> Set[str]:
+        with self._lock:
+            return {r[0] for r in self._db.execute("SELECT sha256 FROM results")}
+
+    def get(self, sha256: str) -> Optional[StoredResult]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT sha256, path, category, confidence, fields, raw_text, created_at "
+                "FROM results WHERE sha256 = ?", (sha256,)
+            ).fetchone()
+        return self._stored(row) if row is not None else None
+
+    @staticmethod
+    def _stored(row: Tuple) -> StoredResult:
+        sha256, path, category, confidence, fields, raw_text, created_at = row
+        result = AnalysisResult(DocCategory(category), confidence, json.loads(fields), raw_text)
+        return StoredResult(sha256, path, result, created_at)
+
+    def _where(
+        self,
+        category: Optional[Union[str, DocCategory]],
+        min_confidence: Optional[float],
+        max_confidence: Optional[float],
+        text: Optional[str],
+        fields: Dict[str, Condition],
+    ) -> Tuple[str, List[object]]:
+        clauses: List[str] = []
+        params: List[object] = []
+        if category is not None:
+            clauses.append("category = ?")
+            params.append(DocCategory(category).value)
+        if min_confidence is not None:
+            clauses.append("confidence >= ?")
+            params.append(min_confidence)
+        if max_confidence is not None:
+            clauses.append("confidence <= ?")
+            params.append(max_confidence)
+        if text is not None:
+            clauses.append("rowid IN (SELECT rowid FROM results_fts WHERE results_fts MATCH ?)")
+            params.append(text)
+        for name, condition in fields.items():
+            if name not in INDEXED_FIELDS:
+                raise ValueError(f"Not an indexed field: {name} (indexed: {', '.join(INDEXED_FIELDS)})")
+            op, value = condition if isinstance(condition, tuple) else ("=", condition)
+            if op not in OPERATORS:
+                raise ValueError(f"Unsupported operator: {op}")
+            clauses.append(f"{name} {op.upper()} ?")
+            params.append(_column_value(name, value) if op != "like" else value)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query(
+        self,
+        category: Optional[Union[str, DocCategory]] = None,
+        min_confidence: Optional[float] = None,
+        max_confidence: Optional[float] = None,
+        text: Optional[str] = None,
+        order_by: str = "created_at",
+        descending: bool = False,
+        limit: Optional[int] = None,
+        **fields: Condition,
+    ) -> Iterator[StoredResult]:
+        """Stream stored results matching every given condition.
+
+        ``text`` is an FTS5 query over ``raw_text``. Keyword arguments
+        filter ``INDEXED_FIELDS``: a plain value tests equality, an
+        ``(operator, value)`` pair any of ``OPERATORS``, e.g.
+        ``total=(">", 500)`` or ``vendor=("like", "acme%")``.
+        """
+        if order_by not in ORDER_COLUMNS:
+            raise ValueError(f"Unsupported order_by: {order_by}")
+        where, params = self._where(category, min_confidence, max_confidence, text, fields)
+        sql = (
+            f"SELECT sha256, path, category, confidence, fields, raw_text, created_at FROM results{where} "
+            f"ORDER BY {order_by} {'DESC' if descending else 'ASC'}"
+        )
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            cursor = self._db.execute(sql, params)
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(EXPORT_BATCH)
+            if not rows:
+                return
+            for row in rows:
+                yield self._stored(row)
+
+    def count(
+        self,
+        category: Optional[Union[str, DocCategory]] = None,
+        min_confidence: Optional[float] = None,
+        max_confidence: Optional[float] = None,
+        text: Optional[str] = None,
+        **fields: Condition,
+    ) -> int:
+        where, params = self._where(category, min_confidence, max_confidence, text, fields)
+        with self._lock:
+            return self._db.execute(f"SELECT COUNT(*) FROM results{where}", params).fetchone()[0]
+
+    # --- export ---
+
+    def export_jsonl(self, path: Path, **query: object) -> int:
+        """Write the results of ``query(**query)`` as JSON lines; returns the count."""
+        n = 0
+        with path.open("w", encoding="utf-8") as f:
+            for row in self.query(**query):
+                f.write(json.dumps(row.to_dict(), ensure_ascii=False) + "\n")
+                n += 1
+        return n
+
+    def export_parquet(self, path: Path, batch_size: int = EXPORT_BATCH, **query: object) -> int:
+        """Write the results of ``query(**query)`` to Parquet, ``batch_size``
+        rows per row group; returns the count. Needs ``pyarrow``.
+
+        Indexed fields get their own columns; ``fields`` is kept as JSON.
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("Parquet export needs pyarrow: pip install pyarrow") from e
+
+        number = pa.float64()
+        schema = pa.schema(
+            [("sha256", pa.string()), ("path", pa.string()), ("category", pa.string()), ("confidence", number)]
+            + [(name, number if _is_number(name) else pa.string()) for name in INDEXED_FIELDS]
+            + [("fields", pa.string()), ("raw_text", pa.string()), ("created_at", number)]
+        )
+
+        def table(rows: List[StoredResult]) -> "pa.Table":
+            columns: Dict[str, list] = {name: [] for name in schema.names}
+            for row in rows:
+                res = row.result
+                values = {
+                    "sha256": row.sha256, "path": row.path, "category": res.category.value,
+                    "confidence": res.confidence, "fields": json.dumps(res.fields, ensure_ascii=False),
+                    "raw_text": res.raw_text, "created_at": row.created_at,
+                }
+                for name in INDEXED_FIELDS:
+                    values[name] = _column_value(name, res.fields.get(name))
+                for name in schema.names:
+                    columns[name].append(values[name])
+            return pa.table(columns, schema=schema)
+
+        n = 0
+        batch: List[StoredResult] = []
+        with pq.ParquetWriter(str(path), schema) as writer:
+            for row in self.query(**query):
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    writer.write_table(table(batch))
+                    n += len(batch)
+                    batch = []
+            if batch or not n:
+                writer.write_table(table(batch))
+                n += len(batch)
+        return n
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self) -> "ResultStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -1,8 +1,10 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+import threading
+from concurrent.futures import Future
+from dataclasses import dataclass, fields
 from enum import Enum
-from typing import Dict, Optional
+from typing import Callable, Dict, Optional, Tuple
 
 
 class DocCategory(str, Enum):
@@ -17,12 +19,111 @@ class DocCategory(str, Enum):
 class ClassificationResult:
     category: DocCategory
     confidence: float
+    tier: Optional[str] = None  # model (or "preclassifier", "dedup") that answered
+
+    def to_dict(self) -> Dict[str, object]:
+        return {"category": self.category.value, "confidence": self.confidence}
+
+
+class DeferredText:
+    """Text produced by ``loader`` when first needed.
+
+    ``get`` runs the loader in the calling thread unless ``start`` already
+    began it on a background thread; concurrent callers share one fetch.
+    A failed fetch is not remembered, so the next ``get`` tries again.
+    """
+
+    def __init__(self, loader: Callable[[], Optional[str]]) -> None:
+        self._loader = loader
+        self._future: Optional[Future] = None
+        self._lock = threading.Lock()
+
+    def _claim(self) -> Tuple[Future, bool]:
+        """The current fetch, and whether the caller must run it."""
+        with self._lock:
+            if self._future is None:
+                self._future = Future()
+                return self._future, True
+            return self._future, False
+
+    def _run(self, future: Future) -> None:
+        try:
+            future.set_result(self._loader())
+        except BaseException as e:
+            with self._lock:
+                if self._future is future:
+                    self._future = None
+            future.set_exception(e)
+
+    def start(self) -> None:
+        """Begin fetching on a background thread, if not already started."""
+        future, owner = self._claim()
+        if owner:
+            threading.Thread(target=self._run, args=(future,), name="deferred-text", daemon=True).start()
+
+    def get(self) -> Optional[str]:
+        future, owner = self._claim()
+        if owner:
+            self._run(future)
+        return future.result()
+
+    @property
+    def done(self) -> bool:
+        future = self._future
+        return future is not None and future.done() and future.exception() is None
+
+    def __repr__(self) -> str:
+        return f"<deferred text ({'fetched' if self.done else 'pending'})>"
+
+
+class _TextField:
+    """Data descriptor for a text field that may hold a ``DeferredText``.
+
+    Reading the attribute resolves (and then keeps) the text; assigning
+    works as for a plain attribute.
+    """
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        self._key = f"_{name}"
+
+    def __get__(self, obj: object, objtype: Optional[type] = None) -> Optional[str]:
+        if obj is None:  # the dataclass default
+            return None
+        value = obj.__dict__.get(self._key)
+        if isinstance(value, DeferredText):
+            value = obj.__dict__[self._key] = value.get()
+        return value
+
+    def __set__(self, obj: object, value: object) -> None:
+        obj.__dict__[self._key] = value
+
+
+def stored_raw_text(result: object) -> object:
+    """``result.raw_text`` as stored, without fetching: a string, None or a
+    ``DeferredText``."""
+    return result.__dict__.get("_raw_text")
+
+
+def _repr(result: object) -> str:
+    # written out so that repr() never triggers a deferred fetch
+    shown = ", ".join(
+        f"{f.name}={stored_raw_text(result) if f.name == 'raw_text' else getattr(result, f.name)!r}"
+        for f in fields(result)
+    )
+    return f"{type(result).__name__}({shown})"
 
 
 @dataclass
 class ExtractionResult:
     fields: Dict[str, object]
-    raw_text: Optional[str] = None
+    raw_text: Optional[str] = _TextField()  # may be deferred: fetched when first read
+    tier: Optional[str] = None  # model that answered
+
+    def to_dict(self) -> Dict[str, object]:
+        return {"fields": self.fields, "raw_text": self.raw_text}
+
+    def __repr__(self) -> str:
+        return _repr(self)
 
 
 @dataclass
@@ -30,13 +131,39 @@ class AnalysisResult:
     category: DocCategory
     confidence: float
     fields: Dict[str, object]
-    raw_text: Optional[str] = None
+    raw_text: Optional[str] = _TextField()  # may be deferred: fetched when first read
+    metrics: Optional[Dict[str, object]] = None  # per-stage breakdown, when requested
+    tiers: Optional[Dict[str, str]] = None  # stage -> model (or local component) that produced it
 
-    def to_dict(self) -> Dict[str, object]:
-        """Convert AnalysisResult to a dictionary for JSON serialization."""
-        return {
+    @property
+    def raw_text_pending(self) -> bool:
+        """Whether ``raw_text`` is deferred and not fetched yet."""
+        value = stored_raw_text(self)
+        return isinstance(value, DeferredText) and not value.done
+
+    def prefetch_raw_text(self) -> None:
+        """Start fetching a deferred ``raw_text`` in the background."""
+        value = stored_raw_text(self)
+        if isinstance(value, DeferredText):
+            value.start()
+
+    def __repr__(self) -> str:
+        return _repr(self)
+
+    def to_dict(self, fetch_raw_text: bool = True) -> Dict[str, object]:
+        """Convert AnalysisResult to a dictionary for JSON serialization.
+
+        With ``fetch_raw_text=False`` a deferred ``raw_text`` that has not
+        been fetched yet is written as None instead of being fetched.
+        """
+        out = {
             "category": self.category.value,
             "confidence": self.confidence,
             "fields": self.fields,
-            "raw_text": self.raw_text,
+            "raw_text": None if not fetch_raw_text and self.raw_text_pending else self.raw_text,
         }
+        if self.tiers is not None:
+            out["tiers"] = self.tiers
+        if self.metrics is not None:
+            out["metrics"] = self.metrics
+        return out
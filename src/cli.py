@@ -0,0 +1,306 @@
+"""Headless batch entry point.
+
+    python -m src.cli analyse data/ scans/ --output results/ --concurrency 8
+    python -m src.cli export results/results.sqlite -o invoices.parquet --category invoice
+
+Each analysed document is appended as one JSON line to a shard in the
+output directory as soon as it finishes, and written to the output's
+``ResultStore`` (``results.sqlite``). Re-running the same command skips
+files whose sha256 already appears in the output, so an interrupted batch
+resumes where it stopped.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, TextIO
+
+from src.analysis.analyser import ANALYSIS_MODES, DocAnalyser
+from src.analysis.cache import DiskCache
+from src.analysis.cascade import DEFAULT_THRESHOLD, ModelCascade
+from src.analysis.dedup import REUSE_MODES, NearDuplicateIndex
+from src.analysis.preclassifier import CentroidModel, PreClassifier
+from src.analysis.store import ResultStore
+from src.analysis.types import DocCategory
+from src.ingestion.cache import JpegCache
+from src.ingestion.loader import PDF_MODES, iter_ingest
+from src.ingestion.types import IngestedFile
+from src.instrumentation import JsonlSink, PrometheusSink, add_sink, remove_sink
+
+
+SHARD_PATTERN = "part-*.jsonl"
+
+
+def completed_hashes(output_dir: Path) -> Set[str]:
+    """sha256 of every document already written to ``output_dir``.
+
+    A truncated last line (e.g. from a crash mid-write) is ignored, so that
+    document is simply analysed again.
+    """
+    done: Set[str] = set()
+    for shard in sorted(output_dir.glob(SHARD_PATTERN)):
+        with shard.open(encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("sha256"):
+                    done.add(record["sha256"])
+    return done
+
+
+class ShardedWriter:
+    """Appends JSON lines to ``part-NNNNN.jsonl`` files of at most
+    ``shard_size`` lines each. A new run always starts a new shard, so
+    shards from earlier runs are never modified."""
+
+    def __init__(self, output_dir: Path, shard_size: int) -> None:
+        self.output_dir = output_dir
+        self.shard_size = shard_size
+        existing = sorted(output_dir.glob(SHARD_PATTERN))
+        self._index = int(existing[-1].stem.split("-")[1]) + 1 if existing else 0
+        self._lines = 0
+        self._fh: Optional[TextIO] = None
+
+    def write(self, record: Dict) -> None:
+        if self._fh is None or self._lines >= self.shard_size:
+            self._rotate()
+        self._fh.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._fh.flush()
+        self._lines += 1
+
+    def _rotate(self) -> None:
+        self.close()
+        path = self.output_dir / f"part-{self._index:05d}.jsonl"
+        self._fh = path.open("a", encoding="utf-8")
+        self._index += 1
+        self._lines = 0
+
+    def close(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+
+def _pending_docs(
+    docs: Iterator[IngestedFile], done: Set[str], limit: Optional[int]
+) -> Iterator[IngestedFile]:
+    if limit is not None and limit <= 0:
+        return
+    taken = 0
+    for doc in docs:
+        if doc.sha256 in done:
+            continue
+        done.add(doc.sha256)
+        yield doc
+        taken += 1
+        if limit is not None and taken >= limit:
+            return
+
+
+def _record(doc: IngestedFile, result_dict: Dict) -> Dict:
+    return {"path": str(doc.path), "sha256": doc.sha256, **result_dict}
+
+
+def _preclassifier(args: argparse.Namespace) -> Optional[PreClassifier]:
+    if not (args.preclassify or args.preclassify_model or args.preclassify_shadow):
+        return None
+    return PreClassifier(
+        threshold=args.preclassify_threshold,
+        shadow=args.preclassify_shadow,
+        model=CentroidModel.load(args.preclassify_model) if args.preclassify_model else None,
+    )
+
+
+def _cascade(args: argparse.Namespace) -> Optional[ModelCascade]:
+    if not args.cascade:
+        return None
+    thresholds = {}
+    for item in args.cascade_category_threshold:
+        category, _, value = item.partition("=")
+        thresholds[DocCategory(category)] = float(value)
+    return ModelCascade(args.cascade, thresholds=thresholds, default_threshold=args.cascade_threshold)
+
+
+def cmd_analyse(args: argparse.Namespace) -> int:
+    output_dir: Path = args.output
+    output_dir.mkdir(parents=True, exist_ok=True)
+    store = ResultStore(args.store or output_dir / "results.sqlite", batch_size=args.store_batch)
+    done = completed_hashes(output_dir) | store.hashes()
+    if done:
+        print(f"Resuming: {len(done)} documents already in {output_dir}", file=sys.stderr)
+
+    analyser = DocAnalyser(
+        model=args.model,
+        cache=DiskCache(args.cache_dir) if args.cache_dir else None,
+        attach_metrics=args.attach_metrics,
+        preclassifier=_preclassifier(args),
+        dedup=NearDuplicateIndex(args.dedup_db, args.dedup_distance, args.dedup_reuse) if args.dedup_db else None,
+        cascade=_cascade(args),
+        pages_per_chunk=args.pages_per_chunk,
+    )
+    sinks = []
+    if args.metrics_jsonl:
+        sinks.append(add_sink(JsonlSink(args.metrics_jsonl)))
+    if args.metrics_prom:
+        sinks.append(add_sink(PrometheusSink()))
+    ok = failed = 0
+
+    def ingest_failed(path: Path, error: Exception) -> None:
+        nonlocal failed
+        failed += 1
+        print(f"Error ingesting {path}: {error}", file=sys.stderr)
+
+    docs = iter_ingest(
+        args.paths,
+        prefetch=args.concurrency,
+        workers=args.workers,
+        jpeg_cache=JpegCache(args.jpeg_cache_dir) if args.jpeg_cache_dir else None,
+        pdf_mode=args.pdf_mode,
+        on_error=ingest_failed,
+    )
+    writer = ShardedWriter(output_dir, args.shard_size)
+
+    def drain(pending: Dict[Future, IngestedFile], block_until: int) -> None:
+        nonlocal ok, failed
+        while len(pending) > block_until:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                doc = pending.pop(fut)
+                doc.release()  # finished docs wait here for draining; keep only metadata
+                try:
+                    result = fut.result()
+                except Exception as e:
+                    failed += 1
+                    print(f"Error analysing {doc.path}: {e}", file=sys.stderr)
+                    continue
+                result_dict = result.to_dict()
+                writer.write(_record(doc, result_dict))
+                store.add(doc.sha256, result_dict, path=str(doc.path))
+                ok += 1
+
+    pending: Dict[Future, IngestedFile] = {}
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            for doc in _pending_docs(docs, done, args.limit):
+                pending[pool.submit(analyser.analyse, doc, args.mode, args.raw_text)] = doc
+                drain(pending, block_until=args.concurrency * 2)
+            drain(pending, block_until=0)
+    finally:
+        docs.close()
+        writer.close()
+        store.close()
+        for sink in sinks:
+            remove_sink(sink)
+            if isinstance(sink, JsonlSink):
+                sink.close()
+            else:
+                sink.write(args.metrics_prom)
+
+    print(f"Analysed {ok} documents, {failed} failed", file=sys.stderr)
+    if analyser.preclassifier is not None:
+        print(f"Pre-classifier: {json.dumps(analyser.preclassifier.stats.to_dict())}", file=sys.stderr)
+    if analyser.cascade is not None:
+        print(f"Cascade: {json.dumps(analyser.cascade.stats.to_dict())}", file=sys.stderr)
+    if analyser.dedup is not None:
+        print(f"Near-duplicates: {json.dumps(analyser.dedup.stats.to_dict())}", file=sys.stderr)
+        analyser.dedup.close()
+    return 1 if failed else 0
+
+
+def cmd_export(args: argparse.Namespace) -> int:
+    if not args.store.exists():
+        print(f"No result store at {args.store}", file=sys.stderr)
+        return 1
+    query = {"category": args.category, "min_confidence": args.min_confidence, "text": args.text}
+    with ResultStore(args.store) as store:
+        if args.output.suffix == ".parquet":
+            n = store.export_parquet(args.output, **query)
+        else:
+            n = store.export_jsonl(args.output, **query)
+    print(f"Exported {n} results to {args.output}", file=sys.stderr)
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m src.cli", description="Multimodal document categoriser")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("analyse", help="Classify and extract documents, writing JSONL results")
+    p.add_argument("paths", nargs="+", type=Path, help="Files or directories to analyse")
+    p.add_argument("-o", "--output", type=Path, default=Path("analysis_output"),
+                   help="Output directory for part-NNNNN.jsonl shards (default: %(default)s)")
+    p.add_argument("-c", "--concurrency", type=int, default=4,
+                   help="Documents analysed concurrently (default: %(default)s)")
+    p.add_argument("--limit", type=int, default=None,
+                   help="Analyse at most this many new documents, then stop")
+    p.add_argument("--shard-size", type=int, default=10_000,
+                   help="Maximum lines per output shard (default: %(default)s)")
+    p.add_argument("--model", default="openai/gpt-4o")
+    p.add_argument("--mode", choices=ANALYSIS_MODES, default="two_step")
+    p.add_argument("--raw-text", choices=("inline", "none"), default="inline",
+                   help="Ask for the full OCR text (inline) or only the structured fields (none)")
+    p.add_argument("--pdf-mode", choices=PDF_MODES, default="auto")
+    p.add_argument("--pages-per-chunk", type=int, default=None, metavar="N",
+                   help="Extract PDFs longer than N pages in concurrent N-page chunks and merge the results")
+    p.add_argument("--workers", type=int, default=None,
+                   help="Ingestion worker processes (default: CPU count)")
+    p.add_argument("--cache-dir", type=Path, default=None,
+                   help="Directory for the analysis result cache")
+    p.add_argument("--jpeg-cache-dir", type=Path, default=None,
+                   help="Directory for the normalised image cache")
+    p.add_argument("--preclassify", action="store_true",
+                   help="Skip the classification request when the local pre-classifier is confident")
+    p.add_argument("--preclassify-model", type=Path, default=None,
+                   help="Trained CentroidModel JSON for the pre-classifier (implies --preclassify)")
+    p.add_argument("--preclassify-threshold", type=float, default=0.9,
+                   help="Minimum local confidence to skip the request (default: %(default)s)")
+    p.add_argument("--preclassify-shadow", action="store_true",
+                   help="Always call the LLM; only report how often the pre-classifier would disagree")
+    p.add_argument("--dedup-db", type=Path, default=None,
+                   help="SQLite near-duplicate index; reuse results for perceptually similar images")
+    p.add_argument("--dedup-distance", type=int, default=5,
+                   help="Maximum dHash Hamming distance for a near-duplicate (default: %(default)s)")
+    p.add_argument("--dedup-reuse", choices=REUSE_MODES, default="result",
+                   help="Reuse a near-duplicate's whole result or only its classification")
+    p.add_argument("--cascade", nargs="+", default=None, metavar="MODEL",
+                   help="Models to try cheapest first, escalating uncertain or incomplete answers (replaces --model)")
+    p.add_argument("--cascade-threshold", type=float, default=DEFAULT_THRESHOLD,
+                   help="Minimum classification confidence to accept a tier's answer (default: %(default)s)")
+    p.add_argument("--cascade-category-threshold", action="append", default=[], metavar="CATEGORY=VALUE",
+                   help="Threshold for one category, e.g. invoice=0.9 (repeatable)")
+    p.add_argument("--metrics-jsonl", type=Path, default=None,
+                   help="Append one JSON line per timed stage to this file")
+    p.add_argument("--metrics-prom", type=Path, default=None,
+                   help="Write Prometheus text-format stage metrics here on exit")
+    p.add_argument("--attach-metrics", action="store_true",
+                   help="Include each document's per-stage breakdown in its output record")
+    p.add_argument("--store", type=Path, default=None,
+                   help="SQLite result store to write to (default: OUTPUT/results.sqlite)")
+    p.add_argument("--store-batch", type=int, default=100,
+                   help="Results per store transaction (default: %(default)s)")
+    p.set_defaults(func=cmd_analyse)
+
+    p = sub.add_parser("export", help="Export results from a result store to JSONL or Parquet")
+    p.add_argument("store", type=Path, help="ResultStore SQLite file")
+    p.add_argument("-o", "--output", type=Path, required=True,
+                   help="Output file; .parquet writes Parquet (needs pyarrow), anything else JSONL")
+    p.add_argument("--category", choices=[c.value for c in DocCategory], default=None)
+    p.add_argument("--min-confidence", type=float, default=None)
+    p.add_argument("--text", default=None, help="Full-text (FTS5) query over raw_text")
+    p.set_defaults(func=cmd_export)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import os
+import tempfile
+import threading
+from dataclasses import dataclass
+from hashlib import sha256
+from pathlib import Path
+from typing import Optional
+
+
+@dataclass
+class JpegCacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+
+class JpegCache:
+    """On-disk cache of normalised JPEG payloads.
+
+    Entries are keyed by the source file's ``sha256`` plus the encoding
+    parameters (max_side, quality, tiling), so re-ingesting an unchanged
+    file costs a hash and a file read instead of decode→resize→encode.
+    Files are written atomically and
+    the object holds no open handles, so one cache can be pickled into
+    worker processes and shared by all of them. Recency is tracked via file
+    mtimes; once the total size exceeds ``max_bytes`` the least recently
+    used entries are removed until it is back to 90% of the cap.
+
+    Stats are per process.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int = 2 * 1024**3) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.stats = JpegCacheStats()
+        self._size: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(source_sha256: str, *params: object) -> str:
+        """Key for a payload derived from ``source_sha256`` with the given
+        encoding parameters (e.g. max_side, quality, tile index)."""
+        raw = ":".join(str(p) for p in (source_sha256, *params))
+        return sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.jpg"
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+        except OSError:
+            data = None
+        with self._lock:
+            if data is None:
+                self.stats.misses += 1
+                return None
+            self.stats.hits += 1
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        with self._lock:
+            if self._size is None:
+                self._size = self.size_bytes()
+            else:
+                self._size += len(data)
+            over = self._size > self.max_bytes
+        if over:
+            self._evict()
+
+    def _evict(self) -> None:
+        entries = []
+        for p in self.directory.glob("*/*.jpg"):
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+        entries.sort()
+        total = sum(size for _mtime, size, _p in entries)
+        target = int(self.max_bytes * 0.9)
+        for _mtime, size, p in entries:
+            if total <= target:
+                break
+            try:
+                p.unlink()
+            except OSError:
+                continue
+            total -= size
+            with self._lock:
+                self.stats.evictions += 1
+        with self._lock:
+            self._size = total
+
+    def size_bytes(self) -> int:
+        total = 0
+        for p in self.directory.glob("*/*.jpg"):
+            try:
+                total += p.stat().st_size
+            except OSError:
+                continue
+        return total
@@ -1,20 +1,38 @@
 from __future__ import annotations
 
-import base64
+from dataclasses import astuple
 from pathlib import Path
-from typing import List
+from typing import TYPE_CHECKING, List, Optional, Sequence
 
-from .preprocess import normalize_image_to_jpeg_bytes
-from .types import LLMFileBlock, LLMImageBlock, LLMTextBlock
+from src.instrumentation import span
+
+from .cache import JpegCache
+from .preprocess import (
+    DEFAULT_POLICY,
+    EncodingPolicy,
+    compute_sha256,
+    decode_rgb,
+    encode_layout,
+    normalize_image_to_jpeg_bytes,
+    open_image,
+    plan_layout,
+)
+from .types import Buffer, LLMBlock, LLMFileBlock, LLMImageBlock, LLMTextBlock, Payload, _to_data_uri
+
+if TYPE_CHECKING:
+    from PIL import Image
 
 
 def to_text_block(text: str) -> LLMTextBlock:
     return {"type": "text", "text": text}
 
 
-def _to_data_uri(mime: str, data: bytes) -> str:
-    b64 = base64.b64encode(data).decode("utf-8")
-    return f"data:{mime};base64,{b64}"
+def first_image_payload(payloads: Sequence[Payload]) -> Optional[Buffer]:
+    """Encoded bytes of the first image payload, if any."""
+    for payload in payloads:
+        if payload.kind == "image":
+            return payload.data
+    return None
 
 
 def image_path_to_block(path: Path, max_side: int = 1600) -> LLMImageBlock:
@@ -23,18 +41,136 @@ def image_path_to_block(path: Path, max_side: int = 1600) -> LLMImageBlock:
     return {"type": "image_url", "image_url": {"url": data_uri}}
 
 
-def pdf_path_to_block(path: Path) -> LLMFileBlock:
-    data = path.read_bytes()
+def _tile_payloads(jpegs: List[bytes]) -> List[Payload]:
+    if len(jpegs) == 1:
+        return [Payload.image(jpegs[0])]
+    note = Payload.text(
+        f"The next {len(jpegs)} images are consecutive, slightly overlapping "
+        "sections of one tall image, in reading order."
+    )
+    return [note, *(Payload.image(j) for j in jpegs)]
+
+
+def image_to_payloads(
+    img: Image.Image,
+    policies: Sequence[EncodingPolicy] = (DEFAULT_POLICY,),
+    cache: Optional[JpegCache] = None,
+    source_sha256: Optional[str] = None,
+) -> List[List[Payload]]:
+    """Encode an opened image under one or more policies.
+
+    Returns one payload list per policy. Pixel data is decoded at most once,
+    at the largest resolution any policy needs. With a ``cache`` and the
+    source file's ``source_sha256``, policies whose payloads are all cached
+    skip encoding, and if every policy hits ``img`` is never decoded.
+    """
+    layouts = [plan_layout(img.width, img.height, p) for p in policies]
+    payloads: List[Optional[List[bytes]]] = []
+    keys: List[List[str]] = []
+    for policy, layout in zip(policies, layouts):
+        n = len(layout.tiles)
+        tile_keys = [
+            JpegCache.key(source_sha256, *astuple(policy), i, n) for i in range(n)
+        ] if cache and source_sha256 else []
+        keys.append(tile_keys)
+        hits = [cache.get(k) for k in tile_keys] if tile_keys else []
+        payloads.append(hits if hits and all(h is not None for h in hits) else None)
+
+    missing = [i for i, p in enumerate(payloads) if p is None]
+    if missing:
+        target = max((layouts[i].size for i in missing), key=lambda wh: wh[0] * wh[1])
+        with span("encode_image", doc=source_sha256, source=img.size, target=target, layouts=len(missing)):
+            rgb = decode_rgb(img, target)
+            for i in missing:
+                payloads[i] = encode_layout(rgb, layouts[i], policies[i].quality)
+        for i in missing:
+            for key, data in zip(keys[i], payloads[i]):
+                cache.put(key, data)
+
+    return [_tile_payloads(p) for p in payloads]
+
+
+def image_to_blocks(
+    img: Image.Image,
+    policies: Sequence[EncodingPolicy] = (DEFAULT_POLICY,),
+    cache: Optional[JpegCache] = None,
+    source_sha256: Optional[str] = None,
+) -> List[List[LLMBlock]]:
+    """``image_to_payloads``, built into blocks."""
+    return [[p.to_block() for p in ps] for ps in image_to_payloads(img, policies, cache, source_sha256)]
+
+
+def image_to_block(
+    img: Image.Image,
+    max_side: int = 1600,
+    quality: int = 85,
+    cache: Optional[JpegCache] = None,
+    source_sha256: Optional[str] = None,
+) -> LLMImageBlock:
+    """Build a single (untiled) image block from an opened image."""
+    policy = EncodingPolicy(max_side=max_side, quality=quality, tile_aspect=None)
+    return image_to_blocks(img, [policy], cache, source_sha256)[0][0]
+
+
+def pdf_bytes_to_block(data: Buffer, filename: str) -> LLMFileBlock:
     data_uri = _to_data_uri("application/pdf", data)
     return {
         "type": "file",
-        "file": {"filename": path.name, "file_data": data_uri},
+        "file": {"filename": filename, "file_data": data_uri},
     }
 
 
-def file_to_blocks(path: Path, mime: str) -> List[dict]:
-    if mime.startswith("image/"):
-        return [image_path_to_block(path)]
-    if mime == "application/pdf":
-        return [pdf_path_to_block(path)]
-    raise ValueError(f"Unsupported mime type: {mime} for {path}")
+def pdf_text(filename: str, page_texts: Sequence[str], pages: Optional[Sequence[int]] = None) -> str:
+    """A PDF's embedded text layer, page by page, as sent to the LLM."""
+    selected = range(len(page_texts)) if pages is None else pages
+    parts = [f"Text layer of PDF '{filename}' ({len(page_texts)} pages):"]
+    for i in selected:
+        parts.append(f"--- Page {i + 1} ---\n{page_texts[i]}")
+    return "\n\n".join(parts)
+
+
+def pdf_text_pages(text: str, page_count: int) -> Optional[List[str]]:
+    """Page texts of a ``pdf_text`` covering all ``page_count`` pages, or
+    None if ``text`` was not built that way."""
+    header = "Text layer of PDF '"
+    markers = [f"\n\n--- Page {i + 1} ---\n" for i in range(page_count)]
+    if not text.startswith(header):
+        return None
+    starts = []
+    pos = 0
+    for marker in markers:
+        pos = text.find(marker, pos)
+        if pos < 0:
+            return None
+        starts.append(pos)
+        pos += len(marker)
+    ends = starts[1:] + [len(text)]
+    return [text[start + len(marker):end] for start, end, marker in zip(starts, ends, markers)]
+
+
+def pdf_text_block(
+    filename: str, page_texts: Sequence[str], pages: Optional[Sequence[int]] = None
+) -> LLMTextBlock:
+    """Text block carrying a PDF's embedded text layer, page by page."""
+    return to_text_block(pdf_text(filename, page_texts, pages))
+
+
+def pdf_path_to_block(path: Path) -> LLMFileBlock:
+    return pdf_bytes_to_block(path.read_bytes(), path.name)
+
+
+def file_to_blocks(
+    path: Path,
+    mime: str,
+    cache: Optional[JpegCache] = None,
+    policy: EncodingPolicy = DEFAULT_POLICY,
+) -> List[dict]:
+    with span("file_to_blocks", doc=str(path), mime=mime):
+        if mime.startswith("image/"):
+            data = path.read_bytes()
+            digest = compute_sha256(data) if cache else None
+            with open_image(data) as img:
+                return image_to_blocks(img, [policy], cache, digest)[0]
+        if mime == "application/pdf":
+            return [pdf_path_to_block(path)]
+        raise ValueError(f"Unsupported mime type: {mime} for {path}")
@@ -1,13 +1,35 @@
 from __future__ import annotations
 
 import os
+import queue
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from functools import partial
+from itertools import chain, islice
 from pathlib import Path
-from typing import Iterator, List, Sequence
+from typing import BinaryIO, Callable, Deque, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple, Union
 
-from .llm_blocks import file_to_blocks
-from .mime import guess_mime, is_supported
-from .preprocess import compute_sha256, load_image_meta, load_pdf_meta
-from .types import IngestedFile
+from src.instrumentation import span
+
+from .cache import JpegCache
+from .llm_blocks import first_image_payload, image_to_payloads, pdf_text, pdf_text_pages
+from .mime import detect_mime, is_supported
+from .phash import dhash_bytes
+from .preprocess import (
+    DEFAULT_POLICY,
+    THUMBNAIL_POLICY,
+    Buffer,
+    EncodingPolicy,
+    compute_sha256,
+    image_meta,
+    open_image,
+    open_pdf,
+    pdf_meta_from,
+    pdf_page_texts,
+    pdf_subset,
+)
+from .types import IngestedFile, PageChunk, Payload, PdfMeta
 
 
 def _iter_files(paths: Sequence[Path]) -> Iterator[Path]:
@@ -20,32 +42,394 @@ def _iter_files(paths: Sequence[Path]) -> Iterator[Path]:
             yield p
 
 
-def discover(paths: Sequence[Path]) -> List[Path]:
-    out: List[Path] = []
+def iter_discover(paths: Sequence[Path]) -> Iterator[Path]:
     for p in _iter_files(paths):
         if is_supported(p):
-            out.append(p)
-    return out
+            yield p
+
+
+def discover(paths: Sequence[Path]) -> List[Path]:
+    return list(iter_discover(paths))
+
+
+# How PDFs are sent: "file" always attaches the whole PDF; "text" sends the
+# embedded text layer whenever there is one; "auto" sends text only for
+# text-native PDFs (every page has text) and the file for scanned ones.
+PDF_MODES = ("auto", "file", "text")
+
+
+def _pdf_payloads(
+    data: Buffer, filename: str, pdf_mode: str, classify_pages: Sequence[int]
+) -> Tuple[PdfMeta, List[Payload], List[Payload]]:
+    if pdf_mode not in PDF_MODES:
+        raise ValueError(f"Unsupported pdf_mode: {pdf_mode}")
+    reader = open_pdf(data)
+    if reader is None:
+        return PdfMeta(), [Payload.file(data, filename)], []
+
+    texts = pdf_page_texts(reader) if pdf_mode != "file" else None
+    meta = pdf_meta_from(reader, texts)
+    pages = [i for i in classify_pages if i < len(reader.pages)]
+    use_text = texts is not None and (
+        meta.text_native if pdf_mode == "auto" else bool(meta.text_chars)
+    )
+
+    if use_text:
+        payloads = [Payload.text(pdf_text(filename, texts))]
+        classify_payloads = [Payload.text(pdf_text(filename, texts, pages))] if pages else []
+    else:
+        payloads = [Payload.file(data, filename)]
+        classify_payloads = []
+        if pages and len(pages) < len(reader.pages):
+            classify_payloads = [Payload.file(pdf_subset(reader, pages), filename)]
+    return meta, payloads, classify_payloads
+
+
+def page_ranges(page_count: Optional[int], pages_per_chunk: int) -> List[range]:
+    """Consecutive ranges of at most ``pages_per_chunk`` pages covering the
+    document; empty when it has no more pages than that (or an unknown count)."""
+    if pages_per_chunk < 1:
+        raise ValueError("pages_per_chunk must be >= 1")
+    if not page_count or page_count <= pages_per_chunk:
+        return []
+    return [range(start, min(start + pages_per_chunk, page_count)) for start in range(0, page_count, pages_per_chunk)]
 
 
-def ingest_path(path: Path) -> IngestedFile:
-    mime = guess_mime(path)
-    data = path.read_bytes()
-    meta_img = load_image_meta(path) if mime.startswith("image/") else None
-    meta_pdf = load_pdf_meta(path) if mime == "application/pdf" else None
+def pdf_chunks(doc: IngestedFile, pages_per_chunk: int) -> List[PageChunk]:
+    """Split an ingested PDF's payload into chunks of ``pages_per_chunk`` pages.
+
+    A text-layer payload is cut at its page markers; an attached file is
+    rewritten into one smaller PDF per range with pypdf. Returns an empty
+    list when the document is not a PDF, fits in one chunk, or its payload
+    cannot be split; raises ``ValueError`` if its payloads were released.
+    """
+    if doc.released:
+        raise ValueError(f"Payloads of {doc.path} were released")
+    ranges = page_ranges(doc.pdf.page_count if doc.pdf else None, pages_per_chunk)
+    if not ranges or len(doc.payloads) != 1:
+        return []
+
+    payload = doc.payloads[0]
+    with span("pdf_chunks", doc=str(doc.path), chunks=len(ranges)):
+        if payload.kind == "text":
+            texts = pdf_text_pages(payload.data, doc.pdf.page_count)
+            if texts is None:
+                return []
+            return [PageChunk(r, [Payload.text(pdf_text(doc.path.name, texts, r))]) for r in ranges]
+        if payload.kind == "file":
+            reader = open_pdf(payload.data)
+            if reader is None or len(reader.pages) != doc.pdf.page_count:
+                return []
+            return [PageChunk(r, [Payload.file(pdf_subset(reader, r), payload.filename)]) for r in ranges]
+    return []
+
+
+def _ingest_buffer(
+    data: Buffer,
+    path: Path,
+    mime: str,
+    jpeg_cache: Optional[JpegCache],
+    policy: EncodingPolicy,
+    classify_policy: Optional[EncodingPolicy],
+    pdf_mode: str,
+    classify_pages: Sequence[int],
+) -> IngestedFile:
+    digest = compute_sha256(data)
+    meta_img = None
+    meta_pdf = None
+    classify_payloads: List[Payload] = []
+    extra: Dict[str, object] = {}
+
+    if mime.startswith("image/"):
+        policies = [policy] if classify_policy is None else [policy, classify_policy]
+        with open_image(data) as img:
+            meta_img = image_meta(img)
+            payloads, *rest = image_to_payloads(img, policies, jpeg_cache, digest)
+        classify_payloads = rest[0] if rest else []
+        # hashed from the smallest encoded payload: cheap, and works on cache hits
+        thumb = first_image_payload(classify_payloads or payloads)
+        if thumb is not None:
+            extra["dhash"] = dhash_bytes(thumb)
+    elif mime == "application/pdf":
+        with span("pdf_payloads", doc=str(path), pdf_mode=pdf_mode):
+            meta_pdf, payloads, classify_payloads = _pdf_payloads(data, path.name, pdf_mode, classify_pages)
+    else:
+        raise ValueError(f"Unsupported mime type: {mime} for {path}")
 
-    blocks = file_to_blocks(path, mime)
     return IngestedFile(
         path=path,
         mime_type=mime,
         size_bytes=len(data),
-        sha256=compute_sha256(data),
+        sha256=digest,
         image=meta_img,
         pdf=meta_pdf,
-        blocks=blocks,
+        payloads=payloads,
+        classify_payloads=classify_payloads,
+        extra=extra,
+    )
+
+
+def ingest_path(
+    path: Path,
+    jpeg_cache: Optional[JpegCache] = None,
+    policy: EncodingPolicy = DEFAULT_POLICY,
+    classify_policy: Optional[EncodingPolicy] = THUMBNAIL_POLICY,
+    pdf_mode: str = "auto",
+    classify_pages: Sequence[int] = (0,),
+) -> IngestedFile:
+    """Ingest one file, reading it from disk exactly once.
+
+    The hash, metadata and LLM payloads are all derived from the same
+    in-memory buffer; images are opened by Pillow a single time and the
+    decoded image is shared by metadata extraction and normalisation.
+    With a ``jpeg_cache`` hit the image is never decoded at all: metadata
+    comes from the header and the payload from the cache. Payloads stay
+    raw bytes (an unmodified PDF shares the read buffer); base64 blocks
+    are only built when requested (see ``IngestedFile``).
+
+    The MIME type is sniffed from the file's magic bytes, falling back to
+    the extension.
+
+    Images are encoded with ``policy`` for ``payloads`` and, unless
+    ``classify_policy`` is None, a second time (from the same decode) into
+    cheaper ``classify_payloads``. Their 64-bit perceptual hash (see
+    ``src.ingestion.phash``) is stored in ``extra["dhash"]``.
+
+    PDFs are parsed once with pypdf. Depending on ``pdf_mode`` (see
+    ``PDF_MODES``) the embedded text layer is sent as a text block instead
+    of attaching the file. Classification only sees ``classify_pages``
+    (zero-based; the first page by default), either as text or as a
+    reduced PDF.
+    """
+    with span("ingest_path", doc=str(path)) as sp:
+        data = path.read_bytes()
+        mime = detect_mime(data, path)
+        sp.set(mime=mime, size_bytes=len(data))
+        return _ingest_buffer(data, path, mime, jpeg_cache, policy, classify_policy, pdf_mode, classify_pages)
+
+
+def ingest_bytes(
+    data: Buffer,
+    filename: str = "upload",
+    mime: Optional[str] = None,
+    jpeg_cache: Optional[JpegCache] = None,
+    policy: EncodingPolicy = DEFAULT_POLICY,
+    classify_policy: Optional[EncodingPolicy] = THUMBNAIL_POLICY,
+    pdf_mode: str = "auto",
+    classify_pages: Sequence[int] = (0,),
+) -> IngestedFile:
+    """Ingest a document that is already in memory, e.g. an upload.
+
+    Same processing as ``ingest_path`` without touching the disk. The
+    result's ``path`` is just ``filename``; it names the document in
+    prompts and output but does not exist on disk. ``mime`` overrides
+    sniffing when the caller knows better.
+
+    ``bytes`` input is shared with Pillow and pypdf without copying;
+    ``bytearray``/``memoryview`` input is copied once when it is opened.
+    """
+    with span("ingest_bytes", doc=filename) as sp:
+        mime = mime or detect_mime(data, filename)
+        sp.set(mime=mime, size_bytes=len(data))
+        return _ingest_buffer(
+            data, Path(filename), mime, jpeg_cache, policy, classify_policy, pdf_mode, classify_pages
+        )
+
+
+def ingest_stream(fileobj: BinaryIO, filename: Optional[str] = None, **options) -> IngestedFile:
+    """Ingest the contents of a binary file object (see ``ingest_bytes``).
+
+    ``filename`` defaults to the object's ``name`` attribute. In-memory
+    streams with ``getvalue`` (``io.BytesIO``, Streamlit uploads) are read
+    without an extra copy.
+    """
+    if filename is None:
+        filename = Path(getattr(fileobj, "name", None) or "upload").name
+    getvalue = getattr(fileobj, "getvalue", None)
+    data = getvalue() if callable(getvalue) else fileobj.read()
+    return ingest_bytes(data, filename, **options)
+
+
+_DONE = object()
+
+# Below this many files, process pool startup costs more than it saves.
+PARALLEL_MIN_FILES = 4
+
+
+def _resolve_workers(workers: Optional[int]) -> int:
+    if workers is None:
+        return os.cpu_count() or 1
+    return max(1, workers)
+
+
+IngestFn = Callable[[Path], IngestedFile]
+ErrorHandler = Callable[[Path, Exception], None]
+
+
+class _Failed(NamedTuple):
+    """A file that could not be ingested, passed back instead of raising."""
+    path: Path
+    error: Exception
+
+
+def _ingest_or_fail(fn: IngestFn, path: Path) -> Union[IngestedFile, _Failed]:
+    try:
+        return fn(path)
+    except Exception as e:
+        return _Failed(path, e)
+
+
+def _ingest_serial(files: Iterable[Path], fn: IngestFn, prefetch: int) -> Iterator[IngestedFile]:
+    if prefetch <= 0:
+        for p in files:
+            yield fn(p)
+        return
+
+    ready: queue.Queue = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+
+    def put(item: object) -> bool:
+        while not stop.is_set():
+            try:
+                ready.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce() -> None:
+        try:
+            for p in files:
+                if not put(fn(p)):
+                    return
+        except BaseException as e:
+            put(e)
+            return
+        put(_DONE)
+
+    worker = threading.Thread(target=produce, name="iter_ingest", daemon=True)
+    worker.start()
+    try:
+        while True:
+            item = ready.get()
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        worker.join()
+
+
+def _ingest_parallel(
+    files: Iterable[Path], fn: IngestFn, workers: int, window: int, ordered: bool
+) -> Iterator[IngestedFile]:
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        if ordered:
+            queued: Deque[Future] = deque()
+            for p in files:
+                queued.append(pool.submit(fn, p))
+                if len(queued) >= window:
+                    yield queued.popleft().result()
+            while queued:
+                yield queued.popleft().result()
+        else:
+            pending: Set[Future] = set()
+            for p in files:
+                pending.add(pool.submit(fn, p))
+                if len(pending) >= window:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for f in done:
+                        yield f.result()
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for f in done:
+                    yield f.result()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def iter_ingest(
+    paths: Sequence[Path],
+    prefetch: int = 2,
+    workers: Optional[int] = None,
+    ordered: bool = True,
+    jpeg_cache: Optional[JpegCache] = None,
+    policy: EncodingPolicy = DEFAULT_POLICY,
+    classify_policy: Optional[EncodingPolicy] = THUMBNAIL_POLICY,
+    pdf_mode: str = "auto",
+    classify_pages: Sequence[int] = (0,),
+    on_error: Optional[ErrorHandler] = None,
+) -> Iterator[IngestedFile]:
+    """Lazily discover and ingest files, yielding each one as soon as it is ready.
+
+    Decoding, resizing and encoding are fanned out to a pool of ``workers``
+    processes (default: CPU count). Batches smaller than
+    ``PARALLEL_MIN_FILES``, or ``workers=1``, are ingested serially instead:
+    a background thread works up to ``prefetch`` files ahead of the consumer
+    (``prefetch=0`` ingests in the caller's thread).
+
+    Either way the number of encoded files alive at once is bounded by
+    ``max(prefetch, workers)`` plus a small constant, regardless of corpus
+    size. With ``ordered=False`` files are yielded as they complete rather
+    than in discovery order. The remaining options are passed to
+    ``ingest_path`` (and shared with the worker processes).
+
+    Errors raised while ingesting are re-raised from the generator at the
+    position of the failing file, unless ``on_error`` is given: then it is
+    called with the file's path and the exception, in the consumer's
+    thread, and ingestion continues with the next file. Process pools need the calling script to
+    be import-safe (``if __name__ == "__main__":``) on spawn-based platforms.
+    """
+    fn = partial(
+        ingest_path,
+        jpeg_cache=jpeg_cache,
+        policy=policy,
+        classify_policy=classify_policy,
+        pdf_mode=pdf_mode,
+        classify_pages=classify_pages,
     )
+    if on_error is not None:
+        fn = partial(_ingest_or_fail, fn)
+    workers = _resolve_workers(workers)
+    files = iter_discover(paths)
+    head = list(islice(files, PARALLEL_MIN_FILES))
+    files = chain(head, files)
+
+    if workers > 1 and len(head) >= PARALLEL_MIN_FILES:
+        results = _ingest_parallel(files, fn, workers, max(prefetch, workers), ordered)
+    else:
+        results = _ingest_serial(files, fn, prefetch)
+    try:
+        for item in results:
+            if isinstance(item, _Failed):
+                on_error(item.path, item.error)
+                continue
+            yield item
+    finally:
+        results.close()
 
 
-def ingest(paths: Sequence[Path]) -> List[IngestedFile]:
-    files = discover(paths)
-    return [ingest_path(p) for p in files]
+def ingest(
+    paths: Sequence[Path],
+    workers: Optional[int] = None,
+    ordered: bool = True,
+    jpeg_cache: Optional[JpegCache] = None,
+    policy: EncodingPolicy = DEFAULT_POLICY,
+    classify_policy: Optional[EncodingPolicy] = THUMBNAIL_POLICY,
+    pdf_mode: str = "auto",
+    classify_pages: Sequence[int] = (0,),
+) -> List[IngestedFile]:
+    return list(iter_ingest(
+        paths,
+        prefetch=0,
+        workers=workers,
+        ordered=ordered,
+        jpeg_cache=jpeg_cache,
+        policy=policy,
+        classify_policy=classify_policy,
+        pdf_mode=pdf_mode,
+        classify_pages=classify_pages,
+    ))
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 import mimetypes
 from pathlib import Path
-from typing import Set
+from typing import List, Optional, Set, Tuple, Union
 
 
 IMAGE_EXTS: Set[str] = {
@@ -16,6 +16,19 @@ IMAGE_EXTS: Set[str] = {
 }
 PDF_EXTS: Set[str] = {".pdf"}
 
+# (offset, signature, mime) for every format we can ingest
+MAGIC: List[Tuple[int, bytes, str]] = [
+    (0, b"\x89PNG\r\n\x1a\n", "image/png"),
+    (0, b"\xff\xd8\xff", "image/jpeg"),
+    (8, b"WEBP", "image/webp"),  # after b"RIFF" + 4-byte size
+    (0, b"II*\x00", "image/tiff"),
+    (0, b"MM\x00*", "image/tiff"),
+    (0, b"BM", "image/bmp"),
+    (0, b"%PDF-", "application/pdf"),
+]
+# readers accept a PDF header anywhere in the first KiB
+PDF_HEADER_WINDOW = 1024
+
 
 def guess_mime(path: Path) -> str:
     # Prefer extension-based guess (cross-platform)
@@ -34,3 +47,28 @@ def guess_mime(path: Path) -> str:
 def is_supported(path: Path) -> bool:
     ext = path.suffix.lower()
     return ext in IMAGE_EXTS or ext in PDF_EXTS
+
+
+def sniff_mime(data: Union[bytes, bytearray, memoryview]) -> Optional[str]:
+    """MIME type from the leading magic bytes, or None if unrecognised."""
+    head = bytes(memoryview(data)[:PDF_HEADER_WINDOW])
+    for offset, signature, mime in MAGIC:
+        if head.startswith(signature, offset):
+            if mime == "image/webp" and not head.startswith(b"RIFF"):
+                continue
+            return mime
+    if b"%PDF-" in head:
+        return "application/pdf"
+    return None
+
+
+def detect_mime(data: Union[bytes, bytearray, memoryview], name: Optional[Union[str, Path]] = None) -> str:
+    """Content-based MIME type, falling back to the extension of ``name``.
+
+    File extensions lie (e.g. a WEBP saved as ``.jpeg``); the magic bytes
+    decide whenever they identify a supported format.
+    """
+    sniffed = sniff_mime(data)
+    if sniffed is not None:
+        return sniffed
+    return guess_mime(Path(name)) if name is not None else "application/octet-stream"
@@ -0,0 +1,44 @@
+"""Perceptual hashing for near-duplicate detection.
+
+``dhash`` (difference hash) compares neighbouring pixels of a tiny
+greyscale copy of the image. Re-compressed, re-scaled or slightly cropped
+copies of a screenshot land within a few bits of each other, unlike
+``sha256``, which changes completely.
+"""
+from __future__ import annotations
+
+import io
+
+from src.lazy import lazy_module
+
+from .preprocess import Buffer
+
+np = lazy_module("numpy")
+Image = lazy_module("PIL.Image")
+
+
+DHASH_SIZE = 8  # 8x8 comparisons -> 64-bit hash
+
+
+def dhash(img: Image.Image, size: int = DHASH_SIZE) -> int:
+    """Difference hash of ``img`` as a ``size * size``-bit integer."""
+    img.draft("L", (size * 8, size * 8))  # JPEG: decode at reduced scale
+    gray = img.convert("L").resize((size + 1, size), Image.Resampling.BOX)
+    px = np.asarray(gray, dtype=np.int16)
+    bits = (px[:, 1:] > px[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def dhash_bytes(data: Buffer, size: int = DHASH_SIZE) -> int:
+    with Image.open(io.BytesIO(data)) as img:
+        return dhash(img, size)
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def hamming_many(h: int, hashes: np.ndarray) -> np.ndarray:
+    """Hamming distances from ``h`` to every 64-bit hash in ``hashes`` (uint64)."""
+    x = np.bitwise_xor(hashes.astype(np.uint64), np.uint64(h))
+    return np.unpackbits(x.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
@@ -1,30 +1,189 @@
 from __future__ import annotations
 
 import io
+import math
+from dataclasses import dataclass
 from hashlib import sha256
 from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
 
-from PIL import Image
-from pypdf import PdfReader
-from pypdf.errors import PdfReadError
+from src.lazy import lazy_module
 
-from .types import ImageMeta, PdfMeta
+from .types import Buffer, ImageMeta, Payload, PdfMeta
 
+Image = lazy_module("PIL.Image")
+pypdf = lazy_module("pypdf")
 
-def compute_sha256(data: bytes) -> str:
+
+def compute_sha256(data: Buffer) -> str:
     return sha256(data).hexdigest()
 
 
 # --- Image utils (Pillow) ---
 
+def open_image(data: Buffer) -> Image.Image:
+    """Open an image from an in-memory buffer. Only the header is parsed
+    until pixel data is actually needed."""
+    return Image.open(io.BytesIO(data))
+
+
+def image_meta(img: Image.Image) -> ImageMeta:
+    return ImageMeta(
+        format=img.format,
+        width=img.width,
+        height=img.height,
+        mode=img.mode,
+    )
+
+
 def load_image_meta(path: Path) -> ImageMeta:
     with Image.open(path) as img:
-        return ImageMeta(
-            format=img.format,
-            width=img.width,
-            height=img.height,
-            mode=img.mode,
-        )
+        return image_meta(img)
+
+
+# --- Encoding policies ---
+
+@dataclass(frozen=True)
+class EncodingPolicy:
+    """How an image is turned into JPEG payloads for the LLM.
+
+    ``max_side`` bounds the longest side of each payload. Images whose
+    long/short side ratio exceeds ``tile_aspect`` (e.g. long chat scrolls)
+    are not squashed to ``max_side``; they are scaled by their short side
+    and cut into up to ``max_tiles`` overlapping tiles along the long side.
+    ``token_budget`` caps the estimated image tokens across all tiles by
+    lowering the resolution further.
+    """
+
+    max_side: int = 1600
+    quality: int = 85
+    tile_aspect: Optional[float] = 3.0  # None disables tiling
+    max_tiles: int = 8
+    tile_overlap: float = 0.05  # fraction of a tile shared with the next one
+    token_budget: Optional[int] = None
+
+
+DEFAULT_POLICY = EncodingPolicy()
+# Enough to recognise the kind of document, not to read it.
+THUMBNAIL_POLICY = EncodingPolicy(max_side=768, quality=75, tile_aspect=None)
+
+
+@dataclass(frozen=True)
+class TileLayout:
+    size: Tuple[int, int]  # size of the scaled image
+    tiles: List[Tuple[int, int, int, int]]  # crop boxes in scaled coordinates
+
+
+def estimate_image_tokens(width: int, height: int) -> int:
+    """Approximate high-detail image token cost (OpenAI's 512px tile rule)."""
+    scale = min(1.0, 2048 / max(width, height))
+    w, h = width * scale, height * scale
+    scale = min(1.0, 768 / min(w, h))
+    w, h = w * scale, h * scale
+    return 85 + 170 * math.ceil(w / 512) * math.ceil(h / 512)
+
+
+# Rough prompt tokens per byte of a PDF sent as a ``file`` block
+PDF_TOKENS_PER_BYTE = 0.25
+
+
+def estimate_payload_tokens(payloads: Sequence[Payload]) -> int:
+    """Approximate prompt tokens of ``payloads``: ~4 characters per token
+    for text, ``estimate_image_tokens`` for images (dimensions are read
+    from the encoded header, nothing is decoded) and
+    ``PDF_TOKENS_PER_BYTE`` for PDFs."""
+    tokens = 0
+    for payload in payloads:
+        if payload.kind == "text":
+            tokens += len(payload.data) // 4
+        elif payload.kind == "image":
+            with open_image(payload.data) as img:
+                tokens += estimate_image_tokens(img.width, img.height)
+        else:
+            tokens += math.ceil(len(payload.data) * PDF_TOKENS_PER_BYTE)
+    return tokens
+
+
+def _layout(width: int, height: int, max_side: int, policy: EncodingPolicy) -> TileLayout:
+    long_side, short_side = max(width, height), min(width, height)
+    tiled = policy.tile_aspect is not None and long_side / short_side > policy.tile_aspect
+    if not tiled:
+        scale = min(1.0, max_side / long_side)
+        size = (max(1, int(width * scale)), max(1, int(height * scale)))
+        return TileLayout(size=size, tiles=[(0, 0, *size)])
+
+    overlap = int(max_side * policy.tile_overlap)
+    step = max_side - overlap
+    scale = min(1.0, max_side / short_side)
+    if long_side * scale > policy.max_tiles * step + overlap:
+        scale = (policy.max_tiles * step + overlap) / long_side
+    size = (max(1, int(width * scale)), max(1, int(height * scale)))
+    length = max(size)
+    if length <= max_side:
+        return TileLayout(size=size, tiles=[(0, 0, *size)])
+
+    starts = list(range(0, length - max_side, step)) + [length - max_side]
+    if width >= height:
+        tiles = [(x, 0, x + max_side, size[1]) for x in starts]
+    else:
+        tiles = [(0, y, size[0], y + max_side) for y in starts]
+    return TileLayout(size=size, tiles=tiles)
+
+
+def plan_layout(width: int, height: int, policy: EncodingPolicy = DEFAULT_POLICY) -> TileLayout:
+    """Work out payload geometry from the image dimensions alone.
+
+    Deterministic and decode-free, so callers can look up cached payloads
+    before touching pixel data.
+    """
+    max_side = policy.max_side
+    layout = _layout(width, height, max_side, policy)
+    while policy.token_budget is not None and max_side > 256:
+        tokens = sum(estimate_image_tokens(r - l, b - t) for l, t, r, b in layout.tiles)
+        if tokens <= policy.token_budget:
+            break
+        max_side = int(max_side * 0.8)
+        layout = _layout(width, height, max_side, policy)
+    return layout
+
+
+def decode_rgb(img: Image.Image, size: Tuple[int, int]) -> Image.Image:
+    """Decode ``img`` to RGB, at no more resolution than needed for ``size``.
+
+    JPEGs are decoded with DCT scaling (``Image.draft``) so large photos are
+    never fully decoded when only a downscaled copy is wanted.
+    """
+    if img.format == "JPEG" and max(size) * 2 <= max(img.size):
+        img.draft("RGB", size)
+    return img.convert("RGB")
+
+
+def encode_layout(rgb: Image.Image, layout: TileLayout, quality: int = 85) -> List[bytes]:
+    if rgb.size != layout.size:
+        rgb = rgb.resize(layout.size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+    out = []
+    for box in layout.tiles:
+        tile = rgb if box == (0, 0, *layout.size) else rgb.crop(box)
+        buf = io.BytesIO()
+        tile.save(buf, format="JPEG", quality=quality, optimize=True)
+        out.append(buf.getvalue())
+    return out
+
+
+def encode_image(img: Image.Image, policy: EncodingPolicy = DEFAULT_POLICY) -> List[bytes]:
+    """Encode an opened image into one JPEG payload per tile."""
+    layout = plan_layout(img.width, img.height, policy)
+    return encode_layout(decode_rgb(img, layout.size), layout, policy.quality)
+
+
+def normalize_image(
+    img: Image.Image, max_side: int = 1600, quality: int = 85
+) -> bytes:
+    """Downscale an already opened image if largest side > max_side, return JPEG bytes.
+    Keeps aspect ratio, converts to RGB.
+    """
+    policy = EncodingPolicy(max_side=max_side, quality=quality, tile_aspect=None)
+    return encode_image(img, policy)[0]
 
 
 def normalize_image_to_jpeg_bytes(
@@ -34,25 +193,64 @@ def normalize_image_to_jpeg_bytes(
     Keeps aspect ratio, converts to RGB.
     """
     with Image.open(path) as img:
-        img = img.convert("RGB")
-        w, h = img.size
-        scale = 1.0
-        longest = max(w, h)
-        if longest > max_side:
-            scale = max_side / float(longest)
-        if scale < 1.0:
-            new_size = (int(w * scale), int(h * scale))
-            img = img.resize(new_size, Image.Resampling.LANCZOS)
-        buf = io.BytesIO()
-        img.save(buf, format="JPEG", quality=quality, optimize=True)
-        return buf.getvalue()
+        return normalize_image(img, max_side=max_side, quality=quality)
 
 
 # --- PDF utils (pypdf for lightweight metadata) ---
 
+# A page with less extracted text than this is treated as scanned.
+MIN_PAGE_TEXT_CHARS = 25
+
+
+def open_pdf(data: Buffer) -> Optional[pypdf.PdfReader]:
+    try:
+        reader = pypdf.PdfReader(io.BytesIO(data))
+        len(reader.pages)  # forces the page tree to be parsed
+        return reader
+    except (pypdf.errors.PdfReadError, OSError, ValueError):
+        return None
+
+
+def pdf_page_texts(reader: pypdf.PdfReader) -> List[str]:
+    """Embedded text layer of every page ("" where a page has none)."""
+    texts = []
+    for page in reader.pages:
+        try:
+            texts.append((page.extract_text() or "").strip())
+        except (pypdf.errors.PdfReadError, ValueError, KeyError):
+            texts.append("")
+    return texts
+
+
+def pdf_meta_from(reader: Optional[pypdf.PdfReader], page_texts: Optional[List[str]] = None) -> PdfMeta:
+    if reader is None:
+        return PdfMeta()
+    meta = PdfMeta(page_count=len(reader.pages))
+    if page_texts is not None:
+        meta.text_chars = sum(len(t) for t in page_texts)
+        meta.text_native = bool(page_texts) and all(
+            len(t) >= MIN_PAGE_TEXT_CHARS for t in page_texts
+        )
+    return meta
+
+
+def pdf_meta(data: Buffer) -> PdfMeta:
+    return pdf_meta_from(open_pdf(data))
+
+
+def pdf_subset(reader: pypdf.PdfReader, pages: Sequence[int]) -> bytes:
+    """Write a new PDF containing only ``pages`` (zero-based) of ``reader``."""
+    writer = pypdf.PdfWriter()
+    for i in pages:
+        writer.add_page(reader.pages[i])
+    buf = io.BytesIO()
+    writer.write(buf)
+    return buf.getvalue()
+
+
 def load_pdf_meta(path: Path) -> PdfMeta:
     try:
-        reader = PdfReader(str(path))
+        reader = pypdf.PdfReader(str(path))
         return PdfMeta(page_count=len(reader.pages))
-    except (PdfReadError, OSError, ValueError):
+    except (pypdf.errors.PdfReadError, OSError, ValueError):
         return PdfMeta()
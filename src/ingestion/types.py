@@ -1,8 +1,13 @@
 from __future__ import annotations
 
+import base64
+from contextlib import contextmanager
 from dataclasses import dataclass, field
+from itertools import chain
 from pathlib import Path
-from typing import Dict, List, Literal, Optional, TypedDict, Union
+from typing import Dict, Iterator, List, Literal, Optional, TypedDict, Union
+
+from src.instrumentation import span
 
 
 # ----- LLM content block types (OpenAI-style) -----
@@ -34,9 +39,73 @@ class LLMFileBlock(TypedDict):
 LLMBlock = Union[LLMTextBlock, LLMImageBlock, LLMFileBlock]
 
 
+# ----- Raw block content -----
+
+# Anything exposing the buffer protocol; ingestion reads each file into one
+# buffer and derives the hash, metadata and payloads from it.
+Buffer = Union[bytes, bytearray, memoryview]
+
+
+def _to_data_uri(mime: str, data: Buffer) -> str:
+    with span("base64", mime=mime, size_bytes=len(data)):
+        b64 = base64.b64encode(data).decode("utf-8")
+    return f"data:{mime};base64,{b64}"
+
+
+@dataclass(slots=True, repr=False)
+class Payload:
+    """Content of one LLM block before encoding: text, or encoded image/PDF
+    bytes. Holding these instead of blocks keeps binaries at their raw size
+    (data URIs are a third larger); ``to_block`` builds the block."""
+    kind: Literal["text", "image", "file"]
+    data: Union[str, Buffer]
+    mime: Optional[str] = None
+    filename: Optional[str] = None  # file payloads only
+
+    @classmethod
+    def text(cls, text: str) -> "Payload":
+        return cls("text", text)
+
+    @classmethod
+    def image(cls, data: Buffer, mime: str = "image/jpeg") -> "Payload":
+        return cls("image", data, mime)
+
+    @classmethod
+    def file(cls, data: Buffer, filename: str, mime: str = "application/pdf") -> "Payload":
+        return cls("file", data, mime, filename)
+
+    def to_block(self) -> LLMBlock:
+        if self.kind == "text":
+            return {"type": "text", "text": self.data}
+        data_uri = _to_data_uri(self.mime, self.data)
+        if self.kind == "image":
+            return {"type": "image_url", "image_url": {"url": data_uri}}
+        return {"type": "file", "file": {"filename": self.filename, "file_data": data_uri}}
+
+    def __repr__(self) -> str:
+        return f"Payload({self.kind}, {self.mime or 'text'}, {len(self.data)} {'chars' if self.kind == 'text' else 'bytes'})"
+
+
+@dataclass(slots=True)
+class PageChunk:
+    """A range of a PDF's pages as payloads of their own (see
+    ``src.ingestion.loader.pdf_chunks``)."""
+    pages: range  # zero-based
+    payloads: List[Payload]
+
+    @property
+    def blocks(self) -> List[LLMBlock]:
+        return [p.to_block() for p in self.payloads]
+
+    @property
+    def label(self) -> str:
+        """One-based page range, e.g. "11-20"."""
+        return f"{self.pages.start + 1}-{self.pages.stop}"
+
+
 # ----- Ingested file metadata -----
 
-@dataclass
+@dataclass(slots=True)
 class ImageMeta:
     format: Optional[str] = None  # e.g., JPEG, PNG
     width: Optional[int] = None
@@ -44,13 +113,24 @@ class ImageMeta:
     mode: Optional[str] = None  # e.g., RGB, L
 
 
-@dataclass
+@dataclass(slots=True)
 class PdfMeta:
     page_count: Optional[int] = None
+    text_chars: Optional[int] = None  # length of the embedded text layer
+    text_native: Optional[bool] = None  # every page has a usable text layer
 
 
-@dataclass
+@dataclass(slots=True)
 class IngestedFile:
+    """An ingested document.
+
+    Content is kept as raw ``payloads``; ``blocks`` and ``classify_blocks``
+    build fresh LLM blocks from them on every access. Inside
+    ``with doc.materialised():`` they are built once and the same objects
+    are returned until the block exits, so a multi-request analysis encodes
+    each payload once and drops the encodings afterwards. ``release()``
+    drops the payloads themselves once the document has been analysed.
+    """
     # input
     path: Path
     mime_type: str
@@ -63,8 +143,57 @@ class IngestedFile:
     image: Optional[ImageMeta] = None
     pdf: Optional[PdfMeta] = None
 
-    # ready-to-send content blocks for LLMs
-    blocks: List[LLMBlock] = field(default_factory=list)
+    # content for LLMs
+    payloads: List[Payload] = field(default_factory=list)
+    # cheaper content for classification; empty means "use payloads"
+    classify_payloads: List[Payload] = field(default_factory=list)
 
     # arbitrary extra information
     extra: Dict[str, object] = field(default_factory=dict)
+
+    released: bool = field(default=False, init=False, compare=False)
+    _pinned: Optional[Dict[str, List[LLMBlock]]] = field(default=None, init=False, repr=False, compare=False)
+
+    def _blocks(self, which: str) -> List[LLMBlock]:
+        pinned = self._pinned
+        if pinned is not None and which in pinned:
+            return pinned[which]
+        if self.released:
+            raise ValueError(f"Payloads of {self.path} were released")
+        blocks = [p.to_block() for p in getattr(self, which)]
+        if pinned is not None:
+            pinned[which] = blocks
+        return blocks
+
+    @property
+    def blocks(self) -> List[LLMBlock]:
+        """Ready-to-send content blocks."""
+        return self._blocks("payloads")
+
+    @property
+    def classify_blocks(self) -> List[LLMBlock]:
+        """Cheaper blocks for classification; empty means "use blocks"."""
+        return self._blocks("classify_payloads")
+
+    @property
+    def payload_bytes(self) -> int:
+        return sum(len(p.data) for p in chain(self.payloads, self.classify_payloads))
+
+    @contextmanager
+    def materialised(self) -> Iterator["IngestedFile"]:
+        """Build blocks at most once while the block runs (re-entrant)."""
+        if self._pinned is not None:
+            yield self
+            return
+        self._pinned = {}
+        try:
+            yield self
+        finally:
+            self._pinned = None
+
+    def release(self) -> None:
+        """Drop the payloads; metadata, hash and ``extra`` are kept."""
+        self.payloads = []
+        self.classify_payloads = []
+        self._pinned = None
+        self.released = True
@@ -0,0 +1,274 @@
+"""Lightweight span timing for ingestion and analysis.
+
+Code under measurement wraps stages in ``span(name)``. When no sink is
+registered and no per-document collection is active, ``span`` returns a
+shared no-op object, so disabled instrumentation costs one function call
+and a couple of checks per stage.
+
+Usage:
+    from src.instrumentation import MemoryAggregator, add_sink
+
+    agg = add_sink(MemoryAggregator())
+    ... run ingestion / analysis ...
+    print(agg.summary())
+
+Spans recorded inside process-pool workers stay in those processes.
+"""
+from __future__ import annotations
+
+import contextvars
+import json
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+
+COUNTERS = ("bytes_sent", "prompt_tokens", "completion_tokens", "cached_tokens")
+
+
+@dataclass
+class SpanRecord:
+    name: str
+    start: float  # unix time
+    wall_s: float
+    doc: Optional[str] = None  # sha256 or path of the document involved
+    bytes_sent: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    error: Optional[str] = None
+    attrs: Dict[str, object] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, object]:
+        return asdict(self)
+
+
+class Sink:
+    """Receives every finished span. Implementations must be thread-safe."""
+
+    def emit(self, record: SpanRecord) -> None:
+        raise NotImplementedError
+
+
+_sinks: List[Sink] = []
+_collector: contextvars.ContextVar[Optional[List[SpanRecord]]] = contextvars.ContextVar(
+    "instrumentation_collector", default=None
+)
+
+
+def add_sink(sink: Sink) -> Sink:
+    _sinks.append(sink)
+    return sink
+
+
+def remove_sink(sink: Sink) -> None:
+    if sink in _sinks:
+        _sinks.remove(sink)
+
+
+def clear_sinks() -> None:
+    _sinks.clear()
+
+
+def enabled() -> bool:
+    return bool(_sinks) or _collector.get() is not None
+
+
+class _NoopSpan:
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+    def set(self, **attrs: object) -> None:
+        pass
+
+    def add(self, **counts: int) -> None:
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Span:
+    __slots__ = ("record", "_t0")
+
+    def __init__(self, name: str, doc: Optional[str], attrs: Dict[str, object]) -> None:
+        self.record = SpanRecord(name=name, start=0.0, wall_s=0.0, doc=doc, attrs=attrs)
+
+    def __enter__(self) -> "Span":
+        self.record.start = time.time()
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.record.wall_s = time.perf_counter() - self._t0
+        if exc_type is not None:
+            self.record.error = exc_type.__name__
+        _emit(self.record)
+
+    def set(self, **attrs: object) -> None:
+        self.record.attrs.update(attrs)
+
+    def add(self, **counts: int) -> None:
+        """Add to bytes_sent / prompt_tokens / completion_tokens / cached_tokens."""
+        for name, value in counts.items():
+            setattr(self.record, name, getattr(self.record, name) + (value or 0))
+
+
+def _emit(record: SpanRecord) -> None:
+    collected = _collector.get()
+    if collected is not None:
+        collected.append(record)
+    for sink in list(_sinks):
+        sink.emit(record)
+
+
+def span(name: str, doc: Optional[str] = None, **attrs: object):
+    """Time a stage. Returns a no-op when instrumentation is disabled."""
+    if not _sinks and _collector.get() is None:
+        return _NOOP
+    return Span(name, doc, attrs)
+
+
+@contextmanager
+def collect() -> Iterator[List[SpanRecord]]:
+    """Capture every span finished in the current context (thread or task)
+    into a list, in addition to the registered sinks."""
+    records: List[SpanRecord] = []
+    token = _collector.set(records)
+    try:
+        yield records
+    finally:
+        _collector.reset(token)
+
+
+def breakdown(records: List[SpanRecord]) -> Dict[str, object]:
+    """Per-document summary of collected spans, suitable for JSON."""
+    totals = dict.fromkeys(COUNTERS, 0)
+    stages = []
+    for r in records:
+        stage: Dict[str, object] = {"name": r.name, "wall_s": round(r.wall_s, 6)}
+        for k in COUNTERS:
+            totals[k] += getattr(r, k)
+            if getattr(r, k):
+                stage[k] = getattr(r, k)
+        if r.error:
+            stage["error"] = r.error
+        stage.update(r.attrs)
+        stages.append(stage)
+    return {"stages": stages, "totals": totals}
+
+
+# --- Sinks ---
+
+class MemoryAggregator(Sink):
+    """Aggregates spans per name; optionally keeps the raw records."""
+
+    def __init__(self, keep_records: bool = False) -> None:
+        self.keep_records = keep_records
+        self.records: List[SpanRecord] = []
+        self._totals: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def emit(self, record: SpanRecord) -> None:
+        with self._lock:
+            t = self._totals.setdefault(record.name, {
+                "count": 0, "errors": 0, "wall_s": 0.0, "max_wall_s": 0.0, **dict.fromkeys(COUNTERS, 0),
+            })
+            t["count"] += 1
+            t["errors"] += record.error is not None
+            t["wall_s"] += record.wall_s
+            t["max_wall_s"] = max(t["max_wall_s"], record.wall_s)
+            for k in COUNTERS:
+                t[k] += getattr(record, k)
+            if self.keep_records:
+                self.records.append(record)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            out = {}
+            for name, t in self._totals.items():
+                out[name] = {**t, "mean_wall_s": t["wall_s"] / t["count"] if t["count"] else 0.0}
+            return out
+
+
+class JsonlSink(Sink):
+    """Appends one JSON line per span to ``path``."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self._fh = self.path.open("a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def emit(self, record: SpanRecord) -> None:
+        line = json.dumps(record.to_dict(), default=str) + "\n"
+        with self._lock:
+            self._fh.write(line)
+            self._fh.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._fh.close()
+
+
+class PrometheusSink(Sink):
+    """Keeps Prometheus-style counters and a latency histogram per span name.
+
+    ``render()`` returns the text exposition format, for an HTTP handler or
+    a node_exporter textfile (see ``write``).
+    """
+
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+    def __init__(self, prefix: str = "docanalyser") -> None:
+        self.prefix = prefix
+        self._hist: Dict[str, List[int]] = {}
+        self._sum: Dict[str, float] = {}
+        self._count: Dict[str, int] = {}
+        self._errors: Dict[str, int] = {}
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def emit(self, record: SpanRecord) -> None:
+        name = record.name
+        with self._lock:
+            hist = self._hist.setdefault(name, [0] * len(self.BUCKETS))
+            for i, bound in enumerate(self.BUCKETS):
+                if record.wall_s <= bound:
+                    hist[i] += 1
+            self._sum[name] = self._sum.get(name, 0.0) + record.wall_s
+            self._count[name] = self._count.get(name, 0) + 1
+            self._errors[name] = self._errors.get(name, 0) + (record.error is not None)
+            counters = self._counters.setdefault(name, dict.fromkeys(COUNTERS, 0))
+            for k in COUNTERS:
+                counters[k] += getattr(record, k)
+
+    def render(self) -> str:
+        p = self.prefix
+        lines = [
+            f"# HELP {p}_span_seconds Wall time per instrumented stage.",
+            f"# TYPE {p}_span_seconds histogram",
+        ]
+        with self._lock:
+            for name in sorted(self._count):
+                label = f'span="{name}"'
+                for bound, n in zip(self.BUCKETS, self._hist[name]):
+                    lines.append(f'{p}_span_seconds_bucket{{{label},le="{bound}"}} {n}')
+                lines.append(f'{p}_span_seconds_bucket{{{label},le="+Inf"}} {self._count[name]}')
+                lines.append(f"{p}_span_seconds_sum{{{label}}} {self._sum[name]}")
+                lines.append(f"{p}_span_seconds_count{{{label}}} {self._count[name]}")
+            lines += [f"# HELP {p}_span_errors_total Stages that raised.", f"# TYPE {p}_span_errors_total counter"]
+            lines += [f'{p}_span_errors_total{{span="{n}"}} {v}' for n, v in sorted(self._errors.items())]
+            for k in COUNTERS:
+                metric = f"{p}_{k}_total"
+                lines += [f"# HELP {metric} Sum of {k} over stages.", f"# TYPE {metric} counter"]
+                lines += [f'{metric}{{span="{n}"}} {c[k]}' for n, c in sorted(self._counters.items())]
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: Path) -> None:
+        Path(path).write_text(self.render(), encoding="utf-8")
@@ -0,0 +1,182 @@
+"""Background analysis jobs for interactive front ends.
+
+``JobQueue`` runs ingest→analyse for uploaded files on a thread pool and
+keeps every job's status and result, so a UI can enqueue uploads, return
+immediately and poll for progress. The queue outlives any single page
+render (the Streamlit app holds it in ``st.cache_resource``). With a
+``ResultStore`` every result is persisted, and uploads already in the
+store are answered from it without being analysed again. Finished jobs are
+dropped from the queue after ``finished_ttl`` seconds, and beyond
+``max_finished`` of them, oldest first; their results stay in the store,
+and ``jobs(ids)`` still answers them from there.
+
+Usage:
+    queue = JobQueue(DocAnalyser(), max_workers=4)
+    job = queue.submit("invoice.pdf", data)
+    ...
+    for job in queue.jobs():
+        print(job.name, job.status.value, job.result or job.error)
+"""
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from enum import Enum
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.analysis.analyser import DocAnalyser
+from src.analysis.store import ResultStore, StoredResult
+from src.ingestion.loader import ingest_bytes
+from src.ingestion.preprocess import compute_sha256
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+@dataclass
+class Job:
+    id: str  # sha256 of the uploaded bytes
+    name: str
+    status: JobStatus = JobStatus.QUEUED
+    result: Optional[Dict[str, object]] = None  # AnalysisResult.to_dict()
+    error: Optional[str] = None
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (JobStatus.DONE, JobStatus.FAILED)
+
+
+def _stored_job(stored: StoredResult, name: Optional[str] = None) -> Job:
+    return Job(
+        id=stored.sha256, name=name or stored.path or stored.sha256[:12], status=JobStatus.DONE,
+        result=stored.result.to_dict(), finished_at=stored.created_at,
+    )
+
+
+class JobQueue:
+    """Thread-pool backed job store for document analyses.
+
+    Jobs are keyed by content hash, so submitting the same upload again
+    (e.g. on every UI rerun) returns the existing job instead of analysing
+    it twice. ``jobs()`` returns snapshots that are safe to read while
+    workers keep updating the store; pass job ids to see only those jobs
+    (e.g. the ones a UI session submitted). Finished jobs are evicted once
+    they are older than ``finished_ttl`` seconds or more than
+    ``max_finished`` of them are kept, so a long-running queue does not
+    grow without bound. Queued and running jobs are never evicted.
+    """
+
+    def __init__(
+        self,
+        analyser: DocAnalyser,
+        max_workers: int = 4,
+        mode: str = "two_step",
+        store: Optional[ResultStore] = None,
+        max_finished: Optional[int] = 1000,
+        finished_ttl: Optional[float] = 24 * 3600,
+    ) -> None:
+        self.analyser = analyser
+        self.mode = mode
+        self.store = store
+        self.max_finished = max_finished
+        self.finished_ttl = finished_ttl
+        self._jobs: Dict[str, Job] = {}  # insertion order = submission order
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analyse")
+
+    def submit(self, name: str, data: bytes) -> Job:
+        job_id = compute_sha256(data)
+        with self._lock:
+            self._evict()
+            existing = self._jobs.get(job_id)
+            if existing is not None:
+                return replace(existing)
+            stored = self.store.get(job_id) if self.store is not None else None
+            if stored is not None:
+                job = self._jobs[job_id] = _stored_job(stored, name)
+                return replace(job)
+            job = self._jobs[job_id] = Job(id=job_id, name=name)
+
+        self._pool.submit(self._run, job, data)
+        return replace(job)
+
+    def _run(self, job: Job, data: bytes) -> None:
+        self._update(job, status=JobStatus.RUNNING, started_at=time.time())
+        try:
+            doc = ingest_bytes(data, filename=job.name)
+            result = self.analyser.analyse(doc, mode=self.mode).to_dict()
+            if self.store is not None:
+                self.store.put(job.id, result, path=job.name)
+        except Exception as e:  # reported on the job, never raised into the pool
+            self._update(job, status=JobStatus.FAILED, error=str(e), finished_at=time.time())
+            return
+        self._update(job, status=JobStatus.DONE, result=result, finished_at=time.time())
+
+    def _update(self, job: Job, **changes: object) -> None:
+        with self._lock:
+            for name, value in changes.items():
+                setattr(job, name, value)
+            if job.finished:
+                self._evict()
+
+    def _evict(self) -> None:
+        """Drop expired finished jobs, then the oldest ones over ``max_finished``.
+        Must be called with ``_lock`` held."""
+        # a job answered from the store carries the store's older finished_at
+        done = sorted(
+            (max(job.submitted_at, job.finished_at or 0.0), job_id)
+            for job_id, job in self._jobs.items() if job.finished
+        )
+        if self.finished_ttl is not None:
+            cutoff = time.time() - self.finished_ttl
+            expired = [job_id for at, job_id in done if at < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+            done = done[len(expired):]
+        if self.max_finished is not None:
+            for _, job_id in done[:max(0, len(done) - self.max_finished)]:
+                del self._jobs[job_id]
+
+    def _select(self, ids: Optional[Iterable[str]]) -> List[Job]:
+        if ids is None:
+            return list(self._jobs.values())
+        selected = []
+        for job_id in dict.fromkeys(ids):
+            job = self._jobs.get(job_id)
+            if job is None and self.store is not None:  # evicted, or from before a restart
+                stored = self.store.get(job_id)
+                job = _stored_job(stored) if stored is not None else None
+            if job is not None:
+                selected.append(job)
+        return selected
+
+    def jobs(self, ids: Optional[Iterable[str]] = None) -> List[Job]:
+        """Snapshots of all jobs in submission order, or of the ones in
+        ``ids`` in that order. An id no longer in the queue is answered as
+        a finished job from the store, if it has the result; ids found in
+        neither are skipped."""
+        with self._lock:
+            return [replace(job) for job in self._select(ids)]
+
+    def progress(self, ids: Optional[Iterable[str]] = None) -> Tuple[int, int]:
+        """(finished, total) job counts, of all jobs or the ones in ``ids``."""
+        with self._lock:
+            selected = self._select(ids)
+            return sum(job.finished for job in selected), len(selected)
+
+    def results(self) -> Dict[str, Dict[str, object]]:
+        """Results of successful jobs, keyed by file name."""
+        with self._lock:
+            return {job.name: job.result for job in self._jobs.values() if job.status is JobStatus.DONE}
+
+    def shutdown(self, wait: bool = False) -> None:
+        self._pool.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,37 @@
+"""Deferred imports of heavy third-party modules.
+
+``np = lazy_module("numpy")`` binds a stand-in that imports numpy on first
+attribute access, so importing our modules (``--help``, worker start-up,
+Streamlit reruns) does not pay for Pillow, pypdf, numpy or openai until
+they are used. The import itself goes through ``importlib`` and is
+thread-safe; afterwards each attribute access costs one extra lookup.
+"""
+from __future__ import annotations
+
+import importlib
+import sys
+import types
+
+
+class LazyModule(types.ModuleType):
+    def __init__(self, name: str) -> None:
+        super().__init__(name)
+        self.__dict__["_module"] = None
+
+    def _load(self) -> types.ModuleType:
+        module = self.__dict__["_module"]
+        if module is None:
+            module = self.__dict__["_module"] = importlib.import_module(self.__name__)
+        return module
+
+    def __getattr__(self, attr: str) -> object:
+        return getattr(self._load(), attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.__dict__["_module"] is not None else "not loaded"
+        return f"<lazy module {self.__name__!r} ({state})>"
+
+
+def lazy_module(name: str) -> types.ModuleType:
+    """``name`` itself when already imported, otherwise a ``LazyModule``."""
+    return sys.modules.get(name) or LazyModule(name)
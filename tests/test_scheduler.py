@@ -0,0 +1,210 @@
+"""RequestScheduler against the local mock server, plus its building blocks.
+
+    python -m pytest tests/
+"""
+from __future__ import annotations
+
+import asyncio
+import email.utils
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from benchmarks.mock_server import MockServer
+from src.analysis.analyser import DocAnalyser
+from src.analysis.async_analyser import AsyncDocAnalyser
+from src.analysis.scheduler import AIMDController, RequestScheduler, RetryPolicy, TokenBucket, retry_after
+from src.ingestion.loader import ingest_path
+
+SAMPLE = Path(__file__).resolve().parent.parent / "data" / "website_screenshot.jpeg"
+MOCK_RETRY_AFTER = 0.2  # seconds the mock server asks for on a 429
+
+
+@pytest.fixture(scope="module")
+def doc():
+    return ingest_path(SAMPLE)
+
+
+def _error(headers):
+    return SimpleNamespace(response=SimpleNamespace(headers=headers))
+
+
+# ----- Retry-After -----
+
+def test_retry_after_seconds_and_ms():
+    assert retry_after(_error({"retry-after": "3"})) == 3.0
+    assert retry_after(_error({"retry-after-ms": "250", "retry-after": "3"})) == 0.25
+
+
+def test_retry_after_http_date():
+    when = email.utils.formatdate(time.time() + 30, usegmt=True)
+    assert 25 <= retry_after(_error({"retry-after": when})) <= 30
+
+
+def test_retry_after_missing_or_malformed():
+    assert retry_after(_error({})) is None
+    assert retry_after(ValueError("no response")) is None
+    assert retry_after(_error({"retry-after": "soon"})) is None
+
+
+def test_retry_policy_honours_retry_after_within_max_delay():
+    policy = RetryPolicy(base_delay=0.01, max_delay=5.0)
+    assert policy.delay(0, retry_after=2.0) == 2.0
+    assert policy.delay(0, retry_after=60.0) == 5.0
+    assert 0 <= policy.delay(3) <= 0.08
+
+
+# ----- Token buckets -----
+
+def test_token_bucket_waits_once_capacity_is_spent():
+    bucket = TokenBucket(rate_per_min=60, capacity=2)  # one token per second
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == pytest.approx(1.0, abs=0.05)
+    assert bucket.reserve() == pytest.approx(2.0, abs=0.05)
+
+
+def test_token_bucket_adjust_refunds_overestimate():
+    bucket = TokenBucket(rate_per_min=600, capacity=100)
+    assert bucket.reserve(100) == 0.0
+    assert bucket.reserve(10) > 0
+    bucket.adjust(-50)  # the requests cost 50 tokens less than reserved
+    assert bucket.reserve(10) == 0.0
+
+
+# ----- AIMD concurrency -----
+
+def test_aimd_grows_once_per_round_of_successes():
+    controller = AIMDController(initial=2, maximum=3)
+    controller.on_success()
+    assert controller.limit == 2
+    controller.on_success()
+    assert controller.limit == 3
+    for _ in range(10):
+        controller.on_success()
+    assert controller.limit == 3  # capped at maximum
+
+
+def test_aimd_cuts_once_per_cooldown():
+    controller = AIMDController(initial=8, minimum=1, cooldown=60)
+    controller.on_throttle()
+    controller.on_throttle()  # same burst of 429s
+    assert controller.limit == 4
+    controller._last_cut -= 60
+    controller.on_throttle()
+    assert controller.limit == 2
+
+
+def test_aimd_slots():
+    controller = AIMDController(initial=1)
+    assert controller.try_acquire()
+    assert not controller.try_acquire()
+    controller.release()
+    assert controller.try_acquire()
+
+
+def test_aimd_async_waiters_are_woken_by_release():
+    controller = AIMDController(initial=2)
+    peak = 0
+
+    async def task():
+        nonlocal peak
+        await controller.acquire_async()
+        peak = max(peak, controller.in_flight)
+        await asyncio.sleep(0.01)
+        controller.release()
+
+    async def run():
+        await asyncio.wait_for(asyncio.gather(*(task() for _ in range(20))), timeout=5)
+
+    asyncio.run(run())
+    assert peak == 2
+    assert controller.in_flight == 0
+
+
+def test_aimd_cancelled_waiter_passes_its_slot_on():
+    controller = AIMDController(initial=1)
+
+    async def run():
+        await controller.acquire_async()
+        first = asyncio.create_task(controller.acquire_async())
+        second = asyncio.create_task(controller.acquire_async())
+        await asyncio.sleep(0)
+        controller.release()  # wakes ``first``...
+        first.cancel()  # ...which gives up before it runs
+        await asyncio.wait_for(second, timeout=1)
+
+    asyncio.run(run())
+    assert controller.in_flight == 1
+
+
+# ----- Scheduler -----
+
+def test_non_retryable_error_is_raised_immediately():
+    scheduler = RequestScheduler()
+
+    def fail():
+        raise ValueError("bad request body")
+
+    with pytest.raises(ValueError):
+        scheduler.call(fail)
+    assert scheduler.stats.failed == 1
+    assert scheduler.stats.retries == 0
+
+
+def test_retries_throttled_requests_with_retry_after(doc):
+    scheduler = RequestScheduler(
+        retry=RetryPolicy(max_retries=20, base_delay=0.01),
+        controller=AIMDController(initial=8, cooldown=0.0),
+    )
+    with MockServer(latency=0.01, fail_rate=0.5, seed=1) as server:
+        analyser = DocAnalyser(base_url=server.base_url, api_key="stub", scheduler=scheduler)
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(analyser.classify, [doc] * 16))
+        mock = server.state.stats()
+
+    stats = scheduler.stats
+    assert len(results) == 16
+    assert stats.succeeded == 16
+    assert stats.throttled == mock["throttled"] > 0
+    assert stats.retries == stats.throttled
+    assert stats.requests == mock["requests"] == 16 + stats.retries
+    assert stats.backoff_s >= MOCK_RETRY_AFTER * stats.retries - 1e-6  # Retry-After was honoured
+    assert stats.concurrency_limit < 8  # 429s cut the limit
+
+
+def test_request_rate_limit_spaces_requests(doc):
+    scheduler = RequestScheduler()
+    scheduler.requests = TokenBucket(rate_per_min=600, capacity=1)  # 10/s, no burst
+    with MockServer(latency=0.0, seed=0) as server:
+        analyser = DocAnalyser(base_url=server.base_url, api_key="stub", scheduler=scheduler)
+        t0 = time.monotonic()
+        for _ in range(4):
+            analyser.classify(doc)
+        elapsed = time.monotonic() - t0
+    assert elapsed >= 0.29  # three requests after the first, 0.1 s apart
+    # waits are shortened by the time spent on the requests themselves
+    assert scheduler.stats.rate_wait_s >= 0.3 - scheduler.stats.work_s - 0.01
+
+
+def test_async_retries_throttled_requests(doc):
+    scheduler = RequestScheduler(
+        retry=RetryPolicy(max_retries=20, base_delay=0.01),
+        controller=AIMDController(initial=4, cooldown=0.0),
+    )
+
+    async def run(base_url):
+        analyser = AsyncDocAnalyser(base_url=base_url, api_key="stub", scheduler=scheduler)
+        return await asyncio.gather(*(analyser.classify(doc) for _ in range(16)))
+
+    with MockServer(latency=0.01, fail_rate=0.5, seed=2) as server:
+        results = asyncio.run(run(server.base_url))
+        mock = server.state.stats()
+
+    assert len(results) == 16
+    assert scheduler.stats.succeeded == 16
+    assert scheduler.stats.throttled == mock["throttled"] > 0
+    assert scheduler.stats.backoff_s >= MOCK_RETRY_AFTER * scheduler.stats.retries - 1e-6